@@ -1,4 +1,5 @@
 import datetime
+from typing import Optional
 
 from fastapi import Security, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -6,11 +7,13 @@ from passlib.context import CryptContext
 import jwt
 from starlette import status
 
+from app.library.audit import set_actor
 from app.library.users import find_user
 
 
 class AuthHandler:
   security = HTTPBearer()
+  optional_security = HTTPBearer(auto_error=False)
   pwd_context = CryptContext(schemes=['bcrypt'])
   secret = 'supersecret'
 
@@ -57,4 +60,11 @@ class AuthHandler:
     user = find_user(username)
     if user is None:
       raise credentials_exception
+    set_actor(user.id)
     return user
+
+  def get_optional_user(self, auth: Optional[HTTPAuthorizationCredentials] = Security(optional_security)):
+    """Return current authorised user, or None if the request has no bearer token"""
+    if auth is None:
+      return None
+    return self.get_current_user(auth)
@@ -1,10 +1,83 @@
+from functools import lru_cache
+from typing import Optional
+
 from pydantic import BaseSettings
 
+from app.database.versions import versions
+
 
 class Settings(BaseSettings):
   app_name: str = "Garden Assistant"
-  admin_email: str
+  admin_email: Optional[str] = None
   items_per_user: int = 50
+  table_page_size: int = 50
+  group_commit: bool = False
+  group_commit_max_batch: int = 64
+  group_commit_max_delay: float = 0.005
+  weather_file: str = "data/weather.csv"
+  climate_dir: str = "data/climate"
+  # seconds between checks of the climate history for new rows
+  climate_watch_interval: float = 60.0
+  # the server worker holding a lock on this file runs the job runner, maintenance and backups
+  scheduler_lock_file: str = "scheduler.lock"
+  scheduler_retry_interval: float = 5.0
+  job_workers: int = 2
+  job_executor: str = "thread"
+  job_poll_interval: float = 0.5
+  # concurrent requests, waiting requests and seconds to wait of each admission group, see app.library.admission
+  admission_auth_concurrency: int = 4
+  admission_auth_queue_size: int = 16
+  admission_auth_queue_timeout: float = 2.0
+  admission_writes_concurrency: int = 8
+  admission_writes_queue_size: int = 32
+  admission_writes_queue_timeout: float = 2.0
+  admission_pages_concurrency: int = 16
+  admission_pages_queue_size: int = 64
+  admission_pages_queue_timeout: float = 1.0
+  admission_reads_concurrency: int = 32
+  admission_reads_queue_size: int = 128
+  admission_reads_queue_timeout: float = 1.0
+  # seconds a shed request is told to wait before retrying
+  admission_retry_after: int = 1
+  audit_flush_interval: float = 1.0
+  audit_max_batch: int = 500
+  pages_watch: bool = False
+  pages_watch_interval: float = 2.0
+  server_bind: str = "0.0.0.0:8000"
+  # defaults to one worker per CPU
+  server_workers: Optional[int] = None
+  server_graceful_timeout: int = 30
+  # restart each worker after about this many requests, 0 to never
+  server_max_requests: int = 0
+  # seconds between database maintenance runs in the app, 0 to only run it from the command line
+  maintenance_interval: float = 0
+  maintenance_budget: float = 0.25
+  maintenance_vacuum_pages: int = 256
+  maintenance_quiet_rate: float = 1.0
+  # seconds between backups made by the app, 0 to only back up from the command line
+  backup_interval: float = 0
+  backup_dir: str = "backups"
+  backup_keep: int = 7
+  backup_step_pages: int = 1024
+  backup_step_pause: float = 0.01
 
   class Config:
     env_file = ".env"
+
+
+# Settings are read again by every worker once the generation is bumped
+SETTINGS_GENERATION = "settings"
+
+
+@lru_cache(maxsize=1)
+def _load_settings(generation: int) -> Settings:
+  return Settings()
+
+
+def get_settings():
+  return _load_settings(versions.get(SETTINGS_GENERATION)[0])
+
+
+def reload_settings():
+  """Read the settings again from the environment and .env, in every worker."""
+  versions.bump(SETTINGS_GENERATION)
@@ -0,0 +1,306 @@
+"""Online backups of the SQLite database, and restoring them.
+
+A backup copies the live database with the SQLite online backup API,
+`step_pages` pages at a time and pausing `step_pause` seconds between steps,
+so writers only wait for the lock while a single step runs. SQLite starts the
+copy over when another connection writes between steps; after
+`MAX_RESTARTS` restarts the rest is copied in one step instead, which blocks
+writers until it is done. In WAL mode readers do not block writers, so the
+database is copied in one step straight away.
+
+The copy is checked with PRAGMA quick_check, gzipped into the backup
+directory as `<name>-<UTC timestamp>.sqlite3.gz` and its SHA-256 written next
+to it in sha256sum format. Only the newest `keep` backups are kept.
+
+Restoring verifies the checksum and that the backup is at the Alembic head
+revision with every table of the models, then copies it over the database
+with the backup API, so connections of a running app see the restored data
+on their next transaction. Run from the command line with
+
+    python -m app.database.backup create
+    python -m app.database.backup list
+    python -m app.database.backup restore backups/db-20261019T143512Z.sqlite3.gz
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+SUFFIX = ".sqlite3.gz"
+CHECKSUM_SUFFIX = ".sha256"
+
+# Restarts caused by concurrent writes before the rest is copied in one step
+MAX_RESTARTS = 3
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+  """A backup could not be made or is not fit to restore."""
+
+
+class _Restarted(Exception):
+  pass
+
+
+@dataclass
+class BackupFile:
+  path: str
+  checksum: str
+  size: int
+  duration: float
+  restarts: int = 0
+
+
+def sha256sum(path: str) -> str:
+  digest = hashlib.sha256()
+  with open(path, "rb") as input_file:
+    for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def copy_database(source: sqlite3.Connection, target: sqlite3.Connection, step_pages: int = 1024, step_pause: float = 0.01) -> int:
+  """Copy the source database into the target a few pages at a time, returning how often the copy restarted."""
+  if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+    # readers do not block writers in WAL mode, so one step copies a consistent snapshot
+    source.backup(target)
+    return 0
+  restarts = 0
+  previous = [None]
+
+  def pause(status, remaining, total):
+    # remaining only goes back up when a write made SQLite start over
+    if previous[0] is not None and remaining >= previous[0]:
+      raise _Restarted()
+    previous[0] = remaining
+    time.sleep(step_pause)
+
+  while True:
+    try:
+      source.backup(target, pages=step_pages if restarts < MAX_RESTARTS else -1, progress=pause)
+      return restarts
+    except _Restarted:
+      restarts += 1
+      previous[0] = None
+      metrics.incr("backup.restarts")
+
+
+def check_database(connection: sqlite3.Connection):
+  result = connection.execute("PRAGMA quick_check").fetchone()[0]
+  if result != "ok":
+    raise BackupError(f"Database check failed: {result}")
+
+
+class DatabaseBackup:
+  """Makes compressed, checksummed backups of one SQLite database file into a directory."""
+
+  def __init__(self, database: str, directory: str = "backups", keep: int = 7,
+               step_pages: int = 1024, step_pause: float = 0.01):
+    self.database = database
+    self.directory = directory
+    self.keep = keep
+    self.step_pages = step_pages
+    self.step_pause = step_pause
+    self._stopping = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def _name(self) -> str:
+    return os.path.splitext(os.path.basename(self.database))[0]
+
+  def backups(self) -> List[str]:
+    """Return the paths of the backups in the directory, oldest first."""
+    if not os.path.isdir(self.directory):
+      return []
+    prefix = self._name() + "-"
+    # the UTC timestamps in the names sort in time order
+    names = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix) and name.endswith(SUFFIX))
+    return [os.path.join(self.directory, name) for name in names]
+
+  def create(self) -> BackupFile:
+    """Back up the database now."""
+    started = time.perf_counter()
+    os.makedirs(self.directory, exist_ok=True)
+    timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(self.directory, f"{self._name()}-{timestamp}{SUFFIX}")
+    with tempfile.TemporaryDirectory(dir=self.directory) as scratch:
+      copy_path = os.path.join(scratch, "copy.sqlite3")
+      source = sqlite3.connect(self.database, check_same_thread=False)
+      target = sqlite3.connect(copy_path)
+      try:
+        restarts = copy_database(source, target, self.step_pages, self.step_pause)
+        check_database(target)
+      finally:
+        target.close()
+        source.close()
+      partial = os.path.join(scratch, "backup" + SUFFIX)
+      with open(copy_path, "rb") as input_file, gzip.open(partial, "wb", compresslevel=6) as output_file:
+        shutil.copyfileobj(input_file, output_file, CHUNK_SIZE)
+      checksum = sha256sum(partial)
+      os.replace(partial, path)
+    with open(path + CHECKSUM_SUFFIX, "w", encoding="utf-8") as checksum_file:
+      checksum_file.write(f"{checksum}  {os.path.basename(path)}\n")
+    backup = BackupFile(path, checksum, os.path.getsize(path), time.perf_counter() - started, restarts)
+    metrics.incr("backup.created")
+    metrics.gauge("backup.last_duration_ms", backup.duration * 1000)
+    metrics.gauge("backup.last_size_bytes", backup.size)
+    logger.info(f"Backed up {self.database} to {path} in {backup.duration:.1f} s")
+    self.prune()
+    return backup
+
+  def prune(self) -> List[str]:
+    """Delete all but the newest `keep` backups, returning the deleted paths."""
+    deleted = self.backups()[:-self.keep] if self.keep > 0 else []
+    for path in deleted:
+      os.remove(path)
+      if os.path.exists(path + CHECKSUM_SUFFIX):
+        os.remove(path + CHECKSUM_SUFFIX)
+    return deleted
+
+  def start(self, interval: float):
+    if self._thread is None:
+      self._stopping.clear()
+      self._thread = threading.Thread(target=self._run, args=(interval,), name="db-backup", daemon=True)
+      self._thread.start()
+
+  def _run(self, interval: float):
+    while not self._stopping.wait(interval):
+      try:
+        self.create()
+      except (OSError, sqlite3.Error, BackupError):
+        metrics.incr("backup.failed")
+        logger.exception(f"Backing up {self.database} failed")
+
+  def shutdown(self):
+    if self._thread is not None:
+      self._stopping.set()
+      self._thread.join()
+      self._thread = None
+
+
+# Restoring
+
+def verify_checksum(path: str):
+  try:
+    with open(path + CHECKSUM_SUFFIX, "r", encoding="utf-8") as checksum_file:
+      expected = checksum_file.read().split()[0]
+  except (FileNotFoundError, IndexError):
+    raise BackupError(f"No checksum for {path}")
+  if sha256sum(path) != expected:
+    raise BackupError(f"Checksum of {path} does not match")
+
+
+# next to the app package, so restores work from any directory
+ALEMBIC_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+
+def alembic_head(config_file: str = ALEMBIC_CONFIG) -> str:
+  from alembic.config import Config
+  from alembic.script import ScriptDirectory
+
+  return ScriptDirectory.from_config(Config(config_file)).get_current_head()
+
+
+def validate_schema(connection: sqlite3.Connection, head: str):
+  """Check the database is migrated to the head revision and has the tables of every model."""
+  from sqlmodel import SQLModel
+
+  try:
+    revisions = [row[0] for row in connection.execute("SELECT version_num FROM alembic_version")]
+  except sqlite3.OperationalError:
+    raise BackupError("Backup has no alembic_version table")
+  if revisions != [head]:
+    raise BackupError(f"Backup is at revision {', '.join(revisions) or 'none'}, not the head {head}")
+  tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+  missing = sorted(set(SQLModel.metadata.tables) - tables)
+  if missing:
+    raise BackupError(f"Backup is missing tables: {', '.join(missing)}")
+
+
+def restore(path: str, database: str, head: Optional[str] = None):
+  """Replace the contents of the database with the backup at path."""
+  verify_checksum(path)
+  with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(database))) as scratch:
+    copy_path = os.path.join(scratch, "restore.sqlite3")
+    with gzip.open(path, "rb") as input_file, open(copy_path, "wb") as output_file:
+      shutil.copyfileobj(input_file, output_file, CHUNK_SIZE)
+    source = sqlite3.connect(copy_path)
+    try:
+      check_database(source)
+      validate_schema(source, head or alembic_head())
+      target = sqlite3.connect(database)
+      try:
+        source.backup(target)
+      finally:
+        target.close()
+    finally:
+      source.close()
+  metrics.incr("backup.restored")
+  logger.info(f"Restored {database} from {path}")
+
+
+_backup: Optional[DatabaseBackup] = None
+
+
+def start_backups(engine, interval: float, directory: str = "backups", keep: int = 7,
+                  step_pages: int = 1024, step_pause: float = 0.01):
+  """Back up the engine's database every `interval` seconds in the background."""
+  global _backup
+  if _backup is None:
+    _backup = DatabaseBackup(engine.url.database, directory, keep=keep, step_pages=step_pages, step_pause=step_pause)
+    _backup.start(interval)
+  return _backup
+
+
+def stop_backups():
+  global _backup
+  if _backup is not None:
+    _backup.shutdown()
+    _backup = None
+
+
+def main():
+  import app.models.audit_models, app.models.garden_models, app.models.job_models, app.models.user_models
+  from app.config import get_settings
+  from app.database.database import engine
+
+  settings = get_settings()
+  parser = argparse.ArgumentParser(description="Back up or restore the app database.")
+  commands = parser.add_subparsers(dest="command", required=True)
+  commands.add_parser("create", help="make a backup now")
+  commands.add_parser("list", help="list the kept backups, oldest first")
+  restore_parser = commands.add_parser("restore", help="replace the database with a backup")
+  restore_parser.add_argument("path", help="backup file")
+  args = parser.parse_args()
+
+  backup = DatabaseBackup(engine.url.database, settings.backup_dir, keep=settings.backup_keep,
+                          step_pages=settings.backup_step_pages, step_pause=settings.backup_step_pause)
+  try:
+    if args.command == "create":
+      print(backup.create().path)
+    elif args.command == "list":
+      for path in backup.backups():
+        print(path)
+    else:
+      restore(args.path, engine.url.database)
+  except BackupError as exc:
+    parser.exit(1, f"{exc}\n")
+
+
+if __name__ == "__main__":
+  main()
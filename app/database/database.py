@@ -1,4 +1,5 @@
 import os.path
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine
 
 # There should be one engine for the entire application
@@ -9,8 +10,26 @@ sqlite_url = f"sqlite:///{sqlite_file}"
 connect_args = {'check_same_thread': False}
 engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
 
+
+def enable_sqlite_transactions(engine):
+    """Let SQLAlchemy rather than pysqlite emit BEGIN, so SAVEPOINTs work.
+    More info: https://docs.sqlalchemy.org/en/14/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+    """
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+
 def create_db_and_tables():
     """Create the tables registered with SQLModel.metadata (i.e classes with table=True).
     More info: https://sqlmodel.tiangolo.com/tutorial/create-db-and-table/#sqlmodel-metadata
     """
-    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # only takes effect on a new database, existing ones are converted by migration
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        SQLModel.metadata.create_all(connection)
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+
+from sqlmodel import Session, create_engine
+from starlette.concurrency import run_in_threadpool
+
+from app.database.database import enable_sqlite_transactions
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STOP = object()
+
+
+class GroupCommitExecutor:
+  """Commit mutations from concurrent requests together in one transaction.
+
+  Mutations are queued and a single writer thread gathers them for up to
+  `max_delay` seconds, or until `max_batch` are waiting, then runs each in its
+  own SAVEPOINT and commits the batch once. A failing mutation only rolls back
+  its own savepoint and its exception is raised in the submitting request.
+  Each mutation runs in a copy of its request's context, so context variables
+  such as the audit log's acting user carry over to the writer thread.
+  """
+
+  def __init__(self, engine, max_batch: int = 64, max_delay: float = 0.005):
+    self.engine = engine
+    self.max_batch = max_batch
+    self.max_delay = max_delay
+    self._queue = queue.Queue()
+    self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+    self._thread.start()
+
+  def _enqueue(self, mutation: Callable[[Session], T]) -> Future:
+    future = Future()
+    self._queue.put((mutation, future, contextvars.copy_context()))
+    return future
+
+  def submit(self, mutation: Callable[[Session], T]) -> T:
+    """Run the mutation in the next batch and return its result once committed."""
+    return self._enqueue(mutation).result()
+
+  async def submit_async(self, mutation: Callable[[Session], T]) -> T:
+    """Like submit(), but leaves the event loop free to queue other requests' mutations meanwhile."""
+    return await asyncio.wrap_future(self._enqueue(mutation))
+
+  def shutdown(self):
+    """Commit any queued mutations and stop the writer thread."""
+    self._queue.put(_STOP)
+    self._thread.join()
+
+  def _gather(self, first):
+    batch = [first]
+    deadline = time.monotonic() + self.max_delay
+    while len(batch) < self.max_batch:
+      timeout = deadline - time.monotonic()
+      if timeout <= 0:
+        break
+      try:
+        item = self._queue.get(timeout=timeout)
+      except queue.Empty:
+        break
+      if item is _STOP:
+        self._queue.put(_STOP)
+        break
+      batch.append(item)
+    return batch
+
+  def _run(self):
+    while True:
+      item = self._queue.get()
+      if item is _STOP:
+        return
+      self._commit(self._gather(item))
+
+  @staticmethod
+  def _apply(session, mutation):
+    result = mutation(session)
+    session.flush()
+    return result
+
+  def _commit(self, batch):
+    results = []
+    with Session(self.engine, expire_on_commit=False) as session:
+      for mutation, future, context in batch:
+        savepoint = session.begin_nested()
+        try:
+          result = context.run(self._apply, session, mutation)
+          savepoint.commit()
+          results.append((future, result, None))
+        except Exception as exc:
+          savepoint.rollback()
+          results.append((future, None, exc))
+      try:
+        session.commit()
+      except Exception as exc:
+        logger.exception("Group commit failed")
+        for future, _, _ in results:
+          future.set_exception(exc)
+        return
+    metrics.incr("group_commit.batches")
+    metrics.incr("group_commit.mutations", len(batch))
+    metrics.gauge("group_commit.last_batch_size", len(batch))
+    for future, result, exc in results:
+      if exc is None:
+        future.set_result(result)
+      else:
+        future.set_exception(exc)
+
+
+_executor: Optional[GroupCommitExecutor] = None
+
+
+def start_group_commit(engine, max_batch: int = 64, max_delay: float = 0.005):
+  """Route writes made through save() and remove() via a group-commit executor."""
+  global _executor
+  if _executor is None:
+    # a dedicated engine so SAVEPOINT support does not make request reads hold locks
+    writer_engine = create_engine(engine.url, connect_args={'check_same_thread': False})
+    enable_sqlite_transactions(writer_engine)
+    _executor = GroupCommitExecutor(writer_engine, max_batch=max_batch, max_delay=max_delay)
+  return _executor
+
+
+def stop_group_commit():
+  """Flush pending writes and go back to committing in each request."""
+  global _executor
+  if _executor is not None:
+    _executor.shutdown()
+    _executor.engine.dispose()
+    _executor = None
+
+
+def save(session: Session, obj):
+  """Insert or update the object and commit it, returning the persisted object."""
+  if _executor is None:
+    session.add(obj)
+    session.commit()
+    session.refresh(obj)
+    return obj
+  return _executor.submit(lambda batch_session: batch_session.merge(obj))
+
+
+def remove(session: Session, obj):
+  """Delete the object and commit the change."""
+  if _executor is None:
+    session.delete(obj)
+    session.commit()
+    return
+  model, key = type(obj), obj.id
+  _executor.submit(lambda batch_session: batch_session.delete(batch_session.get(model, key)))
+
+
+async def save_async(session: Session, obj):
+  """save() for async endpoints, which must not block the event loop while the batch commits."""
+  if _executor is None:
+    return await run_in_threadpool(save, session, obj)
+  return await _executor.submit_async(lambda batch_session: batch_session.merge(obj))
+
@@ -0,0 +1,199 @@
+"""Routine SQLite maintenance: planner statistics, freeing pages, WAL checkpoints.
+
+Three steps keep db.sqlite3 fast after the seasonal bulk deletes:
+
+* optimize runs ANALYZE the first time and PRAGMA optimize afterwards, with
+  analysis_limit bounding how many rows each index is sampled for
+* vacuum returns free pages to the filesystem with incremental_vacuum, a few
+  hundred pages per transaction, until the free list is empty or the latency
+  budget is spent; it needs auto_vacuum=INCREMENTAL, set by migration
+* checkpoint copies the WAL back into the database and truncates it, when the
+  database is in WAL mode
+
+Every step runs on its own connection whose busy timeout is the latency
+budget, so a step that would have to wait for a writer gives up instead of
+holding up requests. In the app the steps run in a background thread every
+`maintenance_interval` seconds, but only once the request rate has dropped
+below `maintenance_quiet_rate`; from the command line they run straight away
+
+    python -m app.database.maintenance [--steps optimize vacuum checkpoint]
+
+Durations and reclaimed pages are recorded in the app metrics.
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+STEPS = ("optimize", "vacuum", "checkpoint")
+
+# Rows sampled per index by ANALYZE, see https://www.sqlite.org/lang_analyze.html#approx
+ANALYSIS_LIMIT = 1000
+
+# How often the scheduler measures the request rate, in seconds
+QUIET_WINDOW = 30.0
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+@dataclass
+class StepResult:
+  step: str
+  duration: float = 0.0
+  # pages given back to the filesystem, or for checkpoint copied out of the WAL
+  pages_reclaimed: int = 0
+  skipped: Optional[str] = None
+
+
+def request_count() -> int:
+  """Return how many requests the admission control has let in so far."""
+  counters = metrics.snapshot()["counters"]
+  return sum(value for name, value in counters.items() if name.startswith("admission.") and name.endswith(".admitted"))
+
+
+class DatabaseMaintenance:
+  """Runs the maintenance steps against one SQLite database file within a latency budget."""
+
+  def __init__(self, database: str, budget: float = 0.25, vacuum_pages: int = 256,
+               quiet_rate: float = 1.0, activity: Callable[[], int] = request_count):
+    self.database = database
+    self.budget = budget
+    self.vacuum_pages = vacuum_pages
+    self.quiet_rate = quiet_rate
+    self.activity = activity
+    self._stopping = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def _connect(self) -> sqlite3.Connection:
+    # autocommit, so every statement is its own short transaction
+    return sqlite3.connect(self.database, timeout=self.budget, isolation_level=None, check_same_thread=False)
+
+  def optimize(self, connection: sqlite3.Connection) -> StepResult:
+    connection.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    analyzed = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    connection.execute("PRAGMA optimize" if analyzed else "ANALYZE")
+    return StepResult("optimize")
+
+  def vacuum(self, connection: sqlite3.Connection) -> StepResult:
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+      return StepResult("vacuum", skipped="auto_vacuum is not incremental")
+    free_before = free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    deadline = time.perf_counter() + self.budget
+    while free:
+      # the pragma frees one page per step, so it is run to completion as a script
+      connection.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+      free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+      if time.perf_counter() >= deadline:
+        break
+    metrics.gauge("maintenance.freelist_pages", free)
+    return StepResult("vacuum", pages_reclaimed=free_before - free)
+
+  def checkpoint(self, connection: sqlite3.Connection) -> StepResult:
+    if connection.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+      return StepResult("checkpoint", skipped="not in WAL mode")
+    # copy what readers allow without blocking anyone, then truncate, which
+    # waits for readers and so only gets as long as the busy timeout
+    _, _, checkpointed = connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    busy, _, _ = connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return StepResult("checkpoint", pages_reclaimed=max(checkpointed, 0), skipped="database busy" if busy else None)
+
+  def run(self, steps: Sequence[str] = STEPS) -> List[StepResult]:
+    """Run the given steps now, returning what each did."""
+    results = []
+    connection = self._connect()
+    try:
+      for step in steps:
+        started = time.perf_counter()
+        try:
+          result = getattr(self, step)(connection)
+        except sqlite3.OperationalError as exc:
+          # locked by a writer for longer than the budget
+          logger.info(f"Database maintenance step {step} gave up: {exc}")
+          result = StepResult(step, skipped=str(exc))
+          metrics.incr(f"maintenance.{step}.busy")
+        result.duration = time.perf_counter() - started
+        metrics.incr(f"maintenance.{step}.runs")
+        metrics.gauge(f"maintenance.{step}.last_duration_ms", result.duration * 1000)
+        if result.pages_reclaimed:
+          metrics.incr(f"maintenance.{step}.pages_reclaimed", result.pages_reclaimed)
+        results.append(result)
+    finally:
+      connection.close()
+    return results
+
+  def start(self, interval: float):
+    if self._thread is None:
+      self._stopping.clear()
+      self._thread = threading.Thread(target=self._run, args=(interval,), name="db-maintenance", daemon=True)
+      self._thread.start()
+
+  def _run(self, interval: float):
+    window = min(QUIET_WINDOW, interval)
+    last_run = time.monotonic()
+    requests = self.activity()
+    while not self._stopping.wait(window):
+      previous, requests = requests, self.activity()
+      if time.monotonic() - last_run < interval:
+        continue
+      if (requests - previous) / window > self.quiet_rate:
+        metrics.incr("maintenance.deferred")
+        continue
+      try:
+        self.run()
+      except sqlite3.Error:
+        logger.exception("Database maintenance failed")
+      last_run = time.monotonic()
+
+  def shutdown(self):
+    if self._thread is not None:
+      self._stopping.set()
+      self._thread.join()
+      self._thread = None
+
+
+_maintenance: Optional[DatabaseMaintenance] = None
+
+
+def start_maintenance(engine, interval: float, budget: float = 0.25, vacuum_pages: int = 256, quiet_rate: float = 1.0):
+  """Run the maintenance steps on the engine's database in the background."""
+  global _maintenance
+  if _maintenance is None:
+    _maintenance = DatabaseMaintenance(engine.url.database, budget=budget, vacuum_pages=vacuum_pages, quiet_rate=quiet_rate)
+    _maintenance.start(interval)
+  return _maintenance
+
+
+def stop_maintenance():
+  global _maintenance
+  if _maintenance is not None:
+    _maintenance.shutdown()
+    _maintenance = None
+
+
+def main():
+  from app.config import get_settings
+  from app.database.database import engine
+
+  settings = get_settings()
+  parser = argparse.ArgumentParser(description="Run SQLite maintenance on the app database.")
+  parser.add_argument("--steps", nargs="+", choices=STEPS, default=list(STEPS), help="steps to run, in order")
+  parser.add_argument("--budget", type=float, default=settings.maintenance_budget, help="latency budget per step in seconds")
+  args = parser.parse_args()
+
+  maintenance = DatabaseMaintenance(engine.url.database, budget=args.budget, vacuum_pages=settings.maintenance_vacuum_pages)
+  results: List[Dict] = [asdict(result) for result in maintenance.run(args.steps)]
+  print(json.dumps(results))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,77 @@
+import itertools
+import multiprocessing
+import threading
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class EntityVersions:
+  """Per-table version counters, bumped whenever a commit changes a table.
+
+  Caches compare the versions of the tables they read to decide whether they
+  are stale. After share() the counters live in shared memory, so worker
+  processes forked afterwards see each other's bumps.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._versions = {}
+    self._slots = {}
+    self._shared = None
+    self._shared_lock = None
+
+  def share(self, tables: Iterable[str]):
+    """Move the counters of the given tables into shared memory; call before forking workers."""
+    with self._lock:
+      names = sorted(set(tables) | set(self._versions))
+      self._slots = {name: slot for slot, name in enumerate(names)}
+      self._shared = multiprocessing.RawArray("q", [self._versions.get(name, 0) for name in names])
+      self._shared_lock = multiprocessing.Lock()
+
+  def bump(self, *tables):
+    """Increment the version of each of the given tables."""
+    local = [table for table in tables if table not in self._slots]
+    if len(local) < len(tables):
+      with self._shared_lock:
+        for table in tables:
+          slot = self._slots.get(table)
+          if slot is not None:
+            self._shared[slot] += 1
+    if local:
+      with self._lock:
+        for table in local:
+          self._versions[table] = self._versions.get(table, 0) + 1
+
+  def get(self, *tables):
+    """Return the current versions of the given tables as a tuple."""
+    with self._lock:
+      return tuple(
+        self._shared[self._slots[table]] if table in self._slots else self._versions.get(table, 0)
+        for table in tables
+      )
+
+
+versions = EntityVersions()
+
+
+@event.listens_for(Session, "before_flush")
+def _track_changed_tables(session, flush_context, instances):
+  changed = session.info.setdefault("changed_tables", set())
+  for obj in itertools.chain(session.new, session.dirty, session.deleted):
+    table = getattr(obj, "__tablename__", None)
+    if table is not None:
+      changed.add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_tables(session):
+  changed = session.info.pop("changed_tables", None)
+  if changed:
+    versions.bump(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+  session.info.pop("changed_tables", None)
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session, select
 
 from app.auth.auth import AuthHandler
+from app.database.group_commit import save
 from app.database.session import get_session
+from app.library.responses import FastJSONResponse
 from app.models.user_models import User, UserInput, UserLogin
 
 
@@ -14,18 +15,14 @@ auth_handler = AuthHandler()
 @user_router.post("/registration", status_code=status.HTTP_201_CREATED, tags=["Users API"])
 def register(*, session: Session = Depends(get_session), user: UserInput):
   """Register a new user"""
-  statement = select(User)
-  db_users = session.exec(statement).all()
-  if any(x.username == user.username for x in db_users):
+  statement = select(User.id).where(User.username == user.username)
+  if session.exec(statement).first() is not None:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username is taken")
   hashed_pwd = auth_handler.get_password_hash(user.password)
   new_user = User(username=user.username, password=hashed_pwd, email=user.email)
-  session.add(new_user)
-  session.commit()
-  session.refresh(new_user)
+  new_user = save(session, new_user)
   db_user = session.get(User, new_user.id)
-  user_data = jsonable_encoder(db_user)
-  return {'user': user_data}
+  return FastJSONResponse(content={'user': db_user}, status_code=status.HTTP_201_CREATED)
 
 
 @user_router.post("/login", tags=["Users API"])
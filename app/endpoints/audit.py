@@ -0,0 +1,52 @@
+# import external modules
+
+import datetime
+import json
+import logging
+
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing import List, Optional
+
+# import local modules
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.library.audit import audit_events_select, audit_log
+from app.library.routers import TimedRoute
+from app.models.audit_models import AuditEventRead
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
+
+
+logger = logging.getLogger(__name__)
+
+
+audit_router = APIRouter(route_class=TimedRoute)
+
+
+@audit_router.get("/api/audit/events", response_model=List[AuditEventRead], tags=["Audit API"])
+def read_audit_events(*,
+                      session: Session = Depends(get_session),
+                      settings: Settings = Depends(get_settings),
+                      user: User = Depends(auth_handler.get_current_user),
+                      entity: Optional[str] = None,
+                      entity_id: Optional[int] = None,
+                      user_id: Optional[int] = None,
+                      since: Optional[datetime.datetime] = None,
+                      until: Optional[datetime.datetime] = None,
+                      limit: int = Query(default=100, lte=500)
+                      ):
+  """Get the changes made to gardens, beds, plantings and plants, newest first.
+
+  Users see their own changes; the administrator sees everyone's.
+  """
+  if settings.admin_email is None or user.email != settings.admin_email:
+    user_id = user.id
+  # include changes still waiting in the write-behind buffer
+  audit_log.flush()
+  statement = audit_events_select(entity, entity_id, user_id, since, until).limit(limit)
+  return [
+    AuditEventRead(**event.dict(exclude={"changes"}), changes=json.loads(event.changes))
+    for event in session.exec(statement)
+  ]
@@ -3,17 +3,26 @@
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional
 
 # import local modules
 
+from app.config import Settings, get_settings
+from app.database.group_commit import remove, save, save_async
 from app.database.session import get_session
+from app.library.assets import asset_url
+from app.library.filters import apply_filters, apply_sort, sort_enum
 from app.library.helpers import *
+from app.library.ownership import check_parent, check_quota, get_owned, owner_id, scope
+from app.library.projection import FIELDS_QUERY, parse_fields, projected_select, projection_model, project_rows
+from app.library.reference import enum_values, references
+from app.library.responses import FastJSONResponse, encode_row, encode_rows
 from app.library.routers import TimedRoute
+from app.library.windowing import keyset_window
 from app.models.garden_models import IrrigationZone, SoilType
 from app.models.garden_models import Garden
 from app.models.garden_models import Bed, BedCreate, BedRead, BedUpdate
@@ -26,6 +35,15 @@ logger = logging.getLogger(__name__)
                                       
 bed_router = APIRouter(route_class=TimedRoute)
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
+
+
+BedSort = sort_enum("BedSort", {
+  "name": ("name",),
+  "garden_id": ("garden_id", "name"),
+  "soil_type": ("soil_type", "name"),
+  "irrigation_zone": ("irrigation_zone", "name"),
+})
 
 
 # CRUD API methods for Garden Beds
@@ -33,6 +51,7 @@ templates = Jinja2Templates(directory="templates")
 @bed_router.post("/api/beds/", status_code=status.HTTP_201_CREATED, response_model=BedRead, tags=["Garden Beds API"])
 def create_bed(*,
                session: Session = Depends(get_session),
+               settings: Settings = Depends(get_settings),
                response: Response,
                user: User = Depends(auth_handler.get_current_user),
                bed: BedCreate
@@ -41,34 +60,58 @@ def create_bed(*,
   if not user.gardener:
     response.status_code = status.HTTP_401_UNAUTHORIZED
     return {}
-  statement = select(Bed)
-  db_beds = session.exec(statement).all()
-  if any(x.name == bed.name for x in db_beds):
+  statement = scope(select(Bed.id).where(Bed.name == bed.name), Bed, user)
+  if session.exec(statement).first() is not None:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Bed with name {bed.name} already exists")
-  print(f"Bed: {bed}")
-  db_bed = Bed.from_orm(bed)
-  session.add(db_bed)
-  session.commit()
-  session.refresh(db_bed)
+  check_parent(session, Garden, bed.garden_id, user)
+  check_quota(session, user, settings)
+  db_bed = Bed.from_orm(bed, update={"owner_id": user.id})
+  db_bed = save(session, db_bed)
   return db_bed
 
 
 @bed_router.get("/api/beds/", response_model=List[BedRead], tags=["Garden Beds API"])
 def read_beds(*,
               session: Session = Depends(get_session),
+              user: Optional[User] = Depends(auth_handler.get_optional_user),
               offset: int = 0,
-              limit: int = Query(default=100, lte=100)
+              limit: int = Query(default=100, lte=100),
+              fields: Optional[str] = FIELDS_QUERY,
+              name: Optional[str] = None,
+              garden_id: Optional[int] = None,
+              soil_type: Optional[SoilType] = None,
+              irrigation_zone: Optional[IrrigationZone] = None,
+              sort: Optional[BedSort] = None
               ):
   """Get the list of defined garden beds."""
-  stmt = select(Bed).offset(offset).limit(limit)
-  db_beds = session.exec(stmt).all()
-  return db_beds
+  columns = parse_fields(BedRead, Bed, fields)
+  stmt = projected_select(Bed, columns) if columns else select(Bed)
+  stmt = scope(stmt, Bed, user)
+  stmt = apply_filters(stmt, Bed, name=name, garden_id=garden_id, soil_type=soil_type, irrigation_zone=irrigation_zone)
+  stmt = apply_sort(stmt, Bed, sort).offset(offset).limit(limit)
+  if columns:
+    db_beds = project_rows(projection_model(BedRead, columns), session.exec(stmt))
+  else:
+    db_beds = encode_rows(session.exec(stmt), BedRead)
+  return FastJSONResponse(content=db_beds)
 
 
 @bed_router.get("/api/beds/{bed_id}", response_model=BedRead, tags=["Garden Beds API"])
-def read_bed(*, session: Session = Depends(get_session), bed_id: int):
+def read_bed(*,
+             session: Session = Depends(get_session),
+             user: Optional[User] = Depends(auth_handler.get_optional_user),
+             bed_id: int,
+             fields: Optional[str] = FIELDS_QUERY
+             ):
   """Get the garden bed with the given ID, or None if it does not exist."""
-  db_bed = session.get(Bed, bed_id)
+  columns = parse_fields(BedRead, Bed, fields)
+  if columns:
+    stmt = scope(projected_select(Bed, columns).where(Bed.id == bed_id), Bed, user)
+    rows = project_rows(projection_model(BedRead, columns), session.exec(stmt))
+    if not rows:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Bed not found')
+    return FastJSONResponse(content=rows[0])
+  db_bed = get_owned(session, Bed, bed_id, user)
   if not db_bed:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Bed not found')
   return db_bed
@@ -86,25 +129,24 @@ def update_bed(*,
   if not user.gardener:
     response.status_code = status.HTTP_401_UNAUTHORIZED
     return {}
-  db_bed = session.get(Bed, bed_id)
+  db_bed = get_owned(session, Bed, bed_id, user)
   if not db_bed:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Bed not found')
   # update the planting data
   bed_data = bed.dict(exclude_unset=True)
   for key, val in bed_data.items():
     setattr(db_bed, key, val)
-  session.add(db_bed)
-  session.commit()
-  session.refresh(db_bed)
-  content = {db_bed}
+  db_bed = save(session, db_bed)
+  content = {"bed": encode_row(db_bed, BedRead)}
   headers = {"HX-Trigger": "bedsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
 
 
 @bed_router.delete("/api/beds/{bed_id}", response_model=None, status_code=status.HTTP_202_ACCEPTED, tags=["Garden Beds API"])
 def delete_bed(*,
                session: Session = Depends(get_session),
                response: Response,
+               user: Optional[User] = Depends(auth_handler.get_optional_user),
                bed_id: int,
                ):
   """Delete the garden bed with the given ID."""
@@ -112,30 +154,25 @@ def delete_bed(*,
   # if not user.gardener:
   #   response.status_code = status.HTTP_401_UNAUTHORIZED
   #   return {}
-  db_bed = session.get(Bed, bed_id)
+  db_bed = get_owned(session, Bed, bed_id, user)
   if not db_bed:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Bed not found')
-  session.delete(db_bed)
-  session.commit()
+  remove(session, db_bed)
   content = {}
   headers = {"HX-Trigger": "bedsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
 
 
 @bed_router.get("/api/beds/soil_types/", response_model=List[SoilType], tags=["Garden Beds API"])
 def read_soil_types():
   """Get the list of defined soil types."""
-  soil_types = SoilType.list()
-  print(soil_types)
-  return soil_types
+  return FastJSONResponse(content=enum_values(SoilType))
 
 
 @bed_router.get("/api/beds/irrigation_zones/", response_model=List[IrrigationZone], tags=["Garden Beds API"])
 def read_irrigation_zones():
   """Get the list of defined irrigation zones."""
-  irrigation_zones = IrrigationZone.list()
-  print(irrigation_zones)
-  return irrigation_zones
+  return FastJSONResponse(content=enum_values(IrrigationZone))
 
 
 @bed_router.get("/beds/", response_class=HTMLResponse, tags=["Pages API"])
@@ -146,64 +183,89 @@ def beds(request: Request):
 
 
 @bed_router.get("/beds/update", response_class=HTMLResponse, tags=["Pages API"])
-def beds_update(request: Request, session: Session = Depends(get_session)):
+def beds_update(*,
+                request: Request,
+                session: Session = Depends(get_session),
+                settings: Settings = Depends(get_settings),
+                user: Optional[User] = Depends(auth_handler.get_optional_user),
+                after: Optional[int] = None
+                ):
   """Update table contents for garden beds."""
-  stmt = select(Bed)
-  db_beds = session.exec(stmt).all()
-  context = {"request": request, "beds": db_beds }
+  stmt = scope(select(Bed), Bed, user).options(selectinload(Bed.garden))
+  db_beds, next_after = keyset_window(session, stmt, Bed, after, settings.table_page_size)
+  next_url = f"/beds/update?after={next_after}" if next_after is not None else None
+  context = {"request": request, "beds": db_beds, "after": after, "next_url": next_url }
   return templates.TemplateResponse('beds/partials/beds_table_body.html', context)
 
 
 @bed_router.get("/bed/create", response_class=HTMLResponse, tags=["Pages API"])
-def bed_create_form(request: Request, session: Session = Depends(get_session)):
+def bed_create_form(request: Request,
+                    session: Session = Depends(get_session),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user)
+                    ):
   """Send modal form to create a garden bed."""
-  statement = select(Garden)
-  db_gardens = session.exec(statement).all()
-  irrigation_zones = IrrigationZone.list()
-  soil_types = SoilType.list()
-  context = {"request": request, "gardens": db_gardens, "irrigation_zones": irrigation_zones, "soil_types": soil_types }
+  gardens = references.options(session, Garden, user)
+  irrigation_zones = enum_values(IrrigationZone)
+  soil_types = enum_values(SoilType)
+  context = {"request": request, "gardens": gardens, "irrigation_zones": irrigation_zones, "soil_types": soil_types }
   return templates.TemplateResponse('beds/partials/modal_form.html', context)
 
 
-@bed_router.post("/bed/create", response_class=JSONResponse, tags=["Pages API"])
-def bed_create(session: Session = Depends(get_session), form_data: BedCreate = Depends(BedCreate.as_form)):
+@bed_router.post("/bed/create", response_class=FastJSONResponse, tags=["Pages API"])
+def bed_create(session: Session = Depends(get_session),
+               settings: Settings = Depends(get_settings),
+               user: Optional[User] = Depends(auth_handler.get_optional_user),
+               form_data: BedCreate = Depends(BedCreate.as_form)
+               ):
   """Process form contents to create a garden bed."""
-  db_bed = Bed.from_orm(form_data)
-  session.add(db_bed)
-  session.commit()
-  session.refresh(db_bed)
+  check_parent(session, Garden, form_data.garden_id, user)
+  check_quota(session, user, settings)
+  db_bed = Bed.from_orm(form_data, update={"owner_id": owner_id(user)})
+  db_bed = save(session, db_bed)
   headers = {"HX-Trigger": "bedsChanged"}
-  content = {"bed": jsonable_encoder(db_bed)}
-  return JSONResponse(content=content, headers=headers)
+  content = {"bed": encode_row(db_bed, BedRead)}
+  return FastJSONResponse(content=content, headers=headers)
 
 
 @bed_router.get("/bed/edit/{bed_id}", response_class=HTMLResponse, tags=["Pages API"])
-def bed_edit_form(*, request: Request, session: Session = Depends(get_session), bed_id: int):
+def bed_edit_form(*,
+                  request: Request,
+                  session: Session = Depends(get_session),
+                  user: Optional[User] = Depends(auth_handler.get_optional_user),
+                  bed_id: int
+                  ):
   """Send modal form to edit a garden bed with the given ID."""
-  db_bed = session.get(Bed, bed_id)
+  db_bed = get_owned(session, Bed, bed_id, user)
   if not db_bed:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Bed not found')
-  statement = select(Garden)
-  db_gardens = session.exec(statement).all()
-  irrigation_zones = IrrigationZone.list()
-  soil_types = SoilType.list()
-  context = {"request": request, "bed": db_bed, "gardens": db_gardens, "irrigation_zones": irrigation_zones, "soil_types": soil_types }
+  gardens = references.options(session, Garden, user)
+  irrigation_zones = enum_values(IrrigationZone)
+  soil_types = enum_values(SoilType)
+  context = {"request": request, "bed": db_bed, "gardens": gardens, "irrigation_zones": irrigation_zones, "soil_types": soil_types }
   return templates.TemplateResponse('beds/partials/modal_form.html', context)
 
 
-@bed_router.post("/bed/edit/{bed_id}", response_class=JSONResponse, tags=["Pages API"])
-async def bed_edit(request: Request, bed_id: int, session: Session = Depends(get_session)):
+@bed_router.post("/bed/edit/{bed_id}", response_class=FastJSONResponse, tags=["Pages API"])
+async def bed_edit(request: Request,
+                   bed_id: int,
+                   session: Session = Depends(get_session),
+                   user: Optional[User] = Depends(auth_handler.get_optional_user)
+                   ):
   """Process form contents to update the details of the garden bed with the given ID."""
   form = await request.form()
-  db_bed = session.get(Bed, bed_id)
+  db_bed = get_owned(session, Bed, bed_id, user)
   if not db_bed:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Bed with ID {bed_id} not found")
+  garden_id = form.get("garden_id")
+  if garden_id:
+    if not garden_id.isdigit():
+      raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid garden ID {garden_id}")
+    check_parent(session, Garden, int(garden_id), user)
   for key, val in form.items():
-    if val != '':
+    # only editable fields, so a form cannot change the owner
+    if val != '' and key in BedCreate.__fields__:
       setattr(db_bed, key, val)
-  session.add(db_bed)
-  session.commit()
-  session.refresh(db_bed)
-  content = {"bed": jsonable_encoder(db_bed)}
-  headers = {"HX-Trigger": "bedssChanged"}
-  return JSONResponse(content=content, headers=headers)
+  db_bed = await save_async(session, db_bed)
+  content = {"bed": encode_row(db_bed, BedRead)}
+  headers = {"HX-Trigger": "bedsChanged"}
+  return FastJSONResponse(content=content, headers=headers)
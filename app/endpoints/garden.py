@@ -1,22 +1,36 @@
 # import external modules
 
 import logging
+from datetime import date
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import func
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional
 
 # import local modules
 
+from app.config import Settings, get_settings
+from app.database.group_commit import remove, save, save_async
 from app.database.session import get_session
+from app.library.climate import climate_store, sowing_window
+from app.library.assets import asset_url
+from app.library.filters import apply_filters, apply_sort, sort_enum
+from app.library.geo import bounding_box, distance_km
 from app.library.helpers import *
+from app.library.ownership import check_quota, get_owned, owner_id, scope
+from app.library.projection import FIELDS_QUERY, parse_fields, projected_select, projection_model, project_rows
+from app.library.reference import enum_values
+from app.library.responses import FastJSONResponse, encode_row, encode_rows
+from app.library.rotation import rotations
 from app.library.routers import TimedRoute
+from app.library.windowing import keyset_window
 from app.models.garden_models import ClimaticZone, GardenType
-from app.models.garden_models import Garden, GardenCreate, GardenRead, GardenUpdate
-from app.models.garden_models import Bed
+from app.models.garden_models import Garden, GardenCreate, GardenRead, GardenUpdate, garden_rtree
+from app.models.garden_models import Bed, Planting
+from app.models.plant import Plant
 from app.models.user_models import User
 from app.endpoints.api_user import auth_handler
 
@@ -26,6 +40,26 @@ logger = logging.getLogger(__name__)
 
 garden_router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
+
+
+GardenSort = sort_enum("GardenSort", {
+  "name": ("name",),
+  "type": ("type", "name"),
+  "zone": ("zone", "name"),
+})
+
+
+def gardens_in_box(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+  """Select the gardens inside a bounding box, using the R*Tree to find them."""
+  return (
+    select(Garden)
+    .join(garden_rtree, garden_rtree.c.id == Garden.id)
+    .where(garden_rtree.c.max_lat >= min_lat, garden_rtree.c.min_lat <= max_lat)
+    .where(garden_rtree.c.max_lon >= min_lon, garden_rtree.c.min_lon <= max_lon)
+    # the R*Tree stores rounded coordinates, so check the exact ones too
+    .where(Garden.latitude.between(min_lat, max_lat), Garden.longitude.between(min_lon, max_lon))
+  )
 
 
 # CRUD API methods for Garden Beds
@@ -33,6 +67,7 @@ templates = Jinja2Templates(directory="templates")
 @garden_router.post("/api/gardens/", status_code=status.HTTP_201_CREATED, response_model=GardenRead, tags=["Garden API"])
 def create_garden(*,
                session: Session = Depends(get_session),
+               settings: Settings = Depends(get_settings),
                response: Response,
                user: User = Depends(auth_handler.get_current_user),
                garden: GardenCreate
@@ -41,38 +76,149 @@ def create_garden(*,
   if not user.gardener:
     response.status_code = status.HTTP_401_UNAUTHORIZED
     return {}
-  statement = select(Garden)
-  db_gardens = session.exec(statement).all()
-  if any(x.name == garden.name for x in db_gardens):
+  statement = scope(select(Garden.id).where(Garden.name == garden.name), Garden, user)
+  if session.exec(statement).first() is not None:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Garden with name {garden.name} already exists")
-  db_garden = Bed.from_orm(garden)
-  session.add(db_garden)
-  session.commit()
-  session.refresh(db_garden)
+  check_quota(session, user, settings)
+  db_garden = Garden.from_orm(garden, update={"owner_id": user.id})
+  db_garden = save(session, db_garden)
   return db_garden
 
 
 @garden_router.get("/api/gardens/", response_model=List[GardenRead], tags=["Garden API"])
 def read_gardens(*,
               session: Session = Depends(get_session),
+              user: Optional[User] = Depends(auth_handler.get_optional_user),
               offset: int = 0,
-              limit: int = Query(default=100, lte=100)
+              limit: int = Query(default=100, lte=100),
+              fields: Optional[str] = FIELDS_QUERY,
+              name: Optional[str] = None,
+              type: Optional[GardenType] = None,
+              zone: Optional[ClimaticZone] = None,
+              sort: Optional[GardenSort] = None
               ):
   """Get the list of defined gardens."""
-  statement = select(Garden).offset(offset).limit(limit)
-  db_gardens = session.exec(statement).all()
-  return db_gardens
+  columns = parse_fields(GardenRead, Garden, fields)
+  statement = projected_select(Garden, columns) if columns else select(Garden)
+  statement = scope(statement, Garden, user)
+  statement = apply_filters(statement, Garden, name=name, type=type, zone=zone)
+  statement = apply_sort(statement, Garden, sort).offset(offset).limit(limit)
+  if columns:
+    db_gardens = project_rows(projection_model(GardenRead, columns), session.exec(statement))
+  else:
+    db_gardens = encode_rows(session.exec(statement), GardenRead)
+  return FastJSONResponse(content=db_gardens)
+
+
+@garden_router.get("/api/gardens/nearby", tags=["Garden API"])
+def read_gardens_nearby(*,
+                        session: Session = Depends(get_session),
+                        user: Optional[User] = Depends(auth_handler.get_optional_user),
+                        lat: float = Query(..., ge=-90, le=90),
+                        lon: float = Query(..., ge=-180, le=180),
+                        radius: float = Query(default=10, gt=0, le=500, description="Radius in km"),
+                        limit: int = Query(default=100, lte=100)
+                        ):
+  """Get the gardens within the radius of a point, nearest first, with their distance in km."""
+  db_gardens = session.exec(scope(gardens_in_box(*bounding_box(lat, lon, radius)), Garden, user)).all()
+  nearby = []
+  for db_garden in db_gardens:
+    distance = distance_km(lat, lon, db_garden.latitude, db_garden.longitude)
+    if distance <= radius:
+      nearby.append((distance, db_garden))
+  nearby.sort(key=lambda item: (item[0], item[1].id))
+  content = [dict(encode_row(db_garden, GardenRead), distance_km=round(distance, 3)) for distance, db_garden in nearby[:limit]]
+  return FastJSONResponse(content=content)
+
+
+@garden_router.get("/api/gardens/within", response_model=List[GardenRead], tags=["Garden API"])
+def read_gardens_within(*,
+                        session: Session = Depends(get_session),
+                        user: Optional[User] = Depends(auth_handler.get_optional_user),
+                        min_lat: float = Query(..., ge=-90, le=90),
+                        min_lon: float = Query(..., ge=-180, le=180),
+                        max_lat: float = Query(..., ge=-90, le=90),
+                        max_lon: float = Query(..., ge=-180, le=180),
+                        offset: int = 0,
+                        limit: int = Query(default=100, lte=100)
+                        ):
+  """Get the gardens inside a bounding box."""
+  if min_lat > max_lat or min_lon > max_lon:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The minimum coordinates must not exceed the maximum")
+  statement = scope(gardens_in_box(min_lat, min_lon, max_lat, max_lon), Garden, user)
+  statement = statement.order_by(Garden.id).offset(offset).limit(limit)
+  return FastJSONResponse(content=encode_rows(session.exec(statement), GardenRead))
 
 
 @garden_router.get("/api/gardens/{garden_id}", response_model=GardenRead, tags=["Garden API"])
-def read_garden(*, session: Session = Depends(get_session), garden_id: int):
+def read_garden(*,
+                session: Session = Depends(get_session),
+                user: Optional[User] = Depends(auth_handler.get_optional_user),
+                garden_id: int,
+                fields: Optional[str] = FIELDS_QUERY
+                ):
   """Get the garden with the given ID, or None if it does not exist."""
-  db_garden = session.get(Garden, garden_id)
+  columns = parse_fields(GardenRead, Garden, fields)
+  if columns:
+    statement = scope(projected_select(Garden, columns).where(Garden.id == garden_id), Garden, user)
+    rows = project_rows(projection_model(GardenRead, columns), session.exec(statement))
+    if not rows:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
+    return FastJSONResponse(content=rows[0])
+  db_garden = get_owned(session, Garden, garden_id, user)
   if not db_garden:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
   return db_garden
 
 
+@garden_router.get("/api/gardens/{garden_id}/calendar", tags=["Garden API"])
+def read_garden_calendar(*,
+                         session: Session = Depends(get_session),
+                         settings: Settings = Depends(get_settings),
+                         user: Optional[User] = Depends(auth_handler.get_optional_user),
+                         garden_id: int
+                         ):
+  """Get the frost and growing-degree-day calendar of the garden's climatic zone,
+  with the sowing window of each of its plantings."""
+  db_garden = get_owned(session, Garden, garden_id, user)
+  if not db_garden:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
+  if db_garden.zone is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} has no climatic zone')
+  zone = ClimaticZone(db_garden.zone)
+  calendar = climate_store(settings.climate_dir).calendar(zone)
+  if calendar is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'No climate history for zone {zone.value}')
+  statement = (
+    select(Planting.id, Planting.plant, Plant.harvest_max_weeks)
+    .join(Bed, Planting.bed_id == Bed.id)
+    .outerjoin(Plant, func.lower(Plant.name_common) == func.lower(Planting.plant))
+    .where(Bed.garden_id == garden_id)
+    .where(Planting.owner_id == db_garden.owner_id)
+    .order_by(Planting.id)
+  )
+  sowing = [
+    {"planting_id": planting_id, "plant": plant, "window": sowing_window(calendar, weeks)}
+    for planting_id, plant, weeks in session.exec(statement)
+  ]
+  return FastJSONResponse(content=dict(calendar, garden_id=garden_id, zone=zone, sowing=sowing))
+
+
+@garden_router.get("/api/gardens/{garden_id}/rotation", tags=["Garden API"])
+def read_garden_rotation(*,
+                         session: Session = Depends(get_session),
+                         user: Optional[User] = Depends(auth_handler.get_optional_user),
+                         garden_id: int,
+                         season: Optional[int] = None,
+                         seasons: int = Query(default=3, ge=1, le=20)
+                         ):
+  """Get the crop rotation score of every bed in the garden over the last seasons."""
+  if not get_owned(session, Garden, garden_id, user):
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
+  season = season or date.today().year
+  return FastJSONResponse(content=rotations.get(session, garden_id, season, seasons))
+
+
 @garden_router.patch("/api/gardens/{garden_id}", status_code=status.HTTP_201_CREATED, response_model=GardenRead, tags=["Garden API"])
 def update_garden(*,
                session: Session = Depends(get_session),
@@ -85,25 +231,24 @@ def update_garden(*,
   if not user.gardener:
     response.status_code = status.HTTP_401_UNAUTHORIZED
     return {}
-  db_garden = session.get(Garden, garden_id)
+  db_garden = get_owned(session, Garden, garden_id, user)
   if not db_garden:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
   # update the planting data
   garden_data = garden.dict(exclude_unset=True)
   for key, val in garden_data.items():
     setattr(db_garden, key, val)
-  session.add(db_garden)
-  session.commit()
-  session.refresh(db_garden)
-  content = {"garden": jsonable_encoder(db_garden)}
+  db_garden = save(session, db_garden)
+  content = {"garden": encode_row(db_garden, GardenRead)}
   headers = {"HX-Trigger": "gardensChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
 
 
 @garden_router.delete("/api/gardens/{garden_id}", response_model=None, status_code=status.HTTP_202_ACCEPTED, tags=["Garden API"])
 def delete_garden(*,
                session: Session = Depends(get_session),
                response: Response,
+               user: Optional[User] = Depends(auth_handler.get_optional_user),
                garden_id: int,
                ):
   """Delete the garden with the given ID."""
@@ -111,14 +256,13 @@ def delete_garden(*,
   # if not user.gardener:
   #   response.status_code = status.HTTP_401_UNAUTHORIZED
   #   return {}
-  db_garden = session.get(Garden, garden_id)
+  db_garden = get_owned(session, Garden, garden_id, user)
   if not db_garden:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
-  session.delete(db_garden)
-  session.commit()
+  remove(session, db_garden)
   content = {}
   headers = {"HX-Trigger": "gardensChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
 
 
 @garden_router.get("/gardens/", response_class=HTMLResponse, tags=["Pages API"])
@@ -129,60 +273,77 @@ def gardens(request: Request):
 
 
 @garden_router.get("/gardens/update", response_class=HTMLResponse, tags=["Pages API"])
-def gardens_update(request: Request, session: Session = Depends(get_session)):
+def gardens_update(*,
+                   request: Request,
+                   session: Session = Depends(get_session),
+                   settings: Settings = Depends(get_settings),
+                   user: Optional[User] = Depends(auth_handler.get_optional_user),
+                   after: Optional[int] = None
+                   ):
   """Update table contents for gardens."""
-  statement = select(Garden)
-  db_gardens = session.exec(statement).all()
-  context = {"request": request, "gardens": db_gardens }
+  statement = scope(select(Garden), Garden, user)
+  db_gardens, next_after = keyset_window(session, statement, Garden, after, settings.table_page_size)
+  next_url = f"/gardens/update?after={next_after}" if next_after is not None else None
+  context = {"request": request, "gardens": db_gardens, "after": after, "next_url": next_url }
   return templates.TemplateResponse('gardens/partials/gardens_table_body.html', context)
 
 
 @garden_router.get("/garden/create", response_class=HTMLResponse, tags=["Pages API"])
 def garden_create_form(request: Request):
   """Send modal form to create a garden bed"""
-  types = GardenType.list()
-  zones = ClimaticZone.list()
+  types = enum_values(GardenType)
+  zones = enum_values(ClimaticZone)
   context = {"request": request, "types": types, "zones": zones }
   return templates.TemplateResponse('gardens/partials/modal_form.html', context)
 
 
-@garden_router.post("/garden/create", response_class=JSONResponse, tags=["Pages API"])
-async def garden_create(session: Session = Depends(get_session), form_data: GardenCreate = Depends(GardenCreate.as_form)):
+@garden_router.post("/garden/create", response_class=FastJSONResponse, tags=["Pages API"])
+async def garden_create(session: Session = Depends(get_session),
+                        settings: Settings = Depends(get_settings),
+                        user: Optional[User] = Depends(auth_handler.get_optional_user),
+                        form_data: GardenCreate = Depends(GardenCreate.as_form)
+                        ):
   """Process form contents to create a garden."""
-  db_garden = Garden.from_orm(form_data)
-  session.add(db_garden)
-  session.commit()
-  session.refresh(db_garden)
+  check_quota(session, user, settings)
+  db_garden = Garden.from_orm(form_data, update={"owner_id": owner_id(user)})
+  db_garden = await save_async(session, db_garden)
   headers = {"HX-Trigger": "gardensChanged"}
-  content = {"planting": jsonable_encoder(db_garden)}
-  return JSONResponse(content=content, headers=headers)
+  content = {"planting": encode_row(db_garden, GardenRead)}
+  return FastJSONResponse(content=content, headers=headers)
 
 
 @garden_router.get("/garden/edit/{garden_id}", response_class=HTMLResponse, tags=["Pages API"])
-def garden_edit_form(request: Request, garden_id: int, session: Session = Depends(get_session)):
+def garden_edit_form(request: Request,
+                     garden_id: int,
+                     session: Session = Depends(get_session),
+                     user: Optional[User] = Depends(auth_handler.get_optional_user)
+                     ):
   """Send modal form to update the garden with the given ID."""
-  db_garden = session.get(Garden, garden_id)
+  db_garden = get_owned(session, Garden, garden_id, user)
   if not db_garden:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Garden not found')
-  types = GardenType.list()
-  zones = ClimaticZone.list()
+  types = enum_values(GardenType)
+  zones = enum_values(ClimaticZone)
   context = {"request": request, "garden": db_garden, "types": types, "zones": zones }
   return templates.TemplateResponse('gardens/partials/modal_form.html', context)
 
 
-@garden_router.post("/garden/edit/{garden_id}", response_class=JSONResponse, tags=["Pages API"])
-async def garden_edit(request: Request, garden_id: int, session: Session = Depends(get_session)):
+@garden_router.post("/garden/edit/{garden_id}", response_class=FastJSONResponse, tags=["Pages API"])
+async def garden_edit(request: Request,
+                      garden_id: int,
+                      session: Session = Depends(get_session),
+                      user: Optional[User] = Depends(auth_handler.get_optional_user)
+                      ):
   """Process form contents to update the details of the garden with the given ID."""
   form = await request.form()
-  db_garden = session.get(Garden, garden_id)
+  db_garden = get_owned(session, Garden, garden_id, user)
   if not db_garden:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Garden with ID {garden_id} not found')
   for key, val in form.items():
-    if val != '':
+    # only editable fields, so a form cannot change the owner
+    if val != '' and key in GardenUpdate.__fields__:
       setattr(db_garden, key, val)
-  session.add(db_garden)
-  session.commit()
-  session.refresh(db_garden)
-  content = {"garden": jsonable_encoder(db_garden)}
+  db_garden = await save_async(session, db_garden)
+  content = {"garden": encode_row(db_garden, GardenRead)}
   headers = {"HX-Trigger": "gardensChanged"}
-  return JSONResponse(content=content, headers=headers)
+  return FastJSONResponse(content=content, headers=headers)
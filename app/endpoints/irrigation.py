@@ -0,0 +1,39 @@
+# import external modules
+
+import logging
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlmodel import Session
+from typing import Optional
+
+# import local modules
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.library.irrigation import schedules
+from app.library.ownership import owner_id
+from app.library.responses import FastJSONResponse
+from app.library.routers import TimedRoute
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
+
+
+logger = logging.getLogger(__name__)
+
+
+irrigation_router = APIRouter(route_class=TimedRoute)
+
+
+@irrigation_router.get("/api/irrigation/schedule", tags=["Irrigation API"])
+def read_irrigation_schedule(*,
+                             session: Session = Depends(get_session),
+                             settings: Settings = Depends(get_settings),
+                             user: Optional[User] = Depends(auth_handler.get_optional_user),
+                             garden_id: Optional[int] = None
+                             ):
+  """Get the daily watering schedule of the user's beds, or of the beds of one of their gardens."""
+  if not os.path.exists(settings.weather_file):
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Weather file not found")
+  schedule = schedules.get(session, settings.weather_file)
+  return FastJSONResponse(content=schedule.for_garden(garden_id, owner_id(user)))
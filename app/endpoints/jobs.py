@@ -0,0 +1,64 @@
+# import external modules
+
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import HTMLResponse
+from sqlmodel import Session
+from typing import Optional
+
+# import local modules
+
+from app.database.session import get_session
+from app.library.jobs import cancel
+from app.library.ownership import get_owned
+from app.library.routers import TimedRoute
+from app.models.job_models import Job, JobRead
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
+from app.endpoints.pages import templates
+
+
+logger = logging.getLogger(__name__)
+
+
+jobs_router = APIRouter(route_class=TimedRoute)
+
+
+def get_job(session: Session, job_id: int, user: Optional[User]) -> Job:
+  job = get_owned(session, Job, job_id, user)
+  if not job:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+  return job
+
+
+@jobs_router.get("/api/jobs/{job_id}", response_model=JobRead, tags=["Jobs API"])
+def read_job(*,
+             session: Session = Depends(get_session),
+             user: Optional[User] = Depends(auth_handler.get_optional_user),
+             job_id: int
+             ):
+  """Get the status and progress of a background job."""
+  return get_job(session, job_id, user)
+
+
+@jobs_router.post("/api/jobs/{job_id}/cancel", response_model=JobRead, tags=["Jobs API"])
+def cancel_job(*,
+               session: Session = Depends(get_session),
+               user: Optional[User] = Depends(auth_handler.get_optional_user),
+               job_id: int
+               ):
+  """Cancel a queued job, or ask a running one to stop."""
+  return cancel(session, get_job(session, job_id, user))
+
+
+@jobs_router.get("/jobs/{job_id}/progress", response_class=HTMLResponse, tags=["Jobs API"])
+def job_progress(*,
+                 session: Session = Depends(get_session),
+                 user: Optional[User] = Depends(auth_handler.get_optional_user),
+                 request: Request,
+                 job_id: int
+                 ):
+  """Render the progress bar of a job, which polls itself until the job finishes."""
+  context = {"request": request, "job": get_job(session, job_id, user)}
+  return templates.TemplateResponse("shared/job_progress.html", context)
@@ -0,0 +1,21 @@
+# import external modules
+
+import logging
+
+from fastapi import APIRouter
+
+# import local modules
+
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/api/metrics", tags=["Metrics API"])
+def read_metrics():
+  """Get the current application counters and gauges."""
+  return metrics.snapshot()
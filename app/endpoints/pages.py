@@ -1,7 +1,8 @@
 # import external modules
 
 import logging
-from fastapi import APIRouter, Depends, Request
+from functools import lru_cache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select
@@ -9,6 +10,8 @@ from sqlmodel import Session, select
 # import local modules
 
 from app.database.session import get_session
+from app.library.assets import asset_url
+from app.library.helpers import pages
 from app.models.garden_models import Garden
 from app.models.garden_models import Bed
 from app.models.garden_models import Planting
@@ -20,24 +23,33 @@ logger = logging.getLogger(__name__)
 # pages_router = APIRouter(route_class=TimedRoute)
 pages_router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
 
 
 @pages_router.get("/", response_class=HTMLResponse, tags=["Pages API"])
 def index(request: Request, session: Session = Depends(get_session)):
-  statement = select(Garden)
-  db_gardens = session.exec(statement).all()
-  garden_exists = False
-  if len(db_gardens) > 0:
-    garden_exists = True
-  statement = select(Bed)
-  db_beds = session.exec(statement).all()
-  bed_exists = False
-  if len(db_beds) > 0:
-    bed_exists = True
-  statement = select(Planting)
-  db_plantings = session.exec(statement).all()
-  planting_exists = False
-  if len(db_plantings) > 0:
-    planting_exists = True
+  # only whether any row exists matters, so each query stops at the first
+  garden_exists = session.exec(select(Garden.id).limit(1)).first() is not None
+  bed_exists = session.exec(select(Bed.id).limit(1)).first() is not None
+  planting_exists = session.exec(select(Planting.id).limit(1)).first() is not None
   context = {"request": request, "garden_exists": garden_exists, "bed_exists": bed_exists, "planting_exists": planting_exists}
   return templates.TemplateResponse("index.html", context)
+
+
+@lru_cache(maxsize=64)
+def render_content_page(name: str, etag: str) -> str:
+  """Render a content page in the site layout, once per version of the page."""
+  return templates.get_template("pages/page.html").render(text=pages.get(f"{name}.md").html)
+
+
+@pages_router.get("/pages/{name}", response_class=HTMLResponse, tags=["Pages API"])
+def content_page(request: Request, name: str):
+  """Serve a markdown page from app/pages, revalidated by its ETag."""
+  try:
+    page = pages.get(f"{name}.md")
+  except FileNotFoundError:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Page not found")
+  headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+  if request.headers.get("if-none-match") == page.etag:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+  return HTMLResponse(render_content_page(name, page.etag), headers=headers)
@@ -2,19 +2,26 @@
 
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import HTMLResponse
 from fastapi_pagination import Page, paginate
 from jinja2 import Template
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional
 
 # import local modules
 
+from app.config import Settings, get_settings
+from app.database.group_commit import remove, save, save_async
 from app.database.session import get_session
+from app.library.catalog import CatalogError, catalog_key, decode_source, ingest_records, read_sources
+from app.library.filters import apply_filters, apply_sort, sort_enum
 from app.library.helpers import *
+from app.library.jobs import enqueue
+from app.library.projection import FIELDS_QUERY, parse_fields, paginate_projection, projected_select, projection_model, project_rows
+from app.library.responses import FastJSONResponse, encode_row
 from app.library.routers import TimedRoute
+from app.library.windowing import keyset_window
 from app.models.plant import Plant, PlantRead, PlantCreate, PlantUpdate
 from app.models.user_models import User
 from app.endpoints.api_user import auth_handler
@@ -37,6 +44,22 @@ plant_data = [
    }
 ]
 
+PlantSort = sort_enum("PlantSort", {
+  "name_common": ("name_common",),
+  "name_botanical": ("name_botanical",),
+  "family_group": ("family_group", "name_common"),
+})
+
+
+def check_unique_names(session: Session, name_botanical: Optional[str], name_common: Optional[str], plant_id: Optional[int] = None):
+  """Refuse names the catalog would take for another plant, which the unique catalog key index would reject."""
+  statement = select(Plant.id).where(Plant.catalog_key == catalog_key(name_botanical, name_common))
+  if plant_id is not None:
+    statement = statement.where(Plant.id != plant_id)
+  if session.exec(statement).first() is not None:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Plant with name {name_common} already exists")
+
+
 # CRUD API methods for Plants
 
 @plant_router.post("/api/plants/", status_code=status.HTTP_201_CREATED, response_model=PlantRead, tags=["Plant API"])
@@ -50,32 +73,76 @@ def create_plant(*,
   # if not user.gardener:
   #   response.status_code = status.HTTP_401_UNAUTHORIZED
   #   return {}
-  statement = select(plant)
-  db_plants = session.exec(statement).all()
-  if any(x.name == plant.name for x in db_plants):
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Plant with name {plant.name} already exists")
+  statement = select(Plant.id).where(Plant.name_common == plant.name_common)
+  if session.exec(statement).first() is not None:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Plant with name {plant.name_common} already exists")
+  check_unique_names(session, plant.name_botanical, plant.name_common)
   db_plant = Plant.from_orm(plant)
-  session.add(db_plant)
-  session.commit()
-  session.refresh(db_plant)
+  db_plant = save(session, db_plant)
   return db_plant
 
 
+@plant_router.post("/api/plants/catalog", tags=["Plant API"])
+def ingest_catalog(*,
+                   session: Session = Depends(get_session),
+                   user: User = Depends(auth_handler.get_current_user),
+                   files: List[UploadFile] = File(...),
+                   background: bool = False,
+                   priority: int = 0
+                   ):
+  """Bulk insert or update plants from JSON or CSV catalog dumps.
+
+  With `background` the dumps are ingested by a background job, and the
+  response gives its ID to poll at /api/jobs/{id}. A dump that is not UTF-8,
+  or not valid JSON or CSV, is refused with a 422 naming the file.
+  """
+  try:
+    sources = {file.filename: decode_source(file.file.read(), file.filename) for file in files}
+    # parsed before queueing too, so a malformed dump is refused rather than failing the job
+    raw_records = read_sources(sources)
+  except CatalogError as exc:
+    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+  if background:
+    job = enqueue(session, "catalog.ingest", {"sources": sources}, priority=priority, owner_id=user.id)
+    return FastJSONResponse(content={"job_id": job.id, "status": job.status}, status_code=status.HTTP_202_ACCEPTED)
+  report = ingest_records(session, raw_records)
+  return report.dict()
+
+
 @plant_router.get("/api/plants/", response_model=Page[PlantRead], tags=["Plant API"])
 def read_plants(*,
               session: Session = Depends(get_session),
               offset: int = 0,
-              limit: int = Query(default=100, lte=100)
+              limit: int = Query(default=100, lte=100),
+              fields: Optional[str] = FIELDS_QUERY,
+              name_common: Optional[str] = None,
+              name_botanical: Optional[str] = None,
+              family_group: Optional[str] = None,
+              sort: Optional[PlantSort] = None
               ):
   """Get the list of defined plants."""
-  statement = select(Plant).offset(offset).limit(limit)
+  columns = parse_fields(PlantRead, Plant, fields)
+  statement = projected_select(Plant, columns) if columns else select(Plant)
+  statement = apply_filters(statement, Plant, name_common=name_common, name_botanical=name_botanical, family_group=family_group)
+  statement = apply_sort(statement, Plant, sort).offset(offset).limit(limit)
+  if columns:
+    model = projection_model(PlantRead, columns)
+    db_plants = project_rows(model, session.exec(statement))
+    return FastJSONResponse(content=paginate_projection(model, db_plants))
   db_plants = session.exec(statement).all()
   return paginate(db_plants)
 
 
 @plant_router.get("/api/plants/{plant_id}", response_model=PlantRead, tags=["Plant API"])
-def read_plant(*, session: Session = Depends(get_session), plant_id: int):
+def read_plant(*, session: Session = Depends(get_session), plant_id: int, fields: Optional[str] = FIELDS_QUERY):
   """Get the plant with the given ID, or None if it does not exist."""
+  columns = parse_fields(PlantRead, Plant, fields)
+  if columns:
+    statement = projected_select(Plant, columns).where(Plant.id == plant_id)
+    rows = project_rows(projection_model(PlantRead, columns), session.exec(statement))
+    if not rows:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Plant with ID {plant_id} not found')
+    return FastJSONResponse(content=rows[0])
   db_plant = session.get(Plant, plant_id)
   if not db_plant:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Plant with ID {plant_id} not found')
@@ -97,14 +164,14 @@ def update_plant(*,
   if not db_plant:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Plant with ID {plant_id} not found')
   plant_data = plant.dict(exclude_unset=True)
+  check_unique_names(session, plant_data.get("name_botanical", db_plant.name_botanical),
+                     plant_data.get("name_common", db_plant.name_common), plant_id)
   for key, val in plant_data.items():
     setattr(db_plant, key, val)
-  session.add(db_plant)
-  session.commit()
-  session.refresh(db_plant)
-  content = {"plant": jsonable_encoder(db_plant)}
+  db_plant = save(session, db_plant)
+  content = {"plant": encode_row(db_plant, PlantRead)}
   headers = {"HX-Trigger": "plantsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
 
 
 @plant_router.delete("/api/plants/{plant_id}", response_model=None, status_code=status.HTTP_202_ACCEPTED, tags=["Plant API"])
@@ -117,11 +184,10 @@ def delete_plant(*, session: Session = Depends(get_session), plant_id: int):
   db_plant = session.get(Plant, plant_id)
   if not db_plant:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Plant with ID {plant_id} not found')
-  session.delete(db_plant)
-  session.commit()
+  remove(session, db_plant)
   content = {}
   headers = {"HX-Trigger": "plantsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
 
 
 @plant_router.get("/plants/", response_class=HTMLResponse, tags=["Plant API"])
@@ -132,11 +198,17 @@ def plants(request: Request):
 
 
 @plant_router.get("/plants/update", response_class=HTMLResponse, tags=["Plant API"])
-def plants_update(request: Request, session: Session = Depends(get_session)):
+def plants_update(*,
+                  request: Request,
+                  session: Session = Depends(get_session),
+                  settings: Settings = Depends(get_settings),
+                  after: Optional[int] = None
+                  ):
   """Update table contents for plants."""
   statement = select(Plant)
-  db_plants = session.exec(statement).all()
-  context = {"request": request, "plants": db_plants }
+  db_plants, next_after = keyset_window(session, statement, Plant, after, settings.table_page_size)
+  next_url = f"/plants/update?after={next_after}" if next_after is not None else None
+  context = {"request": request, "plants": db_plants, "after": after, "next_url": next_url }
   return templates.TemplateResponse('plants/partials/plants_table_body.html', context)
 
 
@@ -147,16 +219,15 @@ def plant_create_form(request: Request):
   return templates.TemplateResponse('plants/partials/modal_form.html', context)
 
 
-@plant_router.post("/plant/create", response_class=JSONResponse, tags=["Plant API"])
+@plant_router.post("/plant/create", response_class=FastJSONResponse, tags=["Plant API"])
 async def plant_create(session: Session = Depends(get_session), form_data: PlantCreate = Depends(PlantCreate.as_form)):
   """Process form contents to create a plant."""
+  check_unique_names(session, form_data.name_botanical, form_data.name_common)
   db_plant = Plant.from_orm(form_data)
-  session.add(db_plant)
-  session.commit()
-  session.refresh(db_plant)
+  db_plant = await save_async(session, db_plant)
   headers = {"HX-Trigger": "plantsChanged"}
-  content = {"planting": jsonable_encoder(db_plant)}
-  return JSONResponse(content=content, headers=headers)
+  content = {"planting": encode_row(db_plant, PlantRead)}
+  return FastJSONResponse(content=content, headers=headers)
 
 
 @plant_router.get("/plant/edit/{plant_id}", response_class=HTMLResponse, tags=["Plant API"])
@@ -169,19 +240,19 @@ def plant_edit_form(request: Request, plant_id: int, session: Session = Depends(
   return templates.TemplateResponse('plants/partials/modal_form.html', context)
 
 
-@plant_router.post("/plant/edit/{plant_id}", response_class=JSONResponse, tags=["Plant API"])
+@plant_router.post("/plant/edit/{plant_id}", response_class=FastJSONResponse, tags=["Plant API"])
 async def plant_edit(request: Request, plant_id: int, session: Session = Depends(get_session)):
   """Process form contents to update the details of the plant with the given ID."""
   form = await request.form()
   db_plant = session.get(Plant, plant_id)
   if not db_plant:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'plant with ID {plant_id} not found')
-  for key, val in form.items():
-    if val != '':
-      setattr(db_plant, key, val)
-  session.add(db_plant)
-  session.commit()
-  session.refresh(db_plant)
-  content = {"plant": jsonable_encoder(db_plant)}
+  changes = {key: val for key, val in form.items() if val != ''}
+  check_unique_names(session, changes.get("name_botanical", db_plant.name_botanical),
+                     changes.get("name_common", db_plant.name_common), plant_id)
+  for key, val in changes.items():
+    setattr(db_plant, key, val)
+  db_plant = await save_async(session, db_plant)
+  content = {"plant": encode_row(db_plant, PlantRead)}
   headers = {"HX-Trigger": "plantsChanged"}
-  return JSONResponse(content=content, headers=headers)
+  return FastJSONResponse(content=content, headers=headers)
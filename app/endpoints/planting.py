@@ -1,19 +1,31 @@
 # import external modules
 
 import logging
+from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional
 
 # import local modules
 
+from app.config import Settings, get_settings
+from app.database.group_commit import remove, save, save_async
 from app.database.session import get_session
+from app.library.assets import asset_url
+from app.library.filters import apply_filters, apply_sort, sort_enum
+from app.library.harvest import MAX_HARVEST_SPAN_WEEKS
 from app.library.helpers import *
+from app.library.ownership import check_parent, check_quota, get_owned, owner_id, scope
+from app.library.projection import FIELDS_QUERY, parse_fields, projected_select, projection_model, project_rows
+from app.library.reference import references
+from app.library.responses import FastJSONResponse, encode_row, encode_rows
 from app.library.routers import TimedRoute
+from app.library.streaming import StreamingTemplateResponse, stream_rows
+from app.library.windowing import keyset_window
 from app.models.garden_models import Bed
 from app.models.garden_models import Planting, PlantingCreate, PlantingRead, PlantingUpdate
 from app.models.user_models import User
@@ -25,6 +37,27 @@ logger = logging.getLogger(__name__)
                                       
 planting_router = APIRouter(route_class=TimedRoute)
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = asset_url
+
+
+PlantingSort = sort_enum("PlantingSort", {
+  "plant": ("plant", "variety"),
+  "variety": ("variety",),
+  "bed_id": ("bed_id", "plant", "variety"),
+})
+
+
+def harvest_due_select(date_from: date, date_to: date):
+  """Select plantings with a harvest window overlapping the dates, in harvest order."""
+  # windows are at most MAX_HARVEST_SPAN_WEEKS long, which bounds the index range scanned
+  earliest_start = date_from - timedelta(weeks=MAX_HARVEST_SPAN_WEEKS)
+  return (
+    select(Planting)
+    .where(Planting.harvest_start >= earliest_start)
+    .where(Planting.harvest_start <= date_to)
+    .where(Planting.harvest_end >= date_from)
+    .order_by(Planting.harvest_start, Planting.harvest_end, Planting.id)
+  )
 
 
 # CRUD API methods for Garden Plantings
@@ -32,35 +65,75 @@ templates = Jinja2Templates(directory="templates")
 @planting_router.post("/api/plantings/", response_model=PlantingRead, status_code=status.HTTP_201_CREATED, tags=["Garden Plantings API"])
 def create_planting(*,
                     session: Session = Depends(get_session),
+                    settings: Settings = Depends(get_settings),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user),
                     planting: PlantingCreate
                     ):
   """Create a garden planting."""
-  db_planting = Planting.from_orm(planting)
-  session.add(db_planting)
-  session.commit()
-  session.refresh(db_planting)
+  check_parent(session, Bed, planting.bed_id, user)
+  check_quota(session, user, settings)
+  db_planting = Planting.from_orm(planting, update={"owner_id": owner_id(user)})
+  db_planting = save(session, db_planting)
   return db_planting
 
 
 @planting_router.get("/api/plantings/", response_model=List[PlantingRead], tags=["Garden Plantings API"])
 def read_plantings(*,
                    session: Session = Depends(get_session),
+                   user: Optional[User] = Depends(auth_handler.get_optional_user),
                    offset: int = 0,
-                   limit: int = Query(default=100, lte=100)
+                   limit: int = Query(default=100, lte=100),
+                   fields: Optional[str] = FIELDS_QUERY,
+                   bed_id: Optional[int] = None,
+                   plant: Optional[str] = None,
+                   variety: Optional[str] = None,
+                   sort: Optional[PlantingSort] = None
                    ):
   """Get the list of defined garden plantings."""
-  stmt = select(Planting).offset(offset).limit(limit)
-  db_plantings = session.exec(stmt).all()
-  return db_plantings
+  columns = parse_fields(PlantingRead, Planting, fields)
+  stmt = projected_select(Planting, columns) if columns else select(Planting)
+  stmt = scope(stmt, Planting, user)
+  stmt = apply_filters(stmt, Planting, bed_id=bed_id, plant=plant, variety=variety)
+  stmt = apply_sort(stmt, Planting, sort).offset(offset).limit(limit)
+  if columns:
+    db_plantings = project_rows(projection_model(PlantingRead, columns), session.exec(stmt))
+  else:
+    db_plantings = encode_rows(session.exec(stmt), PlantingRead)
+  return FastJSONResponse(content=db_plantings)
+
+
+@planting_router.get("/api/plantings/harvest-due", response_model=List[PlantingRead], tags=["Garden Plantings API"])
+def read_plantings_harvest_due(*,
+                               session: Session = Depends(get_session),
+                               user: Optional[User] = Depends(auth_handler.get_optional_user),
+                               date_from: date = Query(..., alias="from"),
+                               date_to: date = Query(..., alias="to"),
+                               offset: int = 0,
+                               limit: int = Query(default=100, lte=100),
+                               ):
+  """Get the garden plantings with a harvest window overlapping the given dates."""
+  if date_to < date_from:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must not be before 'from'")
+  stmt = scope(harvest_due_select(date_from, date_to), Planting, user).offset(offset).limit(limit)
+  return FastJSONResponse(content=encode_rows(session.exec(stmt), PlantingRead))
 
 
 @planting_router.get("/api/plantings/{planting_id}", response_model=PlantingRead, tags=["Garden Plantings API"])
 def read_planting(*,
                   session: Session = Depends(get_session),
+                  user: Optional[User] = Depends(auth_handler.get_optional_user),
                   planting_id: int, #= Path(None, description="The ID of the planting  to return")
+                  fields: Optional[str] = FIELDS_QUERY,
                   ):
   """Get the garden planting with the given ID, or None if it does not exist."""
-  db_planting = session.get(Planting, planting_id)
+  columns = parse_fields(PlantingRead, Planting, fields)
+  if columns:
+    stmt = scope(projected_select(Planting, columns).where(Planting.id == planting_id), Planting, user)
+    rows = project_rows(projection_model(PlantingRead, columns), session.exec(stmt))
+    if not rows:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Planting not found")
+    return FastJSONResponse(content=rows[0])
+  db_planting = get_owned(session, Planting, planting_id, user)
   if not db_planting:
     raise HTTPException(status_code=404, detail="Planting not found")
   return db_planting
@@ -69,41 +142,41 @@ def read_planting(*,
 @planting_router.patch("/api/plantings/{planting_id}", response_model=None, status_code=status.HTTP_201_CREATED, tags=["Garden Plantings API"])
 def update_planting(*,
                     session: Session = Depends(get_session),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user),
                     planting_id: int,
                     planting: PlantingUpdate,
                     ):
   """Update the details of the garden planting with the given ID."""
-  db_planting = session.get(Planting, planting_id)
+  db_planting = get_owned(session, Planting, planting_id, user)
   if not db_planting:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Planting not found")
   # update the planting data
   print(planting)
   planting_data = planting.dict(exclude_unset=True)
+  check_parent(session, Bed, planting_data.get("bed_id"), user)
   print(planting_data)
   for key, val in planting_data.items():
     setattr(db_planting, key, val)
-  session.add(db_planting)
-  session.commit()
-  session.refresh(db_planting)
-  content = {"planting": jsonable_encoder(db_planting)}
+  db_planting = save(session, db_planting)
+  content = {"planting": encode_row(db_planting, PlantingRead)}
   headers = {"HX-Trigger": "plantingsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_201_CREATED, headers=headers)
 
 
 @planting_router.delete("/api/plantings/{planting_id}", response_model=None, status_code=status.HTTP_202_ACCEPTED, tags=["Garden Plantings API"])
 def delete_planting(*,
                     session: Session = Depends(get_session),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user),
                     planting_id: int,
                     ):
   """Delete the garden planting with the given ID."""
-  db_planting = session.get(Planting, planting_id)
+  db_planting = get_owned(session, Planting, planting_id, user)
   if not db_planting:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Planting not found")
-  session.delete(db_planting)
-  session.commit()
+  remove(session, db_planting)
   content = {}
   headers = {"HX-Trigger": "plantingsChanged"}
-  return JSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
+  return FastJSONResponse(content=content, status_code=status.HTTP_200_OK, headers=headers)
 
 @planting_router.get("/plantings/", response_class=HTMLResponse, tags=["Pages API"])
 def plantings(request: Request):
@@ -113,44 +186,80 @@ def plantings(request: Request):
 
 
 @planting_router.get("/plantings/update", response_class=HTMLResponse, tags=["Pages API"])
-def plantings_update(request: Request, session: Session = Depends(get_session)):
+def plantings_update(*,
+                     request: Request,
+                     session: Session = Depends(get_session),
+                     settings: Settings = Depends(get_settings),
+                     user: Optional[User] = Depends(auth_handler.get_optional_user),
+                     after: Optional[int] = None
+                     ):
   """Update table contents for garden plantings."""
-  statement = select(Planting)
-  db_plantings = session.exec(statement).all()
-  context = {"request": request, "plantings": db_plantings }
+  statement = scope(select(Planting), Planting, user).options(selectinload(Planting.bed))
+  db_plantings, next_after = keyset_window(session, statement, Planting, after, settings.table_page_size)
+  next_url = f"/plantings/update?after={next_after}" if next_after is not None else None
+  context = {"request": request, "plantings": db_plantings, "after": after, "next_url": next_url }
   return templates.TemplateResponse('plantings/partials/plantings_table_body.html', context)
 
 
+@planting_router.get("/plantings/print", response_class=HTMLResponse, tags=["Pages API"])
+def plantings_print(request: Request,
+                    session: Session = Depends(get_session),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user)
+                    ):
+  """Stream a printable list of all garden plantings."""
+  statement = (
+    select(Planting.plant, Planting.variety, Planting.notes, Bed.name.label("bed_name"))
+    .outerjoin(Bed, Planting.bed_id == Bed.id)
+    .order_by(Planting.bed_id, Planting.plant)
+    .execution_options(yield_per=500)
+  )
+  statement = scope(statement, Planting, user)
+  # the request's session may be closed before the body is streamed
+  db_plantings = stream_rows(session.get_bind(), statement)
+  context = {"request": request, "plantings": db_plantings }
+  return StreamingTemplateResponse(templates, "plantings/print.html", context)
+
+
 @planting_router.get("/planting/create", response_class=HTMLResponse, tags=["Pages API"])
-def planting_create_form(request: Request, session: Session = Depends(get_session)):
+def planting_create_form(request: Request,
+                         session: Session = Depends(get_session),
+                         user: Optional[User] = Depends(auth_handler.get_optional_user)
+                         ):
   """Send modal form to create a garden planting."""
-  statement = select(Bed)
-  db_beds = session.exec(statement).all()
-  context = {"request": request, "beds": db_beds }
+  beds = references.options(session, Bed, user)
+  context = {"request": request, "beds": beds }
   return templates.TemplateResponse('plantings/partials/modal_form.html', context)
 
 
-@planting_router.post("/planting/create", response_class=JSONResponse, tags=["Pages API"])
-def planting_create(session: Session = Depends(get_session), form_data: PlantingCreate = Depends(PlantingCreate.as_form)):
+@planting_router.post("/planting/create", response_class=FastJSONResponse, tags=["Pages API"])
+def planting_create(session: Session = Depends(get_session),
+                    settings: Settings = Depends(get_settings),
+                    user: Optional[User] = Depends(auth_handler.get_optional_user),
+                    form_data: PlantingCreate = Depends(PlantingCreate.as_form)
+                    ):
   """Process form contents to create a garden planting."""
-  db_planting = Planting.from_orm(form_data)
-  session.add(db_planting)
-  session.commit()
-  session.refresh(db_planting)
+  check_parent(session, Bed, form_data.bed_id, user)
+  check_quota(session, user, settings)
+  db_planting = Planting.from_orm(form_data, update={"owner_id": owner_id(user)})
+  db_planting = save(session, db_planting)
   headers = {"HX-Trigger": "plantingsChanged"}
-  content = {"planting": jsonable_encoder(db_planting)}
-  return JSONResponse(content=content, headers=headers)
+  content = {"planting": encode_row(db_planting, PlantingRead)}
+  return FastJSONResponse(content=content, headers=headers)
 
 
 @planting_router.get("/planting/edit/{planting_id}", response_class=HTMLResponse, tags=["Pages API"])
-def planting_edit_form(*, request: Request, session: Session = Depends(get_session), planting_id: int):
+def planting_edit_form(*,
+                       request: Request,
+                       session: Session = Depends(get_session),
+                       user: Optional[User] = Depends(auth_handler.get_optional_user),
+                       planting_id: int
+                       ):
   """Send modal form to update a garden planting with the given ID."""
-  db_planting = session.get(Planting, planting_id)
+  db_planting = get_owned(session, Planting, planting_id, user)
   if not db_planting:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Planting not found')
-  statement = select(Bed)
-  db_beds = session.exec(statement).all()
-  context = {"request": request, "planting": db_planting, "beds": db_beds }
+  beds = references.options(session, Bed, user)
+  context = {"request": request, "planting": db_planting, "beds": beds }
   return templates.TemplateResponse('plantings/partials/modal_form.html', context)
 
 
@@ -172,20 +281,24 @@ def planting_edit_form(*, request: Request, session: Session = Depends(get_sessi
 #   return JSONResponse(content=content, headers=headers)
 
 
-@planting_router.post("/planting/edit/{planting_id}", response_class=JSONResponse, tags=["Pages API"])
-async def planting_edit(request: Request, planting_id: int, form_data: PlantingUpdate = Depends(PlantingUpdate.as_form), session: Session = Depends(get_session)):
+@planting_router.post("/planting/edit/{planting_id}", response_class=FastJSONResponse, tags=["Pages API"])
+async def planting_edit(request: Request,
+                        planting_id: int,
+                        form_data: PlantingUpdate = Depends(PlantingUpdate.as_form),
+                        session: Session = Depends(get_session),
+                        user: Optional[User] = Depends(auth_handler.get_optional_user)
+                        ):
   """Process form contents to update the details of the garden planting with the given ID."""
-  db_planting = session.get(Planting, planting_id)
+  db_planting = get_owned(session, Planting, planting_id, user)
   if not db_planting:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Planting with ID {planting_id} not found')
   print(form_data)
   planting_data = form_data.dict(exclude_unset=True)
   print(planting_data)
+  check_parent(session, Bed, planting_data.get("bed_id"), user)
   for key, val in planting_data.items():
     setattr(db_planting, key, val)
-  session.add(db_planting)
-  session.commit()
-  session.refresh(db_planting)
-  content = {"planting": jsonable_encoder(db_planting)}
+  db_planting = await save_async(session, db_planting)
+  content = {"planting": encode_row(db_planting, PlantingRead)}
   headers = {"HX-Trigger": "plantingsChanged"}
-  return JSONResponse(content=content, headers=headers)
+  return FastJSONResponse(content=content, headers=headers)
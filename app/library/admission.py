@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+AUTH = "auth"
+WRITES = "writes"
+PAGES = "pages"
+READS = "reads"
+
+AUTH_PATHS = ("/login", "/registration", "/users/")
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+EXEMPT_PATHS = ("/static/",)
+
+
+@dataclass
+class AdmissionLimit:
+  """Concurrency limit and bounded wait queue for a group of routes."""
+  concurrency: int
+  queue_size: int
+  queue_timeout: float
+  retry_after: int = 1
+
+
+DEFAULT_LIMITS: Dict[str, AdmissionLimit] = {
+  AUTH: AdmissionLimit(concurrency=4, queue_size=16, queue_timeout=2.0),
+  WRITES: AdmissionLimit(concurrency=8, queue_size=32, queue_timeout=2.0),
+  PAGES: AdmissionLimit(concurrency=16, queue_size=64, queue_timeout=1.0),
+  READS: AdmissionLimit(concurrency=32, queue_size=128, queue_timeout=1.0),
+}
+
+
+def route_group(method: str, path: str) -> str:
+  """Return the admission group for a request."""
+  if path.startswith(AUTH_PATHS):
+    return AUTH
+  if method not in SAFE_METHODS:
+    return WRITES
+  if path.startswith("/api/"):
+    return READS
+  return PAGES
+
+
+class _Gate:
+  """Semaphore with a bounded number of waiters."""
+
+  def __init__(self, name: str, limit: AdmissionLimit):
+    self.name = name
+    self.limit = limit
+    self.semaphore = asyncio.Semaphore(limit.concurrency)
+    self.waiting = 0
+    self.active = 0
+
+  def _publish(self):
+    metrics.gauge(f"admission.{self.name}.queue_depth", self.waiting)
+    metrics.gauge(f"admission.{self.name}.active", self.active)
+
+  async def acquire(self) -> bool:
+    """Wait for a slot, returning False if the request should be shed."""
+    if not self.semaphore.locked():
+      # a free slot is available so this does not block
+      await self.semaphore.acquire()
+    elif self.waiting >= self.limit.queue_size:
+      metrics.incr(f"admission.{self.name}.rejected")
+      return False
+    else:
+      self.waiting += 1
+      self._publish()
+      try:
+        await asyncio.wait_for(self.semaphore.acquire(), timeout=self.limit.queue_timeout)
+      except asyncio.TimeoutError:
+        metrics.incr(f"admission.{self.name}.timed_out")
+        metrics.incr(f"admission.{self.name}.rejected")
+        return False
+      finally:
+        self.waiting -= 1
+    self.active += 1
+    metrics.incr(f"admission.{self.name}.admitted")
+    self._publish()
+    return True
+
+  def release(self):
+    self.active -= 1
+    self.semaphore.release()
+    self._publish()
+
+
+class AdmissionControlMiddleware:
+  """ASGI middleware limiting concurrent requests per route group.
+
+  Requests wait in a bounded queue for a free slot; when the queue is full or
+  the wait exceeds the group's timeout a 503 with Retry-After is returned.
+  """
+
+  def __init__(self, app: ASGIApp, limits: Dict[str, AdmissionLimit] = None):
+    self.app = app
+    limits = limits or DEFAULT_LIMITS
+    self.gates = {name: _Gate(name, limit) for name, limit in limits.items()}
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+      await self.app(scope, receive, send)
+      return
+    gate = self.gates.get(route_group(scope["method"], scope["path"]))
+    if gate is None:
+      await self.app(scope, receive, send)
+      return
+    if not await gate.acquire():
+      logger.warning(f"Shedding {scope['method']} {scope['path']} ({gate.name} overloaded)")
+      response = JSONResponse(
+        content={"detail": "Service overloaded, try again later"},
+        status_code=503,
+        headers={"Retry-After": str(gate.limit.retry_after)},
+      )
+      await response(scope, receive, send)
+      return
+    try:
+      await self.app(scope, receive, send)
+    finally:
+      gate.release()
@@ -0,0 +1,258 @@
+"""Static asset pipeline: vendored, fingerprinted, precompressed, cached forever.
+
+Third party scripts and styles are downloaded once into static/vendor/ and
+committed, with
+
+    python -m app.library.assets fetch
+
+which refuses a download whose SHA-256 differs from the one pinned in
+app/library/vendor.sha256, so a changed or tampered CDN file fails the build.
+After changing a version in VENDOR_ASSETS, pin the new files with
+
+    python -m app.library.assets pin
+
+and review the new checksums like any other change.
+
+Before deploying (the Dockerfile does this)
+
+    python -m app.library.assets build
+
+copies every file under static/ to static/dist/ with a content hash in its
+name, writes gzip and, when the brotli package is installed, brotli variants
+of text files next to it, and records the hashed names in
+static/dist/manifest.json. Templates link assets through asset_url(), which
+returns the hashed URL, so a changed file gets a new URL and an unchanged one
+can be cached by browsers for good. Without a build asset_url() falls back to
+the plain /static/ URL, or the CDN, with a warning, for a vendored file not
+fetched yet.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+import urllib.request
+from typing import Dict, Optional, Set
+
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+
+logger = logging.getLogger(__name__)
+
+
+STATIC_DIR = "static"
+STATIC_URL = "/static/"
+DIST = "dist"
+MANIFEST = "manifest.json"
+# `sha256sum` lines of the vendored files, written by pin() and checked by fetch()
+VENDOR_CHECKSUMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor.sha256")
+
+VENDOR_ASSETS = {
+  "vendor/daisyui-2.50.1.css": "https://cdn.jsdelivr.net/npm/daisyui@2.50.1/dist/full.css",
+  "vendor/htmx-1.8.5.min.js": "https://unpkg.com/htmx.org@1.8.5/dist/htmx.min.js",
+  "vendor/hyperscript-0.9.7.min.js": "https://unpkg.com/hyperscript.org@0.9.7/dist/_hyperscript.min.js",
+  # the Tailwind browser JIT, which generates the page's CSS as it loads
+  "vendor/tailwindcss-3.2.4.js": "https://cdn.tailwindcss.com/3.2.4",
+}
+
+COMPRESSIBLE = (".css", ".js", ".json", ".svg", ".txt", ".map")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Content-Encoding of each precompressed variant, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class AssetError(Exception):
+  pass
+
+
+def fingerprint(path: str, content: bytes) -> str:
+  """Return the path with the first 12 hex digits of the content's SHA-256 before the extension."""
+  stem, extension = os.path.splitext(path)
+  return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+
+
+def _compress(path: str, content: bytes):
+  # mtime=0 keeps the gzip variant byte for byte the same between builds
+  with open(path + ".gz", "wb") as output_file:
+    output_file.write(gzip.compress(content, compresslevel=9, mtime=0))
+  try:
+    import brotli
+  except ImportError:
+    return
+  with open(path + ".br", "wb") as output_file:
+    output_file.write(brotli.compress(content, quality=11))
+
+
+def build(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+  """Fingerprint and precompress every asset under static_dir, returning the manifest."""
+  dist_dir = os.path.join(static_dir, DIST)
+  manifest = {}
+  for directory, subdirectories, filenames in os.walk(static_dir):
+    if os.path.abspath(directory) == os.path.abspath(static_dir):
+      subdirectories[:] = [name for name in subdirectories if name != DIST]
+    for filename in filenames:
+      source = os.path.join(directory, filename)
+      path = os.path.relpath(source, static_dir).replace(os.sep, "/")
+      with open(source, "rb") as input_file:
+        content = input_file.read()
+      manifest[path] = fingerprint(path, content)
+  if os.path.isdir(dist_dir):
+    shutil.rmtree(dist_dir)
+  for path, hashed in manifest.items():
+    target = os.path.join(dist_dir, hashed)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(os.path.join(static_dir, path), target)
+    if path.endswith(COMPRESSIBLE):
+      with open(target, "rb") as input_file:
+        _compress(target, input_file.read())
+  with open(os.path.join(dist_dir, MANIFEST), "w", encoding="utf-8") as manifest_file:
+    json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+  return manifest
+
+
+def _download(url: str) -> bytes:
+  with urllib.request.urlopen(url) as response:
+    return response.read()
+
+
+def read_checksums(checksums_file: str = VENDOR_CHECKSUMS) -> Dict[str, str]:
+  """Return the pinned SHA-256 of each vendored path."""
+  try:
+    with open(checksums_file, "r", encoding="utf-8") as input_file:
+      lines = [line.split() for line in input_file if line.strip()]
+  except FileNotFoundError:
+    return {}
+  return {path: digest for digest, path in lines}
+
+
+def pin(checksums_file: str = VENDOR_CHECKSUMS) -> Dict[str, str]:
+  """Download the vendored assets and record their checksums."""
+  checksums = {path: hashlib.sha256(_download(url)).hexdigest() for path, url in VENDOR_ASSETS.items()}
+  with open(checksums_file, "w", encoding="utf-8") as output_file:
+    for path in sorted(checksums):
+      output_file.write(f"{checksums[path]}  {path}\n")
+  return checksums
+
+
+def fetch(static_dir: str = STATIC_DIR, checksums_file: str = VENDOR_CHECKSUMS):
+  """Download the vendored assets into static_dir, refusing any that does not match its pinned checksum."""
+  checksums = read_checksums(checksums_file)
+  unpinned = sorted(set(VENDOR_ASSETS) - set(checksums))
+  if unpinned:
+    raise AssetError(f"No pinned checksum for {', '.join(unpinned)}; run python -m app.library.assets pin")
+  for path, url in VENDOR_ASSETS.items():
+    content = _download(url)
+    digest = hashlib.sha256(content).hexdigest()
+    if digest != checksums[path]:
+      raise AssetError(f"{url} has SHA-256 {digest}, not the pinned {checksums[path]}")
+    target = os.path.join(static_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "wb") as output_file:
+      output_file.write(content)
+    print(f"{url} -> {target}")
+
+
+class AssetManifest:
+  """The hashed names of the built assets, read on first use."""
+
+  def __init__(self, static_dir: str = STATIC_DIR):
+    self.static_dir = static_dir
+    self._lock = threading.Lock()
+    self._manifest: Optional[Dict[str, str]] = None
+    self._warned: Set[str] = set()
+
+  def _load(self) -> Dict[str, str]:
+    try:
+      with open(os.path.join(self.static_dir, DIST, MANIFEST), "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+    except FileNotFoundError:
+      return {}
+
+  def url(self, path: str) -> str:
+    manifest = self._manifest
+    if manifest is None:
+      with self._lock:
+        if self._manifest is None:
+          self._manifest = self._load()
+        manifest = self._manifest
+    hashed = manifest.get(path)
+    if hashed is not None:
+      return f"{STATIC_URL}{DIST}/{hashed}"
+    if path in VENDOR_ASSETS and not os.path.exists(os.path.join(self.static_dir, path)):
+      if path not in self._warned:
+        self._warned.add(path)
+        logger.warning(f"Vendored asset {path} is missing, linking {VENDOR_ASSETS[path]} instead; run python -m app.library.assets fetch")
+      return VENDOR_ASSETS[path]
+    return STATIC_URL + path
+
+  def reload(self):
+    with self._lock:
+      self._manifest = None
+
+
+assets = AssetManifest()
+
+
+def asset_url(path: str) -> str:
+  """Return the URL to link the asset at static/<path> with, for use in templates."""
+  return assets.url(path)
+
+
+class AssetFiles(StaticFiles):
+  """StaticFiles serving fingerprinted assets precompressed and cached for good.
+
+  Assets under dist/ never change under the same name, so they are sent with
+  an immutable Cache-Control and, when the browser accepts it, as their brotli
+  or gzip variant. Other files are revalidated with their ETag on every use.
+  """
+
+  async def get_response(self, path: str, scope):
+    if not path.startswith(DIST + "/"):
+      response = await super().get_response(path, scope)
+      response.headers.setdefault("Cache-Control", "no-cache")
+      return response
+    header = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+    accepted = {item.split(";")[0].strip() for item in header.split(",")}
+    for encoding, suffix in ENCODINGS:
+      if encoding not in accepted:
+        continue
+      full_path, stat_result = self.lookup_path(path + suffix)
+      if stat_result is None:
+        continue
+      # typed as the asset itself, not as the compressed file
+      response = FileResponse(full_path, stat_result=stat_result, media_type=mimetypes.guess_type(path)[0],
+                              headers={"Content-Encoding": encoding})
+      break
+    else:
+      response = await super().get_response(path, scope)
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Vendor, fingerprint and precompress the static assets.")
+  parser.add_argument("command", choices=("pin", "fetch", "build"))
+  parser.add_argument("--static-dir", default=STATIC_DIR)
+  args = parser.parse_args()
+  if args.command == "pin":
+    for path, digest in sorted(pin().items()):
+      print(f"{digest}  {path}")
+  elif args.command == "fetch":
+    try:
+      fetch(args.static_dir)
+    except AssetError as exc:
+      parser.exit(1, f"{exc}\n")
+  else:
+    manifest = build(args.static_dir)
+    print(f"Built {len(manifest)} assets into {os.path.join(args.static_dir, DIST)}")
+
+
+if __name__ == "__main__":
+  main()
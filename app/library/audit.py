@@ -0,0 +1,269 @@
+"""Append-only audit log of changes to gardens, beds, plantings and plants.
+
+Changes are captured from the ORM whenever a session flushes, kept on the
+session until it commits (dropped if it rolls back), and then buffered in
+memory. A background thread writes the buffer to the audit_event table in one
+batch every `flush_interval` seconds, or as soon as `max_batch` events are
+waiting, so a write request only pays for building its diff. The buffer is
+written out on graceful shutdown; events buffered when the process is killed
+are lost.
+
+The acting user is taken from the bearer token of the request, see
+AuditActorMiddleware and set_actor().
+"""
+import datetime
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from enum import Enum
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from app.library.metrics import metrics
+from app.models.audit_models import AuditAction, AuditEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+AUDITED_TABLES = frozenset(("garden", "bed", "planting", "plant"))
+
+# Events that could not be written this many times are dropped
+MAX_FLUSH_ATTEMPTS = 3
+
+
+# Acting user
+
+_actor: ContextVar[Optional[Dict]] = ContextVar("audit_actor", default=None)
+
+
+class AuditActorMiddleware:
+  """Give each request a holder for its acting user.
+
+  Dependencies run in copies of the request's context, so the holder is a
+  mutable dict shared by all of them rather than the value of the variable.
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    token = _actor.set({"user_id": None})
+    try:
+      await self.app(scope, receive, send)
+    finally:
+      _actor.reset(token)
+
+
+def set_actor(user_id: Optional[int]):
+  """Record the user acting in the current request."""
+  holder = _actor.get()
+  if holder is not None:
+    holder["user_id"] = user_id
+
+
+def current_actor() -> Optional[int]:
+  holder = _actor.get()
+  return holder["user_id"] if holder is not None else None
+
+
+# Capturing changes
+
+def _value(value):
+  if isinstance(value, Enum):
+    return value.value
+  if isinstance(value, (datetime.date, datetime.datetime)):
+    return value.isoformat()
+  return value
+
+
+def _changes(state, action: AuditAction) -> Dict:
+  """Return {column: [before, after]} without loading any unloaded attribute."""
+  columns = state.mapper.column_attrs
+  changes = {}
+  if action == AuditAction.UPDATE:
+    # only attributes set since the last flush have a committed state
+    for key in state.committed_state:
+      if key not in columns:
+        continue
+      history = state.attrs[key].history
+      if history.has_changes():
+        before = history.deleted[0] if history.deleted else None
+        after = history.added[0] if history.added else None
+        changes[key] = [_value(before), _value(after)]
+    return changes
+  for key, value in state.dict.items():
+    if key in columns and value is not None:
+      value = _value(value)
+      changes[key] = [None, value] if action == AuditAction.INSERT else [value, None]
+  return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_changes(session, flush_context):
+  captured = []
+  for action, objects in (
+    (AuditAction.INSERT, session.new),
+    (AuditAction.UPDATE, session.dirty),
+    (AuditAction.DELETE, session.deleted),
+  ):
+    for obj in objects:
+      if getattr(obj, "__tablename__", None) not in AUDITED_TABLES:
+        continue
+      state = inspect(obj)
+      changes = _changes(state, action)
+      if not changes:
+        continue
+      captured.append({
+        "entity": obj.__tablename__,
+        # new objects only get their identity key after the flush events
+        "entity_id": state.key[1][0] if state.key else state.dict.get("id"),
+        "action": action,
+        "user_id": current_actor(),
+        "changes": changes,
+        "recorded_at": datetime.datetime.utcnow(),
+      })
+  if captured:
+    # tagged with the savepoint, if any, so its rollback drops only its own changes
+    savepoint = session.get_nested_transaction()
+    session.info.setdefault("audit", []).extend((savepoint, entry) for entry in captured)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+  captured = session.info.get("audit")
+  if not captured:
+    return
+  if previous_transaction.nested:
+    session.info["audit"] = [item for item in captured if item[0] is not previous_transaction]
+  else:
+    session.info.pop("audit", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_changes(session):
+  captured = session.info.pop("audit", None)
+  if captured:
+    audit_log.record(session.get_bind(), [entry for _, entry in captured])
+
+
+# Write-behind buffer
+
+class AuditLog:
+  """Buffers audit events in memory and writes them in batches."""
+
+  def __init__(self, max_batch: int = 500):
+    self.max_batch = max_batch
+    self._lock = threading.Lock()
+    self._flush_lock = threading.Lock()
+    self._pending: List = []
+    self._wake = threading.Event()
+    self._stopping = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def record(self, bind: Engine, entries: List[Dict]):
+    with self._lock:
+      self._pending.extend((bind, entry, 0) for entry in entries)
+      full = len(self._pending) >= self.max_batch
+    metrics.incr("audit.recorded", len(entries))
+    if full:
+      if self._thread is not None:
+        self._wake.set()
+      else:
+        self.flush()
+
+  def pending(self) -> int:
+    with self._lock:
+      return len(self._pending)
+
+  def flush(self) -> int:
+    """Write every buffered event now, returning how many were written."""
+    with self._flush_lock:
+      with self._lock:
+        pending, self._pending = self._pending, []
+      by_bind = defaultdict(list)
+      for bind, entry, attempts in pending:
+        by_bind[bind].append((entry, attempts))
+      written = 0
+      for bind, items in by_bind.items():
+        rows = [dict(entry, changes=json.dumps(entry["changes"], default=str)) for entry, _ in items]
+        try:
+          with bind.begin() as connection:
+            connection.execute(AuditEvent.__table__.insert(), rows)
+        except Exception:
+          logger.exception(f"Writing {len(rows)} audit events failed")
+          retry = [(bind, entry, attempts + 1) for entry, attempts in items if attempts + 1 < MAX_FLUSH_ATTEMPTS]
+          metrics.incr("audit.dropped", len(items) - len(retry))
+          # kept for the next flush, ahead of newer events
+          with self._lock:
+            self._pending[:0] = retry
+          continue
+        written += len(rows)
+    if written:
+      metrics.incr("audit.flushes")
+      metrics.incr("audit.written", written)
+    return written
+
+  def start(self, flush_interval: float = 1.0):
+    if self._thread is None:
+      self._stopping.clear()
+      self._thread = threading.Thread(target=self._run, args=(flush_interval,), name="audit-log", daemon=True)
+      self._thread.start()
+
+  def _run(self, flush_interval: float):
+    while not self._stopping.is_set():
+      self._wake.wait(flush_interval)
+      self._wake.clear()
+      self.flush()
+
+  def shutdown(self):
+    """Stop the writer thread and write any events still buffered."""
+    if self._thread is not None:
+      self._stopping.set()
+      self._wake.set()
+      self._thread.join()
+      self._thread = None
+    self.flush()
+
+
+audit_log = AuditLog()
+
+
+def start_audit_log(flush_interval: float = 1.0, max_batch: int = 500):
+  audit_log.max_batch = max_batch
+  audit_log.start(flush_interval)
+
+
+def stop_audit_log():
+  audit_log.shutdown()
+
+
+# Queries
+
+def audit_events_select(entity: Optional[str] = None,
+                        entity_id: Optional[int] = None,
+                        user_id: Optional[int] = None,
+                        since: Optional[datetime.datetime] = None,
+                        until: Optional[datetime.datetime] = None):
+  """Select audit events, newest first, through the (entity, entity_id), user or time index."""
+  statement = select(AuditEvent)
+  if entity is not None:
+    statement = statement.where(AuditEvent.entity == entity)
+  if entity_id is not None:
+    statement = statement.where(AuditEvent.entity_id == entity_id)
+  if user_id is not None:
+    statement = statement.where(AuditEvent.user_id == user_id)
+  if since is not None:
+    statement = statement.where(AuditEvent.recorded_at >= since)
+  if until is not None:
+    statement = statement.where(AuditEvent.recorded_at < until)
+  return statement.order_by(AuditEvent.recorded_at.desc())
@@ -0,0 +1,275 @@
+"""Bulk ingestion of the plant catalog from offline JSON or CSV dumps.
+
+Run from the command line with
+
+    python -m app.library.catalog path/to/plants.json [more files...]
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select
+
+from app.database.versions import versions
+from app.library.harvest import parse_harvest
+from app.models.garden_models import Planting, refresh_harvest_windows
+from app.models.plant import Plant
+
+
+logger = logging.getLogger(__name__)
+
+
+CATALOG_FIELDS = (
+  "name_common",
+  "name_botanical",
+  "family_group",
+  "harvest",
+  "hints",
+  "watch_for",
+  "proven_varieties",
+)
+# Columns derived from the harvest text, which bulk statements must set themselves
+HARVEST_FIELDS = ("harvest_min_weeks", "harvest_max_weeks", "harvest_from")
+
+# Records normalised in each worker task, and rows written in each upsert statement
+CHUNK_SIZE = 2000
+UPSERT_BATCH_SIZE = 100
+# Below this many records parsing in a process pool costs more than it saves
+PARALLEL_THRESHOLD = 5000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CatalogError(ValueError):
+  """A catalog dump that cannot be decoded or parsed."""
+
+  def __init__(self, filename: str, message: str):
+    super().__init__(f"{filename}: {message}")
+    self.filename = filename
+
+
+@dataclass
+class IngestReport:
+  """Counts of catalog records by outcome."""
+  inserted: int = 0
+  updated: int = 0
+  unchanged: int = 0
+  skipped: int = 0
+  errors: List[str] = field(default_factory=list)
+
+  def dict(self):
+    return {
+      "inserted": self.inserted,
+      "updated": self.updated,
+      "unchanged": self.unchanged,
+      "skipped": self.skipped,
+      "errors": self.errors,
+    }
+
+
+def _normalise_key(key: str) -> str:
+  return _WHITESPACE.sub("_", key.strip().lower()).replace("-", "_")
+
+
+def _normalise_value(value) -> Optional[str]:
+  if value is None:
+    return None
+  text = _WHITESPACE.sub(" ", str(value)).strip()
+  return text or None
+
+
+def catalog_key(name_botanical: Optional[str], name_common: Optional[str]) -> str:
+  """Return the deduplication key of a plant from its names, in any case and spacing."""
+  name_common = _normalise_value(name_common)
+  # as in normalise_record, a plant without a botanical name goes by its common name
+  name_botanical = _normalise_value(name_botanical) or name_common
+  names = f"{(name_botanical or '').casefold()}|{(name_common or '').casefold()}"
+  return hashlib.sha1(names.encode("utf-8")).hexdigest()
+
+
+def normalise_record(raw: Dict) -> Optional[Dict]:
+  """Return a catalog record with cleaned values, or None if it has no name."""
+  values = {_normalise_key(key): value for key, value in raw.items() if key}
+  record = {name: _normalise_value(values.get(name)) for name in CATALOG_FIELDS}
+  if not record["name_common"]:
+    return None
+  if not record["name_botanical"]:
+    record["name_botanical"] = record["name_common"]
+  record["catalog_key"] = catalog_key(record["name_botanical"], record["name_common"])
+  contents = json.dumps([record[name] for name in CATALOG_FIELDS])
+  record["content_hash"] = hashlib.sha1(contents.encode("utf-8")).hexdigest()
+  window = parse_harvest(record["harvest"])
+  record["harvest_min_weeks"] = window.min_weeks if window else None
+  record["harvest_max_weeks"] = window.max_weeks if window else None
+  record["harvest_from"] = window.origin if window else None
+  return record
+
+
+def normalise_records(raw_records: List[Dict]) -> List[Optional[Dict]]:
+  return [normalise_record(raw) for raw in raw_records]
+
+
+def decode_source(content: bytes, filename: str) -> str:
+  """Return the text of an uploaded catalog dump, which must be UTF-8."""
+  try:
+    return content.decode("utf-8")
+  except UnicodeDecodeError as exc:
+    raise CatalogError(filename, f"not UTF-8 text, {exc.reason} at byte {exc.start}")
+
+
+def read_records(text: str, filename: str) -> List[Dict]:
+  """Parse the raw records of a JSON or CSV catalog dump, raising CatalogError if it is malformed."""
+  try:
+    if filename.lower().endswith(".csv"):
+      return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(text)
+  except (ValueError, csv.Error) as exc:
+    raise CatalogError(filename, str(exc))
+  if isinstance(data, dict):
+    data = data.get("plants", [])
+  if not isinstance(data, list) or not all(isinstance(record, dict) for record in data):
+    raise CatalogError(filename, "expected a list of plant objects")
+  return data
+
+
+def read_sources(sources: Dict[str, str]) -> List[Dict]:
+  """Parse the raw records of every dump, raising CatalogError for the first malformed one."""
+  return [record for filename, text in sources.items() for record in read_records(text, filename)]
+
+
+def parse_records(raw_records: List[Dict], workers: Optional[int] = None) -> List[Optional[Dict]]:
+  """Normalise raw records, spreading large dumps across a process pool."""
+  if len(raw_records) < PARALLEL_THRESHOLD:
+    return normalise_records(raw_records)
+  chunks = [raw_records[i:i + CHUNK_SIZE] for i in range(0, len(raw_records), CHUNK_SIZE)]
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    return [record for chunk in pool.map(normalise_records, chunks) for record in chunk]
+
+
+def deduplicate(records: Iterable[Optional[Dict]], report: IngestReport) -> List[Dict]:
+  """Drop unnamed records and keep the last record for each catalog key."""
+  unique = {}
+  for record in records:
+    if record is None:
+      report.skipped += 1
+      continue
+    if record["catalog_key"] in unique:
+      report.skipped += 1
+    unique[record["catalog_key"]] = record
+  return list(unique.values())
+
+
+def _commit_changes(session: Session, changed_names: List[str]):
+  if changed_names:
+    refresh_harvest_windows(session.connection(), changed_names)
+  session.commit()
+  if changed_names:
+    # bulk statements bypass the ORM flush events that track table changes
+    versions.bump(Plant.__tablename__, Planting.__tablename__)
+
+
+def upsert_records(session: Session, records: List[Dict], report: IngestReport,
+                   progress: Optional[Callable[[int, int], None]] = None):
+  """Insert new records and update changed ones in bulk.
+
+  With a `progress` callback each batch is committed before it is reported, so
+  a job's progress writes do not wait on the ingest's lock, and a cancelled
+  job keeps the batches it finished.
+  """
+  table = Plant.__table__
+  changed_names = []
+  for start in range(0, len(records), UPSERT_BATCH_SIZE):
+    batch = records[start:start + UPSERT_BATCH_SIZE]
+    keys = [record["catalog_key"] for record in batch]
+    existing = dict(session.exec(
+      select(Plant.catalog_key, Plant.content_hash).where(Plant.catalog_key.in_(keys))
+    ).all())
+    changed = []
+    for record in batch:
+      if record["catalog_key"] not in existing:
+        report.inserted += 1
+        changed.append(record)
+      elif existing[record["catalog_key"]] != record["content_hash"]:
+        report.updated += 1
+        changed.append(record)
+      else:
+        report.unchanged += 1
+    if changed:
+      changed_names.extend(record["name_common"] for record in changed)
+      statement = insert(table).values(changed)
+      statement = statement.on_conflict_do_update(
+        index_elements=[table.c.catalog_key],
+        set_={name: statement.excluded[name] for name in CATALOG_FIELDS + HARVEST_FIELDS + ("content_hash",)},
+        where=table.c.content_hash.is_distinct_from(statement.excluded.content_hash),
+      )
+      session.execute(statement)
+    if progress is not None:
+      _commit_changes(session, changed_names)
+      changed_names = []
+      progress(start + len(batch), len(records))
+  _commit_changes(session, changed_names)
+
+
+def ingest_records(session: Session, raw_records: List[Dict], workers: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   report: Optional[IngestReport] = None) -> IngestReport:
+  """Ingest raw records already read from the catalog dumps."""
+  report = report or IngestReport()
+  records = deduplicate(parse_records(raw_records, workers), report)
+  upsert_records(session, records, report, progress)
+  logger.info(f"Catalog ingest: {report.dict()}")
+  return report
+
+
+def ingest(session: Session, sources: Dict[str, str], workers: Optional[int] = None,
+           progress: Optional[Callable[[int, int], None]] = None) -> IngestReport:
+  """Ingest catalog dumps given as a mapping of filename to file contents.
+
+  Malformed dumps are reported in the errors of the report and the others
+  are ingested.
+  """
+  report = IngestReport()
+  raw_records = []
+  for filename, text in sources.items():
+    try:
+      raw_records.extend(read_records(text, filename))
+    except CatalogError as exc:
+      report.errors.append(str(exc))
+  return ingest_records(session, raw_records, workers, progress, report)
+
+
+def ingest_job(context, sources: Dict[str, str], workers: Optional[int] = None) -> Dict:
+  """Ingest catalog dumps as a background job, see app.library.jobs."""
+  with Session(context.engine) as session:
+    report = ingest(session, sources, workers, progress=lambda done, total: context.progress(done, total, "Saving plants"))
+  return report.dict()
+
+
+def main():
+  from app.database.database import create_db_and_tables, engine
+
+  parser = argparse.ArgumentParser(description="Ingest plant catalog JSON or CSV dumps.")
+  parser.add_argument("paths", nargs="+", help="catalog dump files")
+  parser.add_argument("--workers", type=int, default=None, help="number of parsing processes")
+  args = parser.parse_args()
+
+  sources = {}
+  for path in args.paths:
+    with open(path, "r", encoding="utf-8") as input_file:
+      sources[path] = input_file.read()
+  create_db_and_tables()
+  with Session(engine) as session:
+    report = ingest(session, sources, workers=args.workers)
+  print(json.dumps(report.dict()))
+
+
+if __name__ == "__main__":
+  main()
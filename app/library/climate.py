@@ -0,0 +1,263 @@
+"""Growing-degree-day and frost calendars for each climatic zone.
+
+Each zone reads its history from a CSV in the climate directory, named after
+the zone (for example `temperate.csv`), with a header row and one row per day:
+
+    date,tmin_c,tmax_c
+    2025-07-01,-1.5,12.0
+
+Rows are appended to a float32 array file beside the CSV (`temperate.f32`),
+which is memory-mapped for the calculations. Only the bytes added to the CSV
+since the last refresh are parsed, rows that do not parse are skipped with a
+warning, and a zone's calendar is only recomputed when its history has grown.
+Requests read the precomputed calendars; a background thread of each server
+worker looks for new rows every few seconds.
+"""
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+  import fcntl
+except ImportError:
+  # Windows has no gunicorn, so one process ingests the history there
+  fcntl = None
+
+from app.library.metrics import metrics
+from app.models.garden_models import ClimaticZone
+
+
+logger = logging.getLogger(__name__)
+
+
+# Growing degree days accumulate above this mean daily temperature
+GDD_BASE_C = 10.0
+FROST_C = 0.0
+DAYS = 365
+# Calendar dates are reported in a non-leap year
+_REFERENCE_YEAR = date(2025, 1, 1)
+_MONTH_ENDS = np.cumsum([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]) - 1
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_label(day: Optional[float]) -> Optional[str]:
+  """Return the month and day ("MM-DD") of a zero-based day of the year."""
+  if day is None:
+    return None
+  return (_REFERENCE_YEAR + timedelta(days=int(round(day)) % DAYS)).strftime("%m-%d")
+
+
+class ZoneHistory:
+  """The daily temperature history of a zone, ingested incrementally from its CSV."""
+
+  def __init__(self, directory: str, zone: ClimaticZone):
+    name = zone.value.lower()
+    self.csv_path = os.path.join(directory, f"{name}.csv")
+    self.array_path = os.path.join(directory, f"{name}.f32")
+    self.offset_path = os.path.join(directory, f"{name}.offset")
+
+  def _offset(self) -> int:
+    if not os.path.exists(self.offset_path) or not os.path.exists(self.array_path):
+      return 0
+    with open(self.offset_path, "r") as offset_file:
+      return int(offset_file.read() or 0)
+
+  def refresh(self) -> bool:
+    """Append new CSV rows to the array file, returning whether any were added."""
+    try:
+      csv_file = open(self.csv_path, "rb")
+    except FileNotFoundError:
+      return False
+    with csv_file:
+      if fcntl is not None:
+        # every server worker refreshes, but only one at a time may append
+        fcntl.flock(csv_file.fileno(), fcntl.LOCK_EX)
+      size = os.fstat(csv_file.fileno()).st_size
+      offset = self._offset()
+      if size < offset:
+        # the file was rewritten rather than appended to
+        offset = 0
+      if size == offset:
+        return False
+      csv_file.seek(offset)
+      data = csv_file.read(size - offset)
+      # leave a partly written last line for the next refresh
+      consumed = data.rfind(b"\n") + 1
+      records = self._parse(data[:consumed].decode("utf-8", errors="replace"))
+      with open(self.array_path, "ab" if offset else "wb") as array_file:
+        array_file.write(np.array(records, dtype=np.float32).reshape(-1, 3).tobytes())
+      with open(self.offset_path, "w") as offset_file:
+        offset_file.write(str(offset + consumed))
+    return bool(records)
+
+  def _parse(self, text: str):
+    records = []
+    skipped = 0
+    for line in text.splitlines():
+      fields = line.split(",")
+      if len(fields) < 3 or not fields[0][:1].isdigit():
+        continue
+      try:
+        records.append((date.fromisoformat(fields[0].strip()).toordinal(), float(fields[1]), float(fields[2])))
+      except ValueError:
+        if not skipped:
+          logger.warning(f"Skipping malformed row of {self.csv_path}: {line!r}")
+        skipped += 1
+    if skipped:
+      metrics.incr("climate.skipped_rows", skipped)
+      logger.warning(f"Skipped {skipped} malformed rows of {self.csv_path}")
+    return records
+
+  def version(self) -> Optional[Tuple[int, int]]:
+    """Return the size and modification time of the array file, which change as rows are added."""
+    try:
+      stat_result = os.stat(self.array_path)
+    except FileNotFoundError:
+      return None
+    return stat_result.st_size, stat_result.st_mtime_ns
+
+  def load(self) -> np.ndarray:
+    """Memory-map the (ordinal, tmin, tmax) records of the history."""
+    if not os.path.exists(self.array_path) or os.path.getsize(self.array_path) == 0:
+      return np.empty((0, 3), dtype=np.float32)
+    return np.memmap(self.array_path, dtype=np.float32, mode="r").reshape(-1, 3)
+
+
+def by_year(records: np.ndarray):
+  """Arrange daily records into (years, 365) matrices of tmin and tmax."""
+  days = (records[:, 0].astype(np.int64) - _EPOCH_ORDINAL).astype("datetime64[D]")
+  years = days.astype("datetime64[Y]")
+  day_of_year = (days - years).astype(np.int64)
+  year_index = years.astype(np.int64)
+  year_index -= year_index.min()
+  # the last day of leap years is dropped so every year has 365 columns
+  keep = day_of_year < DAYS
+  tmin = np.full((year_index.max() + 1, DAYS), np.nan, dtype=np.float32)
+  tmax = np.full_like(tmin, np.nan)
+  tmin[year_index[keep], day_of_year[keep]] = records[keep, 1]
+  tmax[year_index[keep], day_of_year[keep]] = records[keep, 2]
+  return tmin, tmax
+
+
+def zone_calendar(records: np.ndarray) -> Optional[Dict]:
+  """Compute the growing-degree-day and frost calendar of a zone's history."""
+  if len(records) == 0:
+    return None
+  tmin, tmax = by_year(records)
+  gdd = np.clip((tmin + tmax) / 2 - GDD_BASE_C, 0, None)
+  mean_gdd = np.nan_to_num(np.nanmean(gdd, axis=0))
+  cumulative_gdd = np.cumsum(mean_gdd)
+
+  # centre each year on its coldest day, so the last frost before it and the
+  # first frost after it are found the same way in either hemisphere
+  coldest = int(np.nanargmin(np.nanmean(tmin, axis=0)))
+  shift = DAYS // 2 - coldest
+  frost = np.roll(np.nan_to_num(tmin, nan=np.inf) <= FROST_C, shift, axis=1)
+  frost_years = frost.any(axis=1)
+  calendar = {
+    "years": int(tmin.shape[0]),
+    "base_temperature": GDD_BASE_C,
+    "gdd_total": round(float(cumulative_gdd[-1]), 1),
+    "gdd_by_month": [round(float(value), 1) for value in cumulative_gdd[_MONTH_ENDS]],
+    "frost_probability": round(float(frost_years.mean()), 3),
+    "last_frost": None,
+    "first_frost": None,
+    "frost_free_days": DAYS,
+    "sowing_window": {"start": day_label(0), "end": day_label(DAYS - 1)},
+  }
+  if not frost_years.any():
+    return calendar
+
+  # years without frost count as ending frost at the start and starting it at the end
+  last_frost = np.where(frost_years, DAYS - 1 - np.argmax(frost[:, ::-1], axis=1), 0)
+  first_frost = np.where(frost_years, np.argmax(frost, axis=1), DAYS - 1)
+  # after last_frost["risk_10"] (before first_frost["risk_10"]) frost is seen in one year in ten
+  last_median, last_risk_10 = np.percentile(last_frost, [50, 90])
+  first_median, first_risk_10 = np.percentile(first_frost, [50, 10])
+  calendar["last_frost"] = {"median": day_label(last_median - shift), "risk_10": day_label(last_risk_10 - shift)}
+  calendar["first_frost"] = {"median": day_label(first_median - shift), "risk_10": day_label(first_risk_10 - shift)}
+  calendar["frost_free_days"] = int(min(first_risk_10 + DAYS - last_risk_10, DAYS))
+  calendar["sowing_window"] = {
+    "start": calendar["last_frost"]["risk_10"],
+    "end": calendar["first_frost"]["risk_10"],
+  }
+  return calendar
+
+
+def sowing_window(calendar: Dict, weeks_to_harvest: Optional[int]) -> Optional[Dict]:
+  """Return the frost-safe sowing window of a crop that takes the given weeks to harvest."""
+  window = calendar["sowing_window"]
+  if not weeks_to_harvest:
+    return window
+  last_sowing_days = calendar["frost_free_days"] - weeks_to_harvest * 7
+  if last_sowing_days < 0:
+    return None
+  start = date.fromisoformat(f"{_REFERENCE_YEAR.year}-{window['start']}")
+  return {"start": window["start"], "end": day_label((start - _REFERENCE_YEAR).days + last_sowing_days)}
+
+
+class ClimateStore:
+  """Precomputed calendars of every zone with history in the climate directory."""
+
+  def __init__(self, directory: str):
+    self.directory = directory
+    self._lock = threading.Lock()
+    self._histories = {zone: ZoneHistory(directory, zone) for zone in ClimaticZone}
+    self._calendars: Dict[ClimaticZone, Optional[Dict]] = {}
+    self._versions: Dict[ClimaticZone, Optional[Tuple[int, int]]] = {}
+    self._stopping = threading.Event()
+    self._watcher: Optional[threading.Thread] = None
+
+  def calendar(self, zone: ClimaticZone) -> Optional[Dict]:
+    """Return the calendar of a zone, computing it on first use; refresh() picks up new history."""
+    try:
+      return self._calendars[zone]
+    except KeyError:
+      return self.refresh(zone)
+
+  def refresh(self, zone: ClimaticZone) -> Optional[Dict]:
+    """Ingest new rows of a zone's history and recompute its calendar if the history has changed."""
+    with self._lock:
+      history = self._histories[zone]
+      history.refresh()
+      # another worker may have ingested the rows, so compare the array file rather than trust refresh()
+      version = history.version()
+      if zone not in self._calendars or version != self._versions.get(zone):
+        self._calendars[zone] = zone_calendar(history.load())
+        self._versions[zone] = version
+        logger.info(f"Computed climate calendar for {zone.value}")
+      return self._calendars[zone]
+
+  def refresh_all(self):
+    for zone in ClimaticZone:
+      self.refresh(zone)
+
+  def watch(self, interval: float = 60.0):
+    """Refresh every zone every `interval` seconds in a background thread."""
+    if self._watcher is None:
+      self._stopping.clear()
+      self._watcher = threading.Thread(target=self._watch, args=(interval,), name="climate-watcher", daemon=True)
+      self._watcher.start()
+
+  def _watch(self, interval: float):
+    while not self._stopping.wait(interval):
+      try:
+        self.refresh_all()
+      except (OSError, ValueError) as exc:
+        logger.warning(f"Refreshing the climate history failed: {exc}")
+
+  def stop_watching(self):
+    if self._watcher is not None:
+      self._stopping.set()
+      self._watcher.join()
+      self._watcher = None
+
+
+@lru_cache()
+def climate_store(directory: str) -> ClimateStore:
+  return ClimateStore(directory)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Dict, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database.versions import versions
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# Idempotent GET routes that may share a response, with the tables each depends on
+COALESCED_ROUTES: Dict[str, Tuple[str, ...]] = {
+  "/gardens/update": ("garden",),
+  "/beds/update": ("bed", "garden"),
+  "/plantings/update": ("planting", "bed"),
+  "/plants/update": ("plant",),
+  "/api/gardens/": ("garden",),
+  "/api/beds/": ("bed",),
+  "/api/plantings/": ("planting",),
+  "/api/plants/": ("plant",),
+  "/api/beds/soil_types/": (),
+  "/api/beds/irrigation_zones/": (),
+  "/api/irrigation/schedule": ("bed",),
+}
+
+# Request headers that can change the response and so form part of the key
+KEY_HEADERS = ("authorization", "cookie", "hx-request", "accept")
+
+
+class CoalescingMiddleware:
+  """ASGI middleware sharing one in-flight response among identical GETs.
+
+  Concurrent requests with the same path, query string, identity headers and
+  table versions wait for the first (leader) request and replay its response
+  instead of running the same query and render again.
+  """
+
+  def __init__(self, app: ASGIApp, routes: Dict[str, Tuple[str, ...]] = None):
+    self.app = app
+    self.routes = COALESCED_ROUTES if routes is None else routes
+    self.in_flight: Dict[tuple, asyncio.Future] = {}
+
+  def _key(self, scope: Scope, tables: Tuple[str, ...]) -> tuple:
+    headers = Headers(scope=scope)
+    return (
+      scope["path"],
+      scope["query_string"],
+      tuple(headers.get(name) for name in KEY_HEADERS),
+      versions.get(*tables),
+    )
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.routes:
+      await self.app(scope, receive, send)
+      return
+    key = self._key(scope, self.routes[scope["path"]])
+    metrics.incr("coalescing.requests")
+    leader = self.in_flight.get(key)
+    if leader is not None:
+      try:
+        messages = await asyncio.shield(leader)
+      except asyncio.CancelledError:
+        if not leader.cancelled():
+          raise
+        messages = None
+      except Exception:
+        messages = None
+      if messages is None:
+        # the leader failed, so handle this request independently
+        await self.app(scope, receive, send)
+        return
+      metrics.incr("coalescing.followers")
+      self._publish()
+      for message in messages:
+        await send(message)
+      return
+    await self._lead(key, scope, receive, send)
+
+  async def _lead(self, key: tuple, scope: Scope, receive: Receive, send: Send):
+    future = asyncio.get_running_loop().create_future()
+    self.in_flight[key] = future
+    messages = []
+
+    async def capture(message: Message):
+      messages.append(message)
+      await send(message)
+
+    try:
+      await self.app(scope, receive, capture)
+    except asyncio.CancelledError:
+      future.cancel()
+      raise
+    except Exception as exc:
+      future.set_exception(exc)
+      # mark the exception as retrieved when nobody was waiting
+      future.exception()
+      raise
+    else:
+      future.set_result(messages)
+    finally:
+      del self.in_flight[key]
+      metrics.incr("coalescing.leaders")
+      self._publish()
+
+  def _publish(self):
+    requests = metrics.get("coalescing.requests")
+    if requests:
+      metrics.gauge("coalescing.ratio", round(metrics.get("coalescing.followers") / requests, 4))
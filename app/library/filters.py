@@ -0,0 +1,43 @@
+from typing import Dict, Optional, Tuple
+
+from app.models.garden_models import Enum
+
+
+def sort_enum(name: str, orderings: Dict[str, Tuple[str, ...]]):
+  """Return a string enum of the sort keys accepted by a list endpoint.
+
+  Each key may be sorted ascending (`name`) or descending (`-name`) and orders
+  by the given columns, which should match the columns of an index so the
+  database can return rows in order without a temporary sort.
+  """
+  members = {}
+  for key in orderings:
+    members[key.upper()] = key
+    members[f"{key.upper()}_DESC"] = f"-{key}"
+  enum = Enum(name, members, type=str)
+  enum.orderings = orderings
+  return enum
+
+
+def apply_filters(statement, model, **filters):
+  """Add an equality condition to the statement for each filter that is set."""
+  for name, value in filters.items():
+    if value is not None:
+      statement = statement.where(getattr(model, name) == value)
+  return statement
+
+
+def apply_sort(statement, model, sort: Optional[Enum]):
+  """Order the statement by the given sort key, using the id to break ties.
+
+  Without a sort key rows are ordered by id, so offset pages are stable.
+  """
+  if sort is None:
+    return statement.order_by(model.id)
+  key = sort.value
+  descending = key.startswith("-")
+  columns = [getattr(model, name) for name in type(sort).orderings[key.lstrip("-")]]
+  columns.append(model.id)
+  if descending:
+    return statement.order_by(*(column.desc() for column in columns))
+  return statement.order_by(*(column.asc() for column in columns))
@@ -0,0 +1,33 @@
+"""Distance and bounding-box helpers for garden coordinates in degrees."""
+import math
+from typing import Tuple
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+  """Return the (min_lat, min_lon, max_lat, max_lon) box containing a circle.
+
+  Boxes are clamped to the valid coordinate ranges rather than wrapped across
+  the poles or the antimeridian.
+  """
+  lat_delta = radius_km / KM_PER_DEGREE
+  cos_lat = math.cos(math.radians(latitude))
+  lon_delta = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+  return (
+    max(latitude - lat_delta, -90.0),
+    max(longitude - lon_delta, -180.0),
+    min(latitude + lat_delta, 90.0),
+    min(longitude + lon_delta, 180.0),
+  )
+
+
+def distance_km(lat_1: float, lon_1: float, lat_2: float, lon_2: float) -> float:
+  """Return the great-circle (haversine) distance between two points."""
+  phi_1, phi_2 = math.radians(lat_1), math.radians(lat_2)
+  d_phi = phi_2 - phi_1
+  d_lambda = math.radians(lon_2 - lon_1)
+  a = math.sin(d_phi / 2) ** 2 + math.cos(phi_1) * math.cos(phi_2) * math.sin(d_lambda / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
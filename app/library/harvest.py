@@ -0,0 +1,49 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+FROM_SEED = "seed"
+FROM_TRANSPLANT = "transplant"
+
+# Longest harvest window stored, which bounds the index range scanned for due plantings
+MAX_HARVEST_SPAN_WEEKS = 52
+
+_HARVEST_PATTERN = re.compile(
+  r"(?P<low>\d+(?:\.\d+)?)\s*(?:(?:to|-|–)\s*(?P<high>\d+(?:\.\d+)?)\s*)?"
+  r"(?P<unit>days?|weeks?|months?)"
+  r"(?:\s+(?:from|after)\s+(?P<origin>seed\w*|sowing|transplant\w*|planting\s+out))?",
+  re.IGNORECASE
+)
+
+_WEEKS_PER_UNIT = {"day": 1 / 7, "week": 1, "month": 52 / 12}
+
+
+@dataclass
+class HarvestWindow:
+  """Weeks from sowing or transplanting until harvest."""
+  min_weeks: int
+  max_weeks: int
+  origin: Optional[str] = None
+
+
+def parse_harvest(text: Optional[str]) -> Optional[HarvestWindow]:
+  """Parse free text like "12 to 16 weeks from seed." into a harvest window.
+
+  Returns None if the text does not contain a duration.
+  """
+  if not text:
+    return None
+  match = _HARVEST_PATTERN.search(text)
+  if match is None:
+    return None
+  unit = _WEEKS_PER_UNIT[match["unit"].lower().rstrip("s")]
+  low = float(match["low"]) * unit
+  high = float(match["high"]) * unit if match["high"] else low
+  low, high = sorted((low, high))
+  min_weeks = round(low)
+  max_weeks = min(round(high), min_weeks + MAX_HARVEST_SPAN_WEEKS)
+  origin = None
+  if match["origin"]:
+    origin = FROM_SEED if match["origin"].lower().startswith(("seed", "sow")) else FROM_TRANSPLANT
+  return HarvestWindow(min_weeks=min_weeks, max_weeks=max_weeks, origin=origin)
@@ -1,14 +1,125 @@
+import hashlib
+import logging
 import os.path
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
 import markdown
 
 
-def openfile(filename):
-  filepath = os.path.join("app/pages/", filename)
+logger = logging.getLogger(__name__)
+
+
+PAGES_DIR = "app/pages/"
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+  html: str
+  etag: str
+  mtime_ns: int
+  size: int
+
+
+def render_page(filepath: str) -> RenderedPage:
+  stat = os.stat(filepath)
   with open(filepath, "r", encoding="utf-8") as input_file:
     text = input_file.read()
-
   html = markdown.markdown(text)
+  etag = '"' + hashlib.sha1(html.encode("utf-8")).hexdigest() + '"'
+  return RenderedPage(html=html, etag=etag, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+class PageCache:
+  """Markdown pages rendered to HTML once and kept by filename.
+
+  Pages are rendered on first use, or all at once by prerender(). Looking up a
+  cached page does not touch the disk; a page changed on disk is re-rendered
+  when refresh() finds its mtime or size changed, which the optional watcher
+  thread does every few seconds.
+  """
+
+  def __init__(self, directory: str = PAGES_DIR):
+    self.directory = directory
+    self._lock = threading.Lock()
+    self._pages: Dict[str, RenderedPage] = {}
+    self._stopping = threading.Event()
+    self._watcher: Optional[threading.Thread] = None
+
+  def _path(self, filename: str) -> str:
+    # only pages directly in the directory can be served
+    if os.path.basename(filename) != filename or not filename.endswith(".md"):
+      raise FileNotFoundError(filename)
+    return os.path.join(self.directory, filename)
+
+  def get(self, filename: str) -> RenderedPage:
+    page = self._pages.get(filename)
+    if page is None:
+      page = render_page(self._path(filename))
+      with self._lock:
+        self._pages[filename] = page
+    return page
+
+  def prerender(self) -> int:
+    """Render every page in the directory, returning how many there are."""
+    filenames = [name for name in os.listdir(self.directory) if name.endswith(".md")]
+    for filename in filenames:
+      page = render_page(self._path(filename))
+      with self._lock:
+        self._pages[filename] = page
+    logger.info(f"Prerendered {len(filenames)} pages from {self.directory}")
+    return len(filenames)
+
+  def refresh(self) -> int:
+    """Re-render cached pages changed on disk and forget deleted ones, returning how many changed."""
+    changed = 0
+    for filename, page in list(self._pages.items()):
+      filepath = self._path(filename)
+      try:
+        stat = os.stat(filepath)
+      except FileNotFoundError:
+        with self._lock:
+          self._pages.pop(filename, None)
+        changed += 1
+        continue
+      if (stat.st_mtime_ns, stat.st_size) != (page.mtime_ns, page.size):
+        page = render_page(filepath)
+        with self._lock:
+          self._pages[filename] = page
+        changed += 1
+    return changed
+
+  def watch(self, interval: float = 2.0):
+    """Check the cached pages for changes every `interval` seconds in a background thread."""
+    if self._watcher is None:
+      self._stopping.clear()
+      self._watcher = threading.Thread(target=self._watch, args=(interval,), name="page-watcher", daemon=True)
+      self._watcher.start()
+
+  def _watch(self, interval: float):
+    while not self._stopping.wait(interval):
+      try:
+        self.refresh()
+      except OSError as exc:
+        logger.warning(f"Checking pages for changes failed: {exc}")
+
+  def stop_watching(self):
+    if self._watcher is not None:
+      self._stopping.set()
+      self._watcher.join()
+      self._watcher = None
+
+  def clear(self):
+    with self._lock:
+      self._pages.clear()
+
+
+pages = PageCache()
+
+
+def openfile(filename):
   data = {
-    "text": html
+    "text": pages.get(filename).html
   }
   return data
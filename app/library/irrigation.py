@@ -0,0 +1,173 @@
+"""Daily irrigation schedules for every bed from a local weather file.
+
+The weather file is a CSV with a header row and one row per day:
+
+    date,et0_mm,rain_mm
+    2026-01-01,5.2,0.0
+
+Beds with the same irrigation zone and soil type need the same water, so the
+daily soil water balance is simulated once per (zone, soil) group with NumPy
+and each bed takes the schedule of its group.
+"""
+import csv
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.database.versions import versions
+from app.models.garden_models import Bed, IrrigationZone, SoilType
+
+
+logger = logging.getLogger(__name__)
+
+
+ZONES = list(IrrigationZone)
+SOILS = list(SoilType)
+
+# Fraction of reference evapotranspiration used by each zone's plants (crop coefficient)
+CROP_COEFFICIENTS = {
+  IrrigationZone.GRASS: 0.8,
+  IrrigationZone.TREES: 0.6,
+  IrrigationZone.SHRUBS: 0.5,
+  IrrigationZone.VEGETABLES: 1.0,
+}
+
+# Fraction of rainfall each soil retains, and the depletion in mm at which it is refilled
+SOIL_RETENTION = {
+  SoilType.LOAM: (0.8, 30.0),
+  SoilType.CLAY: (0.7, 40.0),
+  SoilType.SILT: (0.8, 35.0),
+  SoilType.SAND: (0.6, 15.0),
+  SoilType.POTTING_MIX: (0.75, 12.0),
+  SoilType.SEED_RAISING_MIX: (0.7, 8.0),
+  SoilType.COMPOST: (0.85, 25.0),
+}
+
+# Beds without a zone or soil type are planned as vegetables in loam
+DEFAULT_ZONE = IrrigationZone.VEGETABLES
+DEFAULT_SOIL = SoilType.LOAM
+
+_KC = np.array([CROP_COEFFICIENTS[zone] for zone in ZONES + [DEFAULT_ZONE]])
+_RETAINED = np.array([SOIL_RETENTION[soil][0] for soil in SOILS + [DEFAULT_SOIL]])
+_REFILL_AT = np.array([SOIL_RETENTION[soil][1] for soil in SOILS + [DEFAULT_SOIL]])
+
+
+@dataclass
+class Weather:
+  dates: List[str]
+  et0: np.ndarray
+  rain: np.ndarray
+
+
+def load_weather(path: str) -> Weather:
+  """Read daily reference evapotranspiration and rainfall from a weather CSV."""
+  with open(path, newline="", encoding="utf-8") as weather_file:
+    rows = list(csv.DictReader(weather_file))
+  dates = [row["date"] for row in rows]
+  et0 = np.array([float(row["et0_mm"] or 0) for row in rows])
+  rain = np.array([float(row["rain_mm"] or 0) for row in rows])
+  return Weather(dates=dates, et0=et0, rain=rain)
+
+
+def water_balance(weather: Weather) -> Tuple[np.ndarray, np.ndarray]:
+  """Return the daily demand and watering in mm of every (zone, soil) group.
+
+  Both arrays have the shape (zones + 1, soils + 1, days); the extra zone and
+  soil hold the defaults for beds without one.
+  """
+  # demand and effective rain for every group and day by broadcasting
+  shape = (len(_KC), len(_RETAINED), len(weather.dates))
+  demand = np.broadcast_to(_KC[:, None, None] * weather.et0[None, None, :], shape)
+  effective_rain = _RETAINED[None, :, None] * weather.rain[None, None, :]
+  refill_at = _REFILL_AT[None, :]
+  depletion = np.zeros(shape[:2])
+  water = np.zeros(shape)
+  for day in range(demand.shape[2]):
+    depletion = np.maximum(depletion + demand[:, :, day] - effective_rain[:, :, day], 0)
+    due = depletion >= refill_at
+    water[:, :, day] = np.where(due, depletion, 0)
+    depletion = np.where(due, 0, depletion)
+  return demand, water
+
+
+@dataclass
+class IrrigationSchedule:
+  dates: List[str]
+  bed_ids: np.ndarray
+  garden_ids: np.ndarray
+  owner_ids: np.ndarray
+  beds: List[Dict]
+
+  def for_garden(self, garden_id: Optional[int] = None, owner_id: Optional[int] = None) -> Dict:
+    """Return the schedule of the owner's beds, optionally only those in one garden."""
+    mask = self.owner_ids == (owner_id if owner_id is not None else -1)
+    if garden_id is not None:
+      mask &= self.garden_ids == garden_id
+    return {"dates": self.dates, "beds": [self.beds[i] for i in np.flatnonzero(mask)]}
+
+
+def build_schedule(session: Session, weather: Weather) -> IrrigationSchedule:
+  """Plan the watering of every bed over the days of the weather file."""
+  rows = session.exec(
+    select(Bed.id, Bed.garden_id, Bed.irrigation_zone, Bed.soil_type, Bed.owner_id).order_by(Bed.id)
+  ).all()
+  zone_index = {zone: i for i, zone in enumerate(ZONES)}
+  soil_index = {soil: i for i, soil in enumerate(SOILS)}
+  bed_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+  garden_ids = np.fromiter((row[1] if row[1] is not None else -1 for row in rows), dtype=np.int64, count=len(rows))
+  owner_ids = np.fromiter((row[4] if row[4] is not None else -1 for row in rows), dtype=np.int64, count=len(rows))
+  zones = np.fromiter((zone_index.get(row[2], len(ZONES)) for row in rows), dtype=np.intp, count=len(rows))
+  soils = np.fromiter((soil_index.get(row[3], len(SOILS)) for row in rows), dtype=np.intp, count=len(rows))
+
+  demand, water = water_balance(weather)
+  totals = demand.sum(axis=2).round(1)
+  # waterings are built once per group present and shared by its beds
+  group_waterings = {}
+  for zone, soil in set(zip(zones.tolist(), soils.tolist())):
+    days = np.flatnonzero(water[zone, soil])
+    group_waterings[zone, soil] = [[weather.dates[day], round(float(water[zone, soil, day]), 1)] for day in days]
+
+  beds = [
+    {
+      "id": int(bed_id),
+      "garden_id": row[1],
+      "irrigation_zone": row[2],
+      "soil_type": row[3],
+      "demand_mm": float(totals[zone, soil]),
+      "waterings": group_waterings[zone, soil],
+    }
+    for bed_id, row, zone, soil in zip(bed_ids.tolist(), rows, zones.tolist(), soils.tolist())
+  ]
+  return IrrigationSchedule(dates=weather.dates, bed_ids=bed_ids, garden_ids=garden_ids, owner_ids=owner_ids, beds=beds)
+
+
+class ScheduleCache:
+  """The latest schedule of each weather file, rebuilt when the file or the beds change."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._schedules: Dict[str, Tuple[tuple, IrrigationSchedule]] = {}
+
+  def get(self, session: Session, path: str) -> IrrigationSchedule:
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size, versions.get(Bed.__tablename__))
+    with self._lock:
+      cached = self._schedules.get(path)
+      if cached is not None and cached[0] == key:
+        return cached[1]
+      schedule = build_schedule(session, load_weather(path))
+      self._schedules[path] = (key, schedule)
+      logger.info(f"Built irrigation schedule for {len(schedule.beds)} beds from {path}")
+      return schedule
+
+  def clear(self):
+    with self._lock:
+      self._schedules.clear()
+
+
+schedules = ScheduleCache()
@@ -0,0 +1,265 @@
+"""Background jobs for slow operations, kept out of the request path.
+
+Jobs are rows of the job table. A request enqueues a job and answers at once
+with its ID; the JobRunner claims queued jobs by priority and runs them in a
+thread or process pool, and clients poll `/api/jobs/{id}` or the HTMX progress
+partial until the job finishes.
+
+A job handler is a module level function taking a JobContext and the job's
+parameters, named in JOB_HANDLERS so worker processes can import it:
+
+    def ingest_job(context: JobContext, sources):
+      ...
+      context.progress(done, total, "Ingesting plants")
+      return report.dict()
+"""
+import datetime
+import importlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, create_engine, select
+
+from app.library.metrics import metrics
+from app.models.job_models import FINISHED_STATUSES, Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+# Job kinds and the "module:function" handlers that run them
+JOB_HANDLERS: Dict[str, str] = {
+  "catalog.ingest": "app.library.catalog:ingest_job",
+}
+
+# Progress is written at most this often, in seconds, so busy jobs do not flood the database
+PROGRESS_INTERVAL = 0.25
+
+# Runners mark their running jobs alive this often, in seconds, and a running job
+# not marked for STALE_AFTER seconds belongs to a runner that is gone
+HEARTBEAT_INTERVAL = 5.0
+STALE_AFTER = 30.0
+
+
+class JobCancelled(Exception):
+  pass
+
+
+class JobContext:
+  """Lets a running job report its progress and notice cancellation."""
+
+  def __init__(self, engine: Engine, job_id: int):
+    self.engine = engine
+    self.job_id = job_id
+    self._last_write = 0.0
+
+  def progress(self, done: float, total: float = 1.0, message: Optional[str] = None, force: bool = False):
+    """Record the fraction of the job done, raising JobCancelled if it was cancelled."""
+    now = time.monotonic()
+    if not force and now - self._last_write < PROGRESS_INTERVAL:
+      return
+    self._last_write = now
+    fraction = min(max(done / total, 0.0), 1.0) if total else 0.0
+    with Session(self.engine) as session:
+      values = {"progress": round(fraction, 4)}
+      if message is not None:
+        values["message"] = message
+      session.execute(update(Job).where(Job.id == self.job_id).values(**values))
+      session.commit()
+      cancel_requested = session.exec(select(Job.cancel_requested).where(Job.id == self.job_id)).one()
+    if cancel_requested:
+      raise JobCancelled()
+
+
+def resolve_handler(kind: str):
+  module_name, function_name = JOB_HANDLERS[kind].split(":")
+  return getattr(importlib.import_module(module_name), function_name)
+
+
+@lru_cache()
+def _process_engine(url: str) -> Engine:
+  return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def _finish(engine: Engine, job_id: int, **values):
+  values["finished_at"] = datetime.datetime.utcnow()
+  with Session(engine) as session:
+    session.execute(update(Job).where(Job.id == job_id).values(**values))
+    session.commit()
+
+
+def run_job(job_id: int, engine: Optional[Engine] = None, url: Optional[str] = None) -> JobStatus:
+  """Run a claimed job to completion and record its outcome.
+
+  Threads pass the runner's engine; processes pass the database URL and use an
+  engine of their own.
+  """
+  engine = engine or _process_engine(url)
+  with Session(engine) as session:
+    job = session.get(Job, job_id)
+    kind, params = job.kind, json.loads(job.params)
+  context = JobContext(engine, job_id)
+  try:
+    result = resolve_handler(kind)(context, **params)
+  except JobCancelled:
+    _finish(engine, job_id, status=JobStatus.CANCELLED)
+    return JobStatus.CANCELLED
+  except Exception as exc:
+    logger.exception(f"Job {job_id} ({kind}) failed")
+    _finish(engine, job_id, status=JobStatus.FAILED, error=f"{type(exc).__name__}: {exc}")
+    return JobStatus.FAILED
+  _finish(engine, job_id, status=JobStatus.SUCCEEDED, progress=1.0, result=json.dumps(result, default=str))
+  return JobStatus.SUCCEEDED
+
+
+class JobRunner:
+  """Claims queued jobs in priority order and runs them in a worker pool.
+
+  One server worker runs the runner, see app.library.leader, and others may
+  run one from the command line. Each stamps the jobs it claims with its
+  runner_id and keeps their heartbeat fresh, so a runner only requeues the jobs
+  of runners that stopped beating, never those still running elsewhere.
+  """
+
+  def __init__(self, engine: Engine, workers: int = 2, executor: str = "thread", poll_interval: float = 0.5):
+    self.engine = engine
+    self.runner_id = f"{socket.gethostname()}:{os.getpid()}"
+    self.workers = workers
+    self.poll_interval = poll_interval
+    self.use_processes = executor == "process"
+    self._executor: Executor = (
+      ProcessPoolExecutor(max_workers=workers) if self.use_processes else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+    )
+    self._wake = threading.Event()
+    self._stopping = threading.Event()
+    self._slots = threading.Semaphore(workers)
+    self._next_beat = 0.0
+    self._beat()
+    self._thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+    self._thread.start()
+
+  def _beat(self):
+    """Mark the jobs of this runner alive and requeue those of runners that are gone."""
+    now = datetime.datetime.utcnow()
+    with Session(self.engine) as session:
+      session.execute(
+        update(Job).where(Job.status == JobStatus.RUNNING, Job.runner_id == self.runner_id).values(heartbeat_at=now)
+      )
+      # jobs left running by a stopped process will never finish, so start them again
+      session.execute(
+        update(Job)
+        .where(
+          Job.status == JobStatus.RUNNING,
+          or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < now - datetime.timedelta(seconds=STALE_AFTER)),
+        )
+        .values(status=JobStatus.QUEUED, progress=0.0, runner_id=None, heartbeat_at=None)
+      )
+      session.commit()
+    self._next_beat = time.monotonic() + HEARTBEAT_INTERVAL
+
+  def wake(self):
+    """Look for queued jobs now rather than at the next poll."""
+    self._wake.set()
+
+  def _claim(self) -> Optional[int]:
+    now = datetime.datetime.utcnow()
+    with Session(self.engine) as session:
+      job_id = session.exec(
+        select(Job.id).where(Job.status == JobStatus.QUEUED).order_by(Job.priority.desc(), Job.id).limit(1)
+      ).first()
+      if job_id is None:
+        return None
+      claimed = session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+        .values(status=JobStatus.RUNNING, runner_id=self.runner_id, started_at=now, heartbeat_at=now)
+      ).rowcount
+      session.commit()
+    # another runner may have claimed it first
+    return job_id if claimed else None
+
+  def _dispatch(self):
+    while not self._stopping.is_set():
+      if time.monotonic() >= self._next_beat:
+        self._beat()
+      if not self._slots.acquire(timeout=self.poll_interval):
+        continue
+      job_id = self._claim()
+      if job_id is None:
+        self._slots.release()
+        self._wake.wait(self.poll_interval)
+        self._wake.clear()
+        continue
+      metrics.incr("jobs.started")
+      if self.use_processes:
+        future = self._executor.submit(run_job, job_id, url=str(self.engine.url))
+      else:
+        future = self._executor.submit(run_job, job_id, engine=self.engine)
+      future.add_done_callback(self._done)
+
+  def _done(self, future):
+    self._slots.release()
+    self._wake.set()
+    if future.exception() is not None:
+      logger.error(f"Job worker failed: {future.exception()}")
+      return
+    metrics.incr(f"jobs.{JobStatus(future.result()).value}")
+
+  def shutdown(self, wait: bool = True):
+    self._stopping.set()
+    self._wake.set()
+    self._thread.join()
+    self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def enqueue(session: Session, kind: str, params: Optional[Dict] = None, priority: int = 0, owner_id: Optional[int] = None) -> Job:
+  """Queue a job and return it; the runner picks it up from the job table."""
+  if kind not in JOB_HANDLERS:
+    raise ValueError(f"Unknown job kind {kind}")
+  job = Job(kind=kind, params=json.dumps(params or {}), priority=priority, owner_id=owner_id)
+  session.add(job)
+  session.commit()
+  session.refresh(job)
+  metrics.incr("jobs.queued")
+  if _runner is not None:
+    _runner.wake()
+  return job
+
+
+def cancel(session: Session, job: Job) -> Job:
+  """Cancel a queued job at once, or ask a running job to stop at its next progress report."""
+  if job.status == JobStatus.QUEUED:
+    job.status = JobStatus.CANCELLED
+    job.finished_at = datetime.datetime.utcnow()
+  elif job.status not in FINISHED_STATUSES:
+    job.cancel_requested = True
+  session.add(job)
+  session.commit()
+  session.refresh(job)
+  return job
+
+
+_runner: Optional[JobRunner] = None
+
+
+def start_job_runner(engine: Engine, workers: int = 2, executor: str = "thread", poll_interval: float = 0.5) -> JobRunner:
+  global _runner
+  if _runner is None:
+    _runner = JobRunner(engine, workers=workers, executor=executor, poll_interval=poll_interval)
+  return _runner
+
+
+def stop_job_runner():
+  global _runner
+  if _runner is not None:
+    _runner.shutdown()
+    _runner = None
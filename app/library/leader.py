@@ -0,0 +1,95 @@
+"""Run the background schedulers in one process of the server.
+
+Every gunicorn worker runs the app's startup, but the job runner, database
+maintenance and backups must run once per deployment: several copies would
+write overlapping backups, prune each other's and vacuum the same SQLite file
+at once. Workers compete for an exclusive lock on a file; the holder runs the
+schedulers and the others try again every `interval` seconds, so another
+worker takes over when the holder exits. The operating system releases the
+lock of a process that dies.
+"""
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+  import fcntl
+except ImportError:
+  # Windows has no gunicorn, so the one process there always leads
+  fcntl = None
+
+from app.library.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class Leader:
+  """Runs start() once this process holds the lock file, and stop() when it lets go."""
+
+  def __init__(self, path: str, start: Callable[[], None], stop: Callable[[], None], interval: float = 5.0):
+    self.path = path
+    self.start = start
+    self.stop = stop
+    self.interval = interval
+    self.leading = False
+    self._file = None
+    self._stopping = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+    # try at once, so a single process starts its schedulers during startup
+    if not self._acquire():
+      self._thread = threading.Thread(target=self._wait_for_lock, name="leader", daemon=True)
+      self._thread.start()
+
+  def _acquire(self) -> bool:
+    lock_file = open(self.path, "a+")
+    if fcntl is not None:
+      try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except OSError:
+        lock_file.close()
+        return False
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    self._file = lock_file
+    self.leading = True
+    logger.info(f"Process {os.getpid()} runs the schedulers")
+    metrics.incr("leader.elected")
+    self.start()
+    return True
+
+  def _wait_for_lock(self):
+    while not self._stopping.wait(self.interval):
+      if self._acquire():
+        return
+
+  def shutdown(self):
+    self._stopping.set()
+    if self._thread is not None:
+      self._thread.join()
+    if self.leading:
+      self.stop()
+      self.leading = False
+      # closing the file releases the lock
+      self._file.close()
+      self._file = None
+
+
+_leader: Optional[Leader] = None
+
+
+def start_leader(path: str, start: Callable[[], None], stop: Callable[[], None], interval: float = 5.0) -> Leader:
+  global _leader
+  if _leader is None:
+    _leader = Leader(path, start, stop, interval=interval)
+  return _leader
+
+
+def stop_leader():
+  global _leader
+  if _leader is not None:
+    _leader.shutdown()
+    _leader = None
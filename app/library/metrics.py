@@ -0,0 +1,42 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+  """In-process registry of counters and gauges shared by the app subsystems."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._counters = defaultdict(int)
+    self._gauges = {}
+
+  def incr(self, name, value=1):
+    """Increment the counter with the given name."""
+    with self._lock:
+      self._counters[name] += value
+
+  def gauge(self, name, value):
+    """Set the gauge with the given name to the current value."""
+    with self._lock:
+      self._gauges[name] = value
+
+  def get(self, name, default=0):
+    """Return the current value of a counter or gauge."""
+    with self._lock:
+      if name in self._gauges:
+        return self._gauges[name]
+      return self._counters.get(name, default)
+
+  def snapshot(self):
+    """Return a copy of all counters and gauges."""
+    with self._lock:
+      return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+  def reset(self):
+    """Clear all counters and gauges."""
+    with self._lock:
+      self._counters.clear()
+      self._gauges.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,55 @@
+"""Scoping of gardens, beds and plantings to the user who owns them.
+
+Requests made without a bearer token act for no user, and so see and change
+only items without an owner.
+"""
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlmodel import Session, select
+
+from app.config import Settings
+from app.models.user_models import User
+
+
+def owner_id(user: Optional[User]) -> Optional[int]:
+  return user.id if user is not None else None
+
+
+def scope(statement, model, user: Optional[User]):
+  """Restrict a statement to the items of the model owned by the user."""
+  owner = owner_id(user)
+  if owner is None:
+    return statement.where(model.owner_id.is_(None))
+  return statement.where(model.owner_id == owner)
+
+
+def get_owned(session: Session, model, item_id: Optional[int], user: Optional[User]):
+  """Return the item with the given ID if the user owns it, otherwise None."""
+  if item_id is None:
+    return None
+  item = session.get(model, item_id)
+  if item is None or item.owner_id != owner_id(user):
+    return None
+  return item
+
+
+def check_parent(session: Session, model, item_id: Optional[int], user: Optional[User]):
+  """Raise a 404 error if an item refers to a parent the user does not own.
+
+  A bed or planting may only be put in a garden or bed of its own owner.
+  """
+  if item_id is not None and not get_owned(session, model, item_id, user):
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{model.__name__} with ID {item_id} not found")
+
+
+def check_quota(session: Session, user: Optional[User], settings: Settings):
+  """Raise a 403 error if the user already owns their quota of items."""
+  if user is None:
+    return
+  items_owned = session.exec(select(User.items_owned).where(User.id == user.id)).one()
+  if items_owned >= settings.items_per_user:
+    raise HTTPException(
+      status_code=status.HTTP_403_FORBIDDEN,
+      detail=f"Quota of {settings.items_per_user} items per user reached"
+    )
@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from fastapi_pagination import Page
+from fastapi_pagination.api import resolve_params
+from pydantic import BaseModel, create_model
+from sqlalchemy import select as sa_select
+
+from app.library.responses import column_keys
+
+
+FIELDS_QUERY = Query(
+  default=None,
+  description="Comma separated list of fields to return, for example `id,name`. The `id` is always included.",
+)
+
+
+def parse_fields(read_model: Type[BaseModel], table_model, fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+  """Return the requested fields in canonical order, or None for all fields.
+
+  Raises a 400 error if a requested field is not a column of the read model.
+  """
+  if not fields:
+    return None
+  requested = {name.strip() for name in fields.split(",") if name.strip()}
+  allowed = set(read_model.__fields__) & set(column_keys(table_model))
+  unknown = requested - allowed
+  if unknown:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+    )
+  requested.add("id")
+  return tuple(name for name in read_model.__fields__ if name in requested)
+
+
+@lru_cache(maxsize=256)
+def projection_model(read_model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+  """Return a response model containing only the given fields of the read model."""
+  definitions = {}
+  for name in fields:
+    field = read_model.__fields__[name]
+    definitions[name] = (field.annotation, ... if field.required else field.default)
+  return create_model(f"{read_model.__name__}Fields_{'_'.join(fields)}", **definitions)
+
+
+def projected_select(table_model, fields: Tuple[str, ...]):
+  """Return a SELECT restricted to the given columns of the table model."""
+  return sa_select(*(getattr(table_model, name) for name in fields))
+
+
+def project_rows(model: Type[BaseModel], rows) -> list:
+  """Build projection model instances from result rows.
+
+  The values come from typed columns so validation is skipped.
+  """
+  return [model.construct(**row._mapping) for row in rows]
+
+
+def paginate_projection(model: Type[BaseModel], items: Sequence[BaseModel]):
+  """Paginate projected items into a page of the projection model."""
+  params = resolve_params()
+  raw_params = params.to_raw_params()
+  page_items = items[raw_params.offset:raw_params.offset + raw_params.limit]
+  return Page[model].create(page_items, params, total=len(items))
@@ -0,0 +1,61 @@
+"""Reference data for form dropdowns and enum endpoints, cached in memory.
+
+The gardens and beds a user can choose from are kept as lightweight
+(id, name) options per owner, loaded on first use and dropped when a commit
+changes their table (the same commits that send gardensChanged or bedsChanged
+to the browser), so opening a modal form does not query them again.
+"""
+import threading
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.database.versions import versions
+from app.library.ownership import owner_id, scope
+from app.models.user_models import User
+
+
+class Option(NamedTuple):
+  id: int
+  name: str
+
+
+class ReferenceCache:
+  """(id, name) options of a model by owner, kept until the model's table next changes."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._tables: Dict[str, Tuple[tuple, Dict[Optional[int], Tuple[Option, ...]]]] = {}
+
+  def options(self, session: Session, model, user: Optional[User]) -> Tuple[Option, ...]:
+    table = model.__tablename__
+    owner = owner_id(user)
+    version = versions.get(table)
+    with self._lock:
+      cached = self._tables.get(table)
+      if cached is not None and cached[0] == version and owner in cached[1]:
+        return cached[1][owner]
+    statement = scope(select(model.id, model.name), model, user).order_by(model.name)
+    options = tuple(Option(*row) for row in session.exec(statement))
+    with self._lock:
+      cached = self._tables.get(table)
+      if cached is None or cached[0] != version:
+        # options of every owner loaded before the change are stale
+        cached = (version, {})
+        self._tables[table] = cached
+      cached[1][owner] = options
+    return options
+
+  def clear(self):
+    with self._lock:
+      self._tables.clear()
+
+
+references = ReferenceCache()
+
+
+@lru_cache(maxsize=None)
+def enum_values(enum) -> Tuple[str, ...]:
+  """Return the values of an enum, built once."""
+  return tuple(member.value for member in enum)
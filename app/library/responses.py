@@ -0,0 +1,53 @@
+from functools import lru_cache
+from typing import Any, Iterable, List, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+@lru_cache()
+def column_keys(model) -> Tuple[str, ...]:
+  """Return the column attribute names of a table model."""
+  return tuple(model.__table__.columns.keys())
+
+
+@lru_cache()
+def read_keys(read_model, model) -> Tuple[str, ...]:
+  """Return the fields of a read model that are column attributes of the table model."""
+  columns = set(column_keys(model))
+  return tuple(name for name in read_model.__fields__ if name in columns)
+
+
+def encode_row(obj, read_model=None) -> dict:
+  """Return the column values of a SQLModel row as a dict.
+
+  Unlike jsonable_encoder this reads the mapped columns directly and does not
+  walk relationships or re-validate the values. Given the endpoint's read
+  model only its fields are encoded, so columns such as owner_id stay private
+  as they would with the response_model.
+  """
+  if hasattr(obj, "__table__"):
+    keys = read_keys(read_model, type(obj)) if read_model is not None else column_keys(type(obj))
+    return {key: getattr(obj, key) for key in keys}
+  return obj.dict()
+
+
+def encode_rows(rows: Iterable, read_model) -> List[dict]:
+  """Encode SQLModel rows with the fields of the read model, see encode_row."""
+  return [encode_row(row, read_model) for row in rows]
+
+
+def _default(obj: Any):
+  if isinstance(obj, BaseModel):
+    return encode_row(obj)
+  if isinstance(obj, (set, frozenset)):
+    return list(obj)
+  raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+  """JSON response rendered with orjson, encoding SQLModel rows natively."""
+
+  def render(self, content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
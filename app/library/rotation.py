@@ -0,0 +1,92 @@
+"""Crop rotation scores for the beds of a garden from the planting history.
+
+A bed loses points for every extra season in the window in which a plant
+family was grown in it again, and plant families grown in it during the
+window are listed as ones to avoid next.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.database.versions import versions
+from app.models.garden_models import Bed, Planting, PlantingEvent, PlantingHistory
+
+
+# Points lost for each season a plant family repeats in a bed
+REPEAT_PENALTY = 25
+MAX_SCORE = 100
+
+
+def rotation_scores(session: Session, garden_id: int, season: int, seasons: int) -> Dict:
+  """Score every bed of the garden over the seasons up to and including `season`."""
+  first_season = season - seasons + 1
+  # one grouped pass over the history of every bed in the garden
+  statement = (
+    select(
+      Bed.id,
+      Bed.name,
+      PlantingHistory.family_group,
+      func.count(func.distinct(PlantingHistory.season)),
+      func.max(PlantingHistory.season),
+    )
+    .outerjoin(PlantingHistory, (PlantingHistory.bed_id == Bed.id)
+      & (PlantingHistory.season >= first_season)
+      & (PlantingHistory.season <= season)
+      & (PlantingHistory.event != PlantingEvent.REMOVED)
+      & PlantingHistory.family_group.is_not(None))
+    .where(Bed.garden_id == garden_id)
+    .group_by(Bed.id, PlantingHistory.family_group)
+    .order_by(Bed.id)
+  )
+  beds = {}
+  families = defaultdict(dict)
+  for bed_id, name, family_group, season_count, last_season in session.exec(statement):
+    beds[bed_id] = name
+    if family_group is not None:
+      families[bed_id][family_group] = (season_count, last_season)
+
+  results = []
+  for bed_id, name in beds.items():
+    bed_families = families[bed_id]
+    repeats = {family: count - 1 for family, (count, _) in bed_families.items() if count > 1}
+    results.append({
+      "bed_id": bed_id,
+      "name": name,
+      "score": max(MAX_SCORE - REPEAT_PENALTY * sum(repeats.values()), 0),
+      "repeated_families": repeats,
+      "avoid": sorted(bed_families, key=lambda family: (-bed_families[family][1], family)),
+    })
+  return {"garden_id": garden_id, "season": season, "seasons": seasons, "beds": results}
+
+
+class RotationCache:
+  """Rotation scores by garden and window, kept until plantings or beds next change."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._scores: Dict[Tuple[int, int, int], Tuple[tuple, Dict]] = {}
+
+  def get(self, session: Session, garden_id: int, season: int, seasons: int) -> Dict:
+    key = (garden_id, season, seasons)
+    version = versions.get(Planting.__tablename__, Bed.__tablename__)
+    with self._lock:
+      cached = self._scores.get(key)
+      if cached is not None and cached[0] == version:
+        return cached[1]
+    scores = rotation_scores(session, garden_id, season, seasons)
+    with self._lock:
+      if any(cached_version != version for cached_version, _ in self._scores.values()):
+        # everything cached before the change is stale
+        self._scores.clear()
+      self._scores[key] = (version, scores)
+    return scores
+
+  def clear(self):
+    with self._lock:
+      self._scores.clear()
+
+
+rotations = RotationCache()
@@ -0,0 +1,43 @@
+from typing import Iterator, Mapping, Optional
+
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+
+# Number of template output fragments to join before each chunk is sent
+BUFFER_SIZE = 64
+
+
+def stream_rows(engine: Engine, statement) -> Iterator:
+  """Yield the rows of a statement from a session of its own, opened when the first row is read.
+
+  A streamed body is written after the endpoint returns, when the request's
+  session may already be closed, so lazy results for the template context
+  come from here rather than from the request's session.
+  """
+  with Session(engine) as session:
+    yield from session.exec(statement)
+
+
+class StreamingTemplateResponse(StreamingResponse):
+  """Response rendering a Jinja2 template incrementally as it is sent.
+
+  The template is rendered with `Template.stream()` so the context may hold
+  lazy iterators, such as database results, that are consumed while the body
+  is written rather than materialised up front.
+  """
+  media_type = "text/html"
+
+  def __init__(self,
+               templates: Jinja2Templates,
+               name: str,
+               context: dict,
+               status_code: int = 200,
+               headers: Optional[Mapping[str, str]] = None,
+               buffer_size: int = BUFFER_SIZE,
+               ):
+    stream = templates.get_template(name).stream(context)
+    stream.enable_buffering(buffer_size)
+    super().__init__(stream, status_code=status_code, headers=headers)
@@ -0,0 +1,15 @@
+from typing import Optional
+
+
+def keyset_window(session, statement, model, after: Optional[int], size: int):
+  """Return the next window of rows with an id greater than `after`.
+
+  Also returns the id to continue from, or None when this is the last window.
+  """
+  if after is not None:
+    statement = statement.where(model.id > after)
+  statement = statement.order_by(model.id).limit(size + 1)
+  rows = session.exec(statement).all()
+  if len(rows) > size:
+    return rows[:size], rows[size - 1].id
+  return rows, None
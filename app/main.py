@@ -1,11 +1,9 @@
 # import external modules
 
 import logging
-
-from functools import lru_cache
+import os
 
 from fastapi import APIRouter, Depends, FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 
 from fastapi_pagination import Page, paginate, add_pagination
 
@@ -13,8 +11,20 @@ import uvicorn
 
 # import local modules
 
-from app.config import Settings
-from app.database.database import create_db_and_tables
+from app.config import Settings, get_settings
+from app.database.database import create_db_and_tables, engine
+from app.database.backup import start_backups, stop_backups
+from app.database.group_commit import start_group_commit, stop_group_commit
+from app.database.maintenance import start_maintenance, stop_maintenance
+from app.library.admission import AUTH, PAGES, READS, WRITES, AdmissionControlMiddleware, AdmissionLimit
+from app.library.assets import AssetFiles
+from app.library.audit import AuditActorMiddleware, start_audit_log, stop_audit_log
+from app.library.climate import climate_store
+from app.library.coalescing import CoalescingMiddleware
+from app.library.helpers import pages
+from app.library.jobs import start_job_runner, stop_job_runner
+from app.library.leader import start_leader, stop_leader
+from app.library.responses import FastJSONResponse
 from app.library.routers import TimedRoute
 from app.endpoints.garden import garden_router
 from app.endpoints.bed import bed_router
@@ -22,6 +32,10 @@ from app.endpoints.planting import planting_router
 from app.endpoints.plant import plant_router
 from app.endpoints.pages import pages_router
 from app.endpoints.api_user import user_router
+from app.endpoints.metrics import metrics_router
+from app.endpoints.irrigation import irrigation_router
+from app.endpoints.jobs import jobs_router
+from app.endpoints.audit import audit_router
 from app.populate import create_planting_db
 
 
@@ -33,9 +47,26 @@ logging.config.fileConfig('logging.conf', disable_existing_loggers=False)
 logger = logging.getLogger(__name__)  # the __name__ resolve to "main" since we are at the root of the project. 
                                       # This will get the root logger since no logger in the configuration has this name.
                                       
+
+def admission_limits(settings: Settings):
+  """Return the admission limit of each route group from the settings."""
+  return {
+    group: AdmissionLimit(
+      concurrency=getattr(settings, f"admission_{group}_concurrency"),
+      queue_size=getattr(settings, f"admission_{group}_queue_size"),
+      queue_timeout=getattr(settings, f"admission_{group}_queue_timeout"),
+      retry_after=settings.admission_retry_after,
+    )
+    for group in (AUTH, WRITES, PAGES, READS)
+  }
+
+
 # instantiate the FastAPI app
-app = FastAPI(title="Garden Assistant", debug=True)
-add_pagination(app)
+app = FastAPI(title="Garden Assistant", debug=True, default_response_class=FastJSONResponse)
+app.add_middleware(AuditActorMiddleware)
+app.add_middleware(AdmissionControlMiddleware, limits=admission_limits(get_settings()))
+# added last so it runs first and coalesced followers do not take admission slots
+app.add_middleware(CoalescingMiddleware)
 
 router = APIRouter(route_class=TimedRoute)
 
@@ -45,8 +76,12 @@ app.include_router(planting_router)
 app.include_router(plant_router)
 app.include_router(user_router)
 app.include_router(pages_router)
+app.include_router(metrics_router)
+app.include_router(irrigation_router)
+app.include_router(jobs_router)
+app.include_router(audit_router)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", AssetFiles(directory="static"), name="static")
 
 
 # @app.middleware("http")
@@ -64,11 +99,6 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 #     return response
 
 
-@lru_cache()
-def get_settings():
-    return Settings()
-
-
 @router.get("/info")
 async def info(settings: Settings = Depends(get_settings)):
     return {
@@ -78,6 +108,25 @@ async def info(settings: Settings = Depends(get_settings)):
     }
 
 app.include_router(router)
+add_pagination(app)
+
+def start_schedulers():
+  """Start the background work that must run in one process only, see app.library.leader."""
+  settings = get_settings()
+  start_job_runner(engine, workers=settings.job_workers, executor=settings.job_executor, poll_interval=settings.job_poll_interval)
+  if settings.maintenance_interval:
+    start_maintenance(engine, settings.maintenance_interval, budget=settings.maintenance_budget,
+                      vacuum_pages=settings.maintenance_vacuum_pages, quiet_rate=settings.maintenance_quiet_rate)
+  if settings.backup_interval:
+    start_backups(engine, settings.backup_interval, settings.backup_dir, keep=settings.backup_keep,
+                  step_pages=settings.backup_step_pages, step_pause=settings.backup_step_pause)
+
+
+def stop_schedulers():
+  stop_maintenance()
+  stop_backups()
+  stop_job_runner()
+
 
 @app.on_event("startup")
 def on_startup():
@@ -85,6 +134,30 @@ def on_startup():
   create_db_and_tables()
   # print(f"Populating tables...")  
   # create_planting_db()
+  settings = get_settings()
+  if settings.group_commit:
+    start_group_commit(engine, max_batch=settings.group_commit_max_batch, max_delay=settings.group_commit_max_delay)
+  if os.path.isdir(settings.climate_dir):
+    climate_store(settings.climate_dir).refresh_all()
+    climate_store(settings.climate_dir).watch(settings.climate_watch_interval)
+  start_audit_log(flush_interval=settings.audit_flush_interval, max_batch=settings.audit_max_batch)
+  pages.prerender()
+  if settings.pages_watch:
+    pages.watch(settings.pages_watch_interval)
+  # every server worker runs this startup, but only one of them the schedulers
+  start_leader(settings.scheduler_lock_file, start_schedulers, stop_schedulers, interval=settings.scheduler_retry_interval)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+  pages.stop_watching()
+  settings = get_settings()
+  if os.path.isdir(settings.climate_dir):
+    climate_store(settings.climate_dir).stop_watching()
+  stop_leader()
+  stop_group_commit()
+  # last, so the changes of the final group commit batch are written too
+  stop_audit_log()
 
 
 def main():
@@ -0,0 +1,50 @@
+import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import DDL, Column, DateTime, Index, event
+from sqlmodel import Field, SQLModel
+
+
+class AuditAction(str, Enum):
+  INSERT = "insert"
+  UPDATE = "update"
+  DELETE = "delete"
+
+
+class AuditEvent(SQLModel, table=True):
+  """A change to a garden, bed, planting or plant, written by app.library.audit."""
+  __tablename__ = "audit_event"
+  __table_args__ = (
+    Index("ix_audit_event_entity_entity_id_recorded_at", "entity", "entity_id", "recorded_at"),
+    Index("ix_audit_event_user_id_recorded_at", "user_id", "recorded_at"),
+    Index("ix_audit_event_recorded_at", "recorded_at"),
+  )
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  entity: str
+  entity_id: int
+  action: AuditAction
+  user_id: Optional[int] = None
+  # JSON encoded {column: [before, after]} of the changed columns
+  changes: str = "{}"
+  # the time of the commit, not of the (later) batched write
+  recorded_at: datetime.datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+
+
+# Audit events are never changed once written
+for _operation in ("UPDATE", "DELETE"):
+  event.listen(AuditEvent.__table__, "after_create", DDL(
+    f"CREATE TRIGGER audit_event_no_{_operation.lower()} BEFORE {_operation} ON audit_event "
+    f"BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END"
+  ).execute_if(dialect="sqlite"))
+
+
+class AuditEventRead(SQLModel):
+  id: int
+  entity: str
+  entity_id: int
+  action: AuditAction
+  user_id: Optional[int] = None
+  changes: dict
+  recorded_at: datetime.datetime
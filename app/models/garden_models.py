@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from enum import Enum as Enum_
 from fastapi import Form
-from sqlalchemy import Column, DateTime, func
+from sqlalchemy import DDL, Column, Date, DateTime, Index, case, column, event, func, insert, inspect, null, select, table, update
 from sqlmodel import Field, Relationship, SQLModel
 from typing import List, Optional
 
 from app.models.plant import Plant
+from app.models.user_models import User  # registers the user table owners refer to
 from app.library.form import as_form
+from app.library.harvest import parse_harvest
 
 
 
@@ -41,10 +43,19 @@ class GardenBase(SQLModel):
   type: Optional[GardenType] = None
   location: Optional[str] = None
   zone: Optional[ClimaticZone] = None
+  latitude: Optional[float] = None
+  longitude: Optional[float] = None
 
 
 class Garden(GardenBase, table=True):
+  __table_args__ = (
+    Index("ix_garden_owner_id_name", "owner_id", "name"),
+    Index("ix_garden_owner_id_type_name", "owner_id", "type", "name"),
+    Index("ix_garden_owner_id_zone_name", "owner_id", "zone", "name"),
+  )
+
   id: Optional[int] = Field(default=None, primary_key=True)
+  owner_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
   beds: List["Bed"] = Relationship(back_populates="garden")
 
 
@@ -62,6 +73,29 @@ class GardenUpdate(SQLModel):
   type: Optional[GardenType] = None
   location: Optional[str] = None
   zone: Optional[ClimaticZone] = None
+  latitude: Optional[float] = None
+  longitude: Optional[float] = None
+
+
+# R*Tree index of garden coordinates, kept in step with the garden table by triggers
+garden_rtree = table("garden_rtree", column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon"))
+
+GARDEN_RTREE_DDL = (
+  "CREATE VIRTUAL TABLE IF NOT EXISTS garden_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+  "CREATE TRIGGER garden_rtree_insert AFTER INSERT ON garden "
+  "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+  "INSERT INTO garden_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END",
+  "CREATE TRIGGER garden_rtree_update AFTER UPDATE OF id, latitude, longitude ON garden BEGIN "
+  "DELETE FROM garden_rtree WHERE id = old.id; "
+  "INSERT INTO garden_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude "
+  "WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END",
+  "CREATE TRIGGER garden_rtree_delete AFTER DELETE ON garden BEGIN "
+  "DELETE FROM garden_rtree WHERE id = old.id; END",
+)
+
+for _statement in GARDEN_RTREE_DDL:
+  event.listen(Garden.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Garden.__table__, "before_drop", DDL("DROP TABLE IF EXISTS garden_rtree").execute_if(dialect="sqlite"))
 
 
 class SoilType(str, Enum):
@@ -89,7 +123,16 @@ class BedBase(SQLModel):
 
 
 class Bed(BedBase, table=True):
+  __table_args__ = (
+    Index("ix_bed_garden_id_name", "garden_id", "name"),
+    Index("ix_bed_owner_id_name", "owner_id", "name"),
+    Index("ix_bed_owner_id_garden_id_name", "owner_id", "garden_id", "name"),
+    Index("ix_bed_owner_id_soil_type_name", "owner_id", "soil_type", "name"),
+    Index("ix_bed_owner_id_irrigation_zone_name", "owner_id", "irrigation_zone", "name"),
+  )
+
   id: Optional[int] = Field(default=None, primary_key=True)
+  owner_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
   garden: Optional[Garden] = Relationship(back_populates="beds")
   plantings: List["Planting"] = Relationship(back_populates="bed")
 
@@ -113,6 +156,7 @@ class PlantingBase(SQLModel):
   # name: str = Field(index=True)
   plant: str
   variety: Optional[str] = None
+  date_planted: Optional[datetime] = None
   # date_first_harvested: Optional[datetime]
   # date_removed: Optional[datetime]
   notes: Optional[str] = None
@@ -120,13 +164,65 @@ class PlantingBase(SQLModel):
   
   
 class Planting(PlantingBase, table=True):
+  __table_args__ = (
+    Index("ix_planting_bed_id_plant_variety", "bed_id", "plant", "variety"),
+    Index("ix_planting_owner_id_bed_id_plant_variety", "owner_id", "bed_id", "plant", "variety"),
+    Index("ix_planting_owner_id_plant_variety", "owner_id", "plant", "variety"),
+    Index("ix_planting_owner_id_variety", "owner_id", "variety"),
+    Index("ix_planting_owner_id_harvest_start_end", "owner_id", "harvest_start", "harvest_end"),
+  )
+
   id: Optional[int] = Field(default=None, primary_key=True)
-  # date_planted: Optional[datetime] = Field(
-  #   sa_column=Column(DateTime(timezone=True), server_default=func.now())
-  #   )
+  owner_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
+  date_planted: Optional[datetime] = Field(
+    default=None,
+    sa_column=Column(DateTime(timezone=True), server_default=func.now())
+    )
+  # derived from the plant's harvest window when the planting is written
+  harvest_start: Optional[date] = Field(default=None, sa_column=Column(Date))
+  harvest_end: Optional[date] = Field(default=None, sa_column=Column(Date))
   bed: Optional[Bed] = Relationship(back_populates="plantings")
   plants: List["Plant"] = Relationship(back_populates="planting")
 
+
+Index("ix_planting_lower_plant", func.lower(Planting.plant))
+
+
+class PlantingEvent(str, Enum):
+  PLANTED = "planted"
+  UPDATED = "updated"
+  REMOVED = "removed"
+
+
+class PlantingHistory(SQLModel, table=True):
+  """Append-only record of what was planted in each bed, kept after plantings change."""
+  __tablename__ = "planting_history"
+  __table_args__ = (
+    Index("ix_planting_history_bed_id_season", "bed_id", "season"),
+  )
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  planting_id: int
+  bed_id: Optional[int] = None
+  season: int
+  plant: str
+  variety: Optional[str] = None
+  family_group: Optional[str] = None
+  event: PlantingEvent
+  recorded_at: Optional[datetime] = Field(
+    default=None,
+    sa_column=Column(DateTime(timezone=True), server_default=func.now())
+    )
+
+
+# History rows are never changed once written
+for _operation in ("UPDATE", "DELETE"):
+  event.listen(PlantingHistory.__table__, "after_create", DDL(
+    f"CREATE TRIGGER planting_history_no_{_operation.lower()} BEFORE {_operation} ON planting_history "
+    f"BEGIN SELECT RAISE(ABORT, 'planting history is append-only'); END"
+  ).execute_if(dialect="sqlite"))
+
+
 @as_form
 class PlantingCreate(PlantingBase):
   pass
@@ -134,13 +230,14 @@ class PlantingCreate(PlantingBase):
 
 class PlantingRead(PlantingBase):
   id: int
-  # date_planted: datetime
+  harvest_start: Optional[date] = None
+  harvest_end: Optional[date] = None
 
   
 class PlantingUpdate(SQLModel):
   plant: Optional[str] = None
   variety: Optional[str] = None
-  # date_planted: Optional[datetime]
+  date_planted: Optional[datetime] = None
   # date_first_harvested: Optional[datetime]
   # date_removed: Optional[datetime]
   notes: Optional[str] = None
@@ -160,3 +257,139 @@ class PlantingUpdate(SQLModel):
       notes=notes,
       bed_id=bed_id
     )
+
+
+
+# Count of the gardens, beds and plantings each user owns, kept by triggers
+# so quota checks need not count rows
+def _owned_items_ddl(table_name: str):
+  return (
+    f"CREATE TRIGGER {table_name}_owned_insert AFTER INSERT ON {table_name} WHEN new.owner_id IS NOT NULL BEGIN "
+    f"UPDATE user SET items_owned = items_owned + 1 WHERE id = new.owner_id; END",
+    f"CREATE TRIGGER {table_name}_owned_delete AFTER DELETE ON {table_name} WHEN old.owner_id IS NOT NULL BEGIN "
+    f"UPDATE user SET items_owned = items_owned - 1 WHERE id = old.owner_id; END",
+    f"CREATE TRIGGER {table_name}_owned_update AFTER UPDATE OF owner_id ON {table_name} BEGIN "
+    f"UPDATE user SET items_owned = items_owned - 1 WHERE id = old.owner_id; "
+    f"UPDATE user SET items_owned = items_owned + 1 WHERE id = new.owner_id; END",
+  )
+
+
+OWNED_TABLES = (Garden, Bed, Planting)
+
+for _model in OWNED_TABLES:
+  for _statement in _owned_items_ddl(_model.__tablename__):
+    event.listen(_model.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+
+# Planting history
+
+def _record_history(connection, planting: Planting, planting_event: PlantingEvent):
+  planted = planting.date_planted or datetime.utcnow()
+  family_group = (
+    select(Plant.family_group)
+    .where(func.lower(Plant.name_common) == planting.plant.lower())
+    .limit(1)
+    .scalar_subquery()
+  )
+  connection.execute(insert(PlantingHistory.__table__).values(
+    planting_id=planting.id,
+    bed_id=planting.bed_id,
+    season=planted.year,
+    plant=planting.plant,
+    variety=planting.variety,
+    family_group=family_group,
+    event=planting_event,
+  ))
+
+
+@event.listens_for(Planting, "after_insert")
+def _record_planted(mapper, connection, planting: Planting):
+  _record_history(connection, planting, PlantingEvent.PLANTED)
+
+
+@event.listens_for(Planting, "after_update")
+def _record_updated(mapper, connection, planting: Planting):
+  state = inspect(planting)
+  if any(state.attrs[name].history.has_changes() for name in ("plant", "variety", "bed_id", "date_planted")):
+    _record_history(connection, planting, PlantingEvent.UPDATED)
+
+
+@event.listens_for(Planting, "after_delete")
+def _record_removed(mapper, connection, planting: Planting):
+  _record_history(connection, planting, PlantingEvent.REMOVED)
+
+
+# Catalog keys
+
+@event.listens_for(Plant, "before_insert")
+@event.listens_for(Plant, "before_update")
+def _set_plant_catalog_key(mapper, connection, plant: Plant):
+  # every plant is keyed, so a catalog import updates plants entered by hand rather than duplicating them
+  from app.library.catalog import catalog_key  # the catalog imports this module
+
+  plant.catalog_key = catalog_key(plant.name_botanical, plant.name_common)
+
+
+# Harvest window maintenance
+
+def _harvest_dates(date_planted: datetime, min_weeks: Optional[int], max_weeks: Optional[int]):
+  if date_planted is None or min_weeks is None:
+    return None, None
+  planted = date_planted.date()
+  return planted + timedelta(weeks=min_weeks), planted + timedelta(weeks=max_weeks)
+
+
+@event.listens_for(Plant, "before_insert")
+@event.listens_for(Plant, "before_update")
+def _parse_plant_harvest(mapper, connection, plant: Plant):
+  window = parse_harvest(plant.harvest)
+  plant.harvest_min_weeks = window.min_weeks if window else None
+  plant.harvest_max_weeks = window.max_weeks if window else None
+  plant.harvest_from = window.origin if window else None
+
+
+@event.listens_for(Plant, "after_insert")
+@event.listens_for(Plant, "after_update")
+def _refresh_plant_plantings(mapper, connection, plant: Plant):
+  state = inspect(plant)
+  renamed = state.attrs.name_common.history
+  if state.attrs.harvest.history.has_changes() or renamed.has_changes():
+    # plantings still named after a renamed plant no longer have a window
+    refresh_harvest_windows(connection, [plant.name_common, *(name for name in renamed.deleted if name)])
+
+
+@event.listens_for(Planting, "before_insert")
+@event.listens_for(Planting, "before_update")
+def _set_planting_harvest(mapper, connection, planting: Planting):
+  state = inspect(planting)
+  if state.persistent and not (state.attrs.plant.history.has_changes() or state.attrs.date_planted.history.has_changes()):
+    return
+  if planting.date_planted is None:
+    planting.date_planted = datetime.utcnow()
+  statement = (
+    select(Plant.harvest_min_weeks, Plant.harvest_max_weeks)
+    .where(func.lower(Plant.name_common) == planting.plant.lower())
+    .limit(1)
+  )
+  window = connection.execute(statement).first()
+  planting.harvest_start, planting.harvest_end = _harvest_dates(planting.date_planted, *(window or (None, None)))
+
+
+def refresh_harvest_windows(connection, plant_names: Optional[List[str]] = None):
+  """Recompute the harvest dates of plantings of the given plants, or of all plantings."""
+  plant = Plant.__table__
+  planting = Planting.__table__
+  matching_plant = func.lower(plant.c.name_common) == func.lower(planting.c.plant)
+
+  def offset_date(weeks_column):
+    weeks = select(weeks_column).where(matching_plant).limit(1).scalar_subquery()
+    # printf would turn a missing window into "+0 days", see _harvest_dates
+    return case((weeks.is_(None), null()), else_=func.date(planting.c.date_planted, func.printf("+%d days", weeks * 7)))
+
+  statement = update(planting).values(
+    harvest_start=offset_date(plant.c.harvest_min_weeks),
+    harvest_end=offset_date(plant.c.harvest_max_weeks),
+  )
+  if plant_names is not None:
+    statement = statement.where(func.lower(planting.c.plant).in_([name.lower() for name in plant_names]))
+  connection.execute(statement)
@@ -0,0 +1,63 @@
+import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Index, func, text
+from sqlmodel import Field, SQLModel
+
+from app.models.user_models import User  # registers the user table owners refer to
+
+
+class JobStatus(str, Enum):
+  QUEUED = "queued"
+  RUNNING = "running"
+  SUCCEEDED = "succeeded"
+  FAILED = "failed"
+  CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class Job(SQLModel, table=True):
+  """A slow operation run by the background job runner, see app.library.jobs."""
+  __table_args__ = (
+    # the runner claims the queued job with the highest priority, oldest first
+    Index("ix_job_status_priority_id", "status", text("priority DESC"), "id"),
+  )
+
+  id: Optional[int] = Field(default=None, primary_key=True)
+  kind: str
+  # JSON encoded keyword arguments of the job handler, and its JSON encoded result
+  params: str = "{}"
+  result: Optional[str] = None
+  status: JobStatus = JobStatus.QUEUED
+  priority: int = 0
+  progress: float = 0.0
+  message: Optional[str] = None
+  error: Optional[str] = None
+  cancel_requested: bool = False
+  owner_id: Optional[int] = Field(default=None, foreign_key="user.id")
+  created_at: Optional[datetime.datetime] = Field(
+    default=None,
+    sa_column=Column(DateTime(timezone=True), server_default=func.now())
+    )
+  started_at: Optional[datetime.datetime] = None
+  finished_at: Optional[datetime.datetime] = None
+  # the runner running the job, "host:pid", and when it last marked the job alive
+  runner_id: Optional[str] = None
+  heartbeat_at: Optional[datetime.datetime] = None
+
+
+class JobRead(SQLModel):
+  id: int
+  kind: str
+  status: JobStatus
+  priority: int
+  progress: float
+  message: Optional[str] = None
+  error: Optional[str] = None
+  result: Optional[str] = None
+  created_at: Optional[datetime.datetime] = None
+  started_at: Optional[datetime.datetime] = None
+  finished_at: Optional[datetime.datetime] = None
@@ -1,3 +1,4 @@
+from sqlalchemy import Index, func, text
 from sqlmodel import Field, Relationship, SQLModel
 from typing import List, Optional, TYPE_CHECKING
 
@@ -20,10 +21,30 @@ class PlantBase(SQLModel):
 
 
 class Plant(PlantBase, table=True):
+  __table_args__ = (
+    Index("ix_plant_family_group_name_common", "family_group", "name_common"),
+    Index("ix_plant_name_botanical", "name_botanical"),
+    Index("ix_plant_catalog_key", "catalog_key", unique=True),
+    # hardly any plant is linked to a planting; indexing only the linked ones
+    # keeps the lookup on deleting a planting an index search
+    Index("ix_plant_planting_id", "planting_id", sqlite_where=text("planting_id IS NOT NULL")),
+  )
+
   id: Optional[int] = Field(default=None, primary_key=True)
+  # derived from the names when the plant is written, see app.library.catalog
+  catalog_key: Optional[str] = None
+  content_hash: Optional[str] = None
+  # parsed from the harvest text when the plant is written
+  harvest_min_weeks: Optional[int] = Field(default=None, index=True)
+  harvest_max_weeks: Optional[int] = None
+  harvest_from: Optional[str] = None
   planting: List["Planting"] = Relationship(back_populates="plants")
 
 
+# plantings name their plant in any case, see refresh_harvest_windows
+Index("ix_plant_lower_name_common", func.lower(Plant.name_common))
+
+
 @as_form
 class PlantCreate(PlantBase):
   pass
@@ -31,6 +52,9 @@ class PlantCreate(PlantBase):
 
 class PlantRead(PlantBase):
   id: int
+  harvest_min_weeks: Optional[int] = None
+  harvest_max_weeks: Optional[int] = None
+  harvest_from: Optional[str] = None
   
   
 class PlantUpdate(SQLModel):
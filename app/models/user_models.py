@@ -12,6 +12,8 @@ class User(SQLModel, table=True):
   email: EmailStr
   created_at: datetime.datetime = datetime.datetime.now()
   gardener: bool = True
+  # gardens, beds and plantings owned, maintained by triggers in app.models.garden_models
+  items_owned: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 
 class UserInput(SQLModel):
@@ -0,0 +1,82 @@
+"""Production server: gunicorn managing uvicorn workers on uvloop and httptools.
+
+Run with
+
+    python -m app.server
+
+The app is imported once in the master process and forked into
+`server_workers` workers (one per CPU by default). Signals to the master:
+
+* HUP reloads the settings and gracefully replaces the workers; old workers
+  finish their requests, waiting at most `server_graceful_timeout` seconds
+* TERM shuts down gracefully, INT and QUIT immediately
+* TTIN and TTOU add or remove a worker
+
+The table versions that in-process caches are keyed on are kept in shared
+memory set up before forking, so a write handled by one worker invalidates
+the caches of every worker. Writes from outside the server, such as the
+catalog command line ingest or a migration, are picked up after a HUP.
+"""
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+from sqlmodel import SQLModel
+from uvicorn.workers import UvicornWorker
+
+from app.config import SETTINGS_GENERATION, get_settings, reload_settings
+from app.database.database import engine
+from app.database.versions import versions
+
+
+class ProductionWorker(UvicornWorker):
+  CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
+
+
+def post_fork(server, worker):
+  # connections opened by the master must not be shared with the workers
+  engine.dispose()
+
+
+def on_reload(server):
+  reload_settings()
+
+
+class Server(BaseApplication):
+
+  def __init__(self, app, options):
+    self.application = app
+    self.options = options
+    super().__init__()
+
+  def load_config(self):
+    for key, value in self.options.items():
+      self.cfg.set(key, value)
+
+  def load(self):
+    return self.application
+
+
+def options(settings) -> dict:
+  return {
+    "bind": settings.server_bind,
+    "workers": settings.server_workers or multiprocessing.cpu_count(),
+    "worker_class": f"{__name__}.ProductionWorker",
+    "preload_app": True,
+    "graceful_timeout": settings.server_graceful_timeout,
+    "max_requests": settings.server_max_requests,
+    "max_requests_jitter": settings.server_max_requests // 10,
+    "logconfig": "logging.conf",
+    "post_fork": post_fork,
+    "on_reload": on_reload,
+  }
+
+
+def main():
+  from app.main import app
+
+  versions.share(list(SQLModel.metadata.tables) + [SETTINGS_GENERATION])
+  Server(app, options(get_settings())).run()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,95 @@
+"""Measure the cost the audit log adds to a write request.
+
+Sends PATCH /api/beds/{id} requests against a file backed SQLite database in
+alternating rounds, with the audit listeners removed and with them capturing
+diffs into the write-behind buffer, which a background thread flushes as it
+would in the app. Commit times vary with the disk, so the median round of each
+is compared.
+
+Run with
+
+    python -m benchmarks.audit
+"""
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.database.session import get_session
+from app.endpoints.api_user import auth_handler
+from app.library import audit
+from app.main import app
+from app.models.garden_models import Bed, SoilType
+from app.models.user_models import User
+
+
+BEDS = 200
+REQUESTS = 1000
+ROUNDS = 5
+LISTENERS = (
+  ("after_flush", audit._capture_changes),
+  ("after_soft_rollback", audit._discard_changes),
+  ("after_commit", audit._buffer_changes),
+)
+
+
+def make_client(path):
+  engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+  SQLModel.metadata.create_all(engine)
+  with Session(engine, expire_on_commit=False) as session:
+    user = User(username="gardener", password="secret-password", email="gardener@example.com", gardener=True)
+    session.add(user)
+    session.commit()
+    session.add_all(Bed(name=f"Bed {i}", owner_id=user.id) for i in range(BEDS))
+    session.commit()
+    bed_ids = session.exec(select(Bed.id)).all()
+
+  def get_session_override():
+    with Session(engine) as session:
+      yield session
+
+  def current_user():
+    audit.set_actor(user.id)
+    return user
+
+  app.dependency_overrides[get_session] = get_session_override
+  app.dependency_overrides[auth_handler.get_current_user] = current_user
+  return TestClient(app), engine, bed_ids
+
+
+def update_beds(client, bed_ids):
+  soils = list(SoilType)
+  start = time.perf_counter()
+  for i in range(REQUESTS):
+    client.patch(f"/api/beds/{bed_ids[i % len(bed_ids)]}", json={"soil_type": soils[i % len(soils)]})
+  return (time.perf_counter() - start) / REQUESTS
+
+
+def main():
+  plain, audited = [], []
+  with tempfile.TemporaryDirectory() as directory:
+    client, engine, bed_ids = make_client(os.path.join(directory, "beds.sqlite3"))
+    audit.start_audit_log(flush_interval=1.0)
+    for _ in range(ROUNDS):
+      for name, listener in LISTENERS:
+        event.remove(OrmSession, name, listener)
+      plain.append(update_beds(client, bed_ids))
+      for name, listener in LISTENERS:
+        event.listen(OrmSession, name, listener)
+      audited.append(update_beds(client, bed_ids))
+    audit.stop_audit_log()
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+  plain, audited = statistics.median(plain), statistics.median(audited)
+  print(f"{'without audit':>14}: {plain * 1e6:8.1f} us per request")
+  print(f"{'with audit':>14}: {audited * 1e6:8.1f} us per request ({(audited / plain - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+  main()
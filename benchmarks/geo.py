@@ -0,0 +1,68 @@
+"""Compare nearby-garden lookups through the R*Tree with scanning every garden.
+
+Loads 1,000,000 gardens at random points over Australia into a file backed
+SQLite database, then times radius queries around random points.
+
+Run with
+
+    python -m benchmarks.geo
+"""
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.endpoints.garden import gardens_in_box
+from app.library.geo import bounding_box, distance_km
+from app.models.garden_models import Garden
+
+
+GARDENS = 1_000_000
+QUERIES = 200
+RADIUS_KM = 5
+
+
+def load(engine):
+  rows = [
+    {"name": f"Garden {i}", "latitude": random.uniform(-43, -11), "longitude": random.uniform(113, 153)}
+    for i in range(GARDENS)
+  ]
+  with engine.begin() as connection:
+    connection.execute(text("INSERT INTO garden (name, latitude, longitude) VALUES (:name, :latitude, :longitude)"), rows)
+
+
+def nearby(session, statement, lat, lon):
+  return [garden for garden in session.exec(statement).all() if distance_km(lat, lon, garden.latitude, garden.longitude) <= RADIUS_KM]
+
+
+def run(name, engine, points, make_statement):
+  with Session(engine) as session:
+    start = time.perf_counter()
+    found = sum(len(nearby(session, make_statement(*bounding_box(lat, lon, RADIUS_KM)), lat, lon)) for lat, lon in points)
+    elapsed = time.perf_counter() - start
+  print(f"{name:>10}: {elapsed / len(points) * 1000:8.2f} ms per query ({found} gardens found)")
+
+
+def scan(min_lat, min_lon, max_lat, max_lon):
+  return select(Garden).where(Garden.latitude.between(min_lat, max_lat), Garden.longitude.between(min_lon, max_lon))
+
+
+def main():
+  random.seed(1)
+  with tempfile.TemporaryDirectory() as directory:
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'gardens.sqlite3')}")
+    SQLModel.metadata.create_all(engine)
+    start = time.perf_counter()
+    load(engine)
+    print(f"loaded {GARDENS} gardens in {time.perf_counter() - start:.1f} s")
+    points = [(random.uniform(-43, -11), random.uniform(113, 153)) for _ in range(QUERIES)]
+    run("r*tree", engine, points, gardens_in_box)
+    run("scan", engine, points[:10], scan)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
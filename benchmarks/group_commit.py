@@ -0,0 +1,73 @@
+"""Measure write throughput of concurrent editors with and without group commit.
+
+Each of 100 editor threads inserts plantings into a file backed SQLite
+database, either committing every write itself or submitting it to the
+GroupCommitExecutor.
+
+Run with
+
+    python -m benchmarks.group_commit
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.database.database import enable_sqlite_transactions
+from app.database.group_commit import GroupCommitExecutor
+from app.models.garden_models import Planting
+
+
+EDITORS = 100
+WRITES_PER_EDITOR = 20
+
+
+def make_engine(path):
+  engine = create_engine(
+    f"sqlite:///{path}",
+    connect_args={"check_same_thread": False, "timeout": 60},
+  )
+  enable_sqlite_transactions(engine)
+  SQLModel.metadata.create_all(engine)
+  return engine
+
+
+def commit_per_request(engine, editor):
+  for i in range(WRITES_PER_EDITOR):
+    with Session(engine) as session:
+      session.add(Planting(plant=f"Tomato {editor}-{i}"))
+      session.commit()
+
+
+def group_commit(executor, editor):
+  for i in range(WRITES_PER_EDITOR):
+    planting = Planting(plant=f"Tomato {editor}-{i}")
+    executor.submit(lambda session: session.merge(planting))
+
+
+def run(name, worker):
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=EDITORS) as pool:
+    list(pool.map(worker, range(EDITORS)))
+  elapsed = time.perf_counter() - start
+  writes = EDITORS * WRITES_PER_EDITOR
+  print(f"{name:>20}: {writes / elapsed:8.0f} writes/s ({writes} writes in {elapsed:.2f} s)")
+
+
+def main():
+  with tempfile.TemporaryDirectory() as directory:
+    engine = make_engine(os.path.join(directory, "per_request.sqlite3"))
+    run("commit per request", lambda editor: commit_per_request(engine, editor))
+    engine.dispose()
+
+    engine = make_engine(os.path.join(directory, "group_commit.sqlite3"))
+    executor = GroupCommitExecutor(engine)
+    run("group commit", lambda editor: group_commit(executor, editor))
+    executor.shutdown()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,60 @@
+"""Measure how long the irrigation schedule of a large site takes to build.
+
+Plans a year of watering for 10,000 beds with random zones and soils from a
+synthetic weather file.
+
+Run with
+
+    python -m benchmarks.irrigation
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.library.irrigation import build_schedule, load_weather
+from app.models.garden_models import Bed, IrrigationZone, SoilType
+
+
+BEDS = 10_000
+DAYS = 365
+
+
+def write_weather(path):
+  start = date(2026, 1, 1)
+  with open(path, "w", encoding="utf-8") as weather_file:
+    weather_file.write("date,et0_mm,rain_mm\n")
+    for day in range(DAYS):
+      rain = random.choice([0, 0, 0, random.uniform(1, 30)])
+      weather_file.write(f"{start + timedelta(days=day)},{random.uniform(1, 8):.1f},{rain:.1f}\n")
+
+
+def main():
+  random.seed(1)
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "weather.csv")
+    write_weather(path)
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'beds.sqlite3')}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+      for i in range(BEDS):
+        session.add(Bed(
+          name=f"Bed {i}",
+          garden_id=i % 100,
+          irrigation_zone=random.choice(list(IrrigationZone) + [None]),
+          soil_type=random.choice(list(SoilType) + [None]),
+        ))
+      session.commit()
+
+      start = time.perf_counter()
+      schedule = build_schedule(session, load_weather(path))
+      elapsed = time.perf_counter() - start
+    engine.dispose()
+  print(f"{len(schedule.beds)} beds x {DAYS} days: {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+  main()
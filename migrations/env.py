@@ -6,6 +6,8 @@ from sqlmodel import SQLModel
 
 from app.models.garden_models import *
 from app.models.user_models import *
+from app.models.job_models import *
+from app.models.audit_models import *
 
 from alembic import context
 
@@ -29,6 +31,15 @@ target_metadata = SQLModel.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
+# The R*Tree index of garden coordinates is a virtual table maintained by
+# triggers, see app.models.garden_models; autogenerate would otherwise drop it
+# and the shadow tables SQLite keeps its nodes in.
+IGNORED_TABLES = {"garden_rtree", "garden_rtree_node", "garden_rtree_parent", "garden_rtree_rowid"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and name in IGNORED_TABLES)
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -46,6 +57,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -69,7 +81,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,48 @@
+"""add garden coordinates
+
+Revision ID: 3a91f6c5d2e7
+Revises: e2d95b7c0f18
+Create Date: 2026-10-19 14:38:50.214469
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '3a91f6c5d2e7'
+down_revision = 'e2d95b7c0f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('garden', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('garden', sa.Column('longitude', sa.Float(), nullable=True))
+    op.execute("CREATE VIRTUAL TABLE garden_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+    op.execute(
+        "CREATE TRIGGER garden_rtree_insert AFTER INSERT ON garden "
+        "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+        "INSERT INTO garden_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END"
+    )
+    op.execute(
+        "CREATE TRIGGER garden_rtree_update AFTER UPDATE OF id, latitude, longitude ON garden BEGIN "
+        "DELETE FROM garden_rtree WHERE id = old.id; "
+        "INSERT INTO garden_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude "
+        "WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END"
+    )
+    op.execute(
+        "CREATE TRIGGER garden_rtree_delete AFTER DELETE ON garden BEGIN "
+        "DELETE FROM garden_rtree WHERE id = old.id; END"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS garden_rtree_delete")
+    op.execute("DROP TRIGGER IF EXISTS garden_rtree_update")
+    op.execute("DROP TRIGGER IF EXISTS garden_rtree_insert")
+    op.execute("DROP TABLE IF EXISTS garden_rtree")
+    with op.batch_alter_table('garden') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
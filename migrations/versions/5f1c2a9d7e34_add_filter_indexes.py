@@ -0,0 +1,43 @@
+"""add filter indexes
+
+Revision ID: 5f1c2a9d7e34
+Revises: 36238de00ee6
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c2a9d7e34'
+down_revision = '36238de00ee6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_garden_type_name', 'garden', ['type', 'name'], unique=False)
+    op.create_index('ix_garden_zone_name', 'garden', ['zone', 'name'], unique=False)
+    op.create_index('ix_bed_garden_id_name', 'bed', ['garden_id', 'name'], unique=False)
+    op.create_index('ix_bed_soil_type_name', 'bed', ['soil_type', 'name'], unique=False)
+    op.create_index('ix_bed_irrigation_zone_name', 'bed', ['irrigation_zone', 'name'], unique=False)
+    op.create_index('ix_planting_bed_id_plant_variety', 'planting', ['bed_id', 'plant', 'variety'], unique=False)
+    op.create_index('ix_planting_plant_variety', 'planting', ['plant', 'variety'], unique=False)
+    op.create_index('ix_planting_variety', 'planting', ['variety'], unique=False)
+    op.create_index('ix_plant_family_group_name_common', 'plant', ['family_group', 'name_common'], unique=False)
+    op.create_index('ix_plant_name_botanical', 'plant', ['name_botanical'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plant_name_botanical', table_name='plant')
+    op.drop_index('ix_plant_family_group_name_common', table_name='plant')
+    op.drop_index('ix_planting_variety', table_name='planting')
+    op.drop_index('ix_planting_plant_variety', table_name='planting')
+    op.drop_index('ix_planting_bed_id_plant_variety', table_name='planting')
+    op.drop_index('ix_bed_irrigation_zone_name', table_name='bed')
+    op.drop_index('ix_bed_soil_type_name', table_name='bed')
+    op.drop_index('ix_bed_garden_id_name', table_name='bed')
+    op.drop_index('ix_garden_zone_name', table_name='garden')
+    op.drop_index('ix_garden_type_name', table_name='garden')
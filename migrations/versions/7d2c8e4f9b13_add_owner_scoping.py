@@ -0,0 +1,120 @@
+"""add owner scoping
+
+Revision ID: 7d2c8e4f9b13
+Revises: 3a91f6c5d2e7
+Create Date: 2026-10-19 15:20:12.771058
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2c8e4f9b13'
+down_revision = '3a91f6c5d2e7'
+branch_labels = None
+depends_on = None
+
+
+OWNED_TABLES = ('garden', 'bed', 'planting')
+
+# the triggers of revision 3a91f6c5d2e7, dropped with the garden table when it is rebuilt
+GARDEN_RTREE_TRIGGERS = (
+    "CREATE TRIGGER garden_rtree_insert AFTER INSERT ON garden "
+    "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+    "INSERT INTO garden_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END",
+    "CREATE TRIGGER garden_rtree_update AFTER UPDATE OF id, latitude, longitude ON garden BEGIN "
+    "DELETE FROM garden_rtree WHERE id = old.id; "
+    "INSERT INTO garden_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude "
+    "WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END",
+    "CREATE TRIGGER garden_rtree_delete AFTER DELETE ON garden BEGIN "
+    "DELETE FROM garden_rtree WHERE id = old.id; END",
+)
+
+
+def upgrade() -> None:
+    for table in OWNED_TABLES:
+        # SQLite cannot add a column with a foreign key in place, so the table
+        # is rebuilt; its indexes are copied over, its triggers are not
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.add_column(sa.Column('owner_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'fk_{table}_owner_id_user', 'user', ['owner_id'], ['id'])
+            batch_op.create_index(batch_op.f(f'ix_{table}_owner_id'), ['owner_id'], unique=False)
+    for statement in GARDEN_RTREE_TRIGGERS:
+        op.execute(statement)
+    op.add_column('user', sa.Column('items_owned', sa.Integer(), server_default='0', nullable=False))
+
+    op.drop_index('ix_garden_type_name', table_name='garden')
+    op.drop_index('ix_garden_zone_name', table_name='garden')
+    op.create_index('ix_garden_owner_id_name', 'garden', ['owner_id', 'name'], unique=False)
+    op.create_index('ix_garden_owner_id_type_name', 'garden', ['owner_id', 'type', 'name'], unique=False)
+    op.create_index('ix_garden_owner_id_zone_name', 'garden', ['owner_id', 'zone', 'name'], unique=False)
+
+    op.drop_index('ix_bed_soil_type_name', table_name='bed')
+    op.drop_index('ix_bed_irrigation_zone_name', table_name='bed')
+    op.create_index('ix_bed_owner_id_name', 'bed', ['owner_id', 'name'], unique=False)
+    op.create_index('ix_bed_owner_id_garden_id_name', 'bed', ['owner_id', 'garden_id', 'name'], unique=False)
+    op.create_index('ix_bed_owner_id_soil_type_name', 'bed', ['owner_id', 'soil_type', 'name'], unique=False)
+    op.create_index('ix_bed_owner_id_irrigation_zone_name', 'bed', ['owner_id', 'irrigation_zone', 'name'], unique=False)
+
+    op.drop_index('ix_planting_plant_variety', table_name='planting')
+    op.drop_index('ix_planting_variety', table_name='planting')
+    op.drop_index('ix_planting_harvest_start_end', table_name='planting')
+    op.create_index('ix_planting_owner_id_bed_id_plant_variety', 'planting', ['owner_id', 'bed_id', 'plant', 'variety'], unique=False)
+    op.create_index('ix_planting_owner_id_plant_variety', 'planting', ['owner_id', 'plant', 'variety'], unique=False)
+    op.create_index('ix_planting_owner_id_variety', 'planting', ['owner_id', 'variety'], unique=False)
+    op.create_index('ix_planting_owner_id_harvest_start_end', 'planting', ['owner_id', 'harvest_start', 'harvest_end'], unique=False)
+
+    for table in OWNED_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_owned_insert AFTER INSERT ON {table} WHEN new.owner_id IS NOT NULL BEGIN "
+            f"UPDATE user SET items_owned = items_owned + 1 WHERE id = new.owner_id; END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_owned_delete AFTER DELETE ON {table} WHEN old.owner_id IS NOT NULL BEGIN "
+            f"UPDATE user SET items_owned = items_owned - 1 WHERE id = old.owner_id; END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_owned_update AFTER UPDATE OF owner_id ON {table} BEGIN "
+            f"UPDATE user SET items_owned = items_owned - 1 WHERE id = old.owner_id; "
+            f"UPDATE user SET items_owned = items_owned + 1 WHERE id = new.owner_id; END"
+        )
+
+
+def downgrade() -> None:
+    for table in OWNED_TABLES:
+        for operation in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_owned_{operation}")
+
+    op.drop_index('ix_planting_owner_id_harvest_start_end', table_name='planting')
+    op.drop_index('ix_planting_owner_id_variety', table_name='planting')
+    op.drop_index('ix_planting_owner_id_plant_variety', table_name='planting')
+    op.drop_index('ix_planting_owner_id_bed_id_plant_variety', table_name='planting')
+    op.create_index('ix_planting_harvest_start_end', 'planting', ['harvest_start', 'harvest_end'], unique=False)
+    op.create_index('ix_planting_variety', 'planting', ['variety'], unique=False)
+    op.create_index('ix_planting_plant_variety', 'planting', ['plant', 'variety'], unique=False)
+
+    op.drop_index('ix_bed_owner_id_irrigation_zone_name', table_name='bed')
+    op.drop_index('ix_bed_owner_id_soil_type_name', table_name='bed')
+    op.drop_index('ix_bed_owner_id_garden_id_name', table_name='bed')
+    op.drop_index('ix_bed_owner_id_name', table_name='bed')
+    op.create_index('ix_bed_irrigation_zone_name', 'bed', ['irrigation_zone', 'name'], unique=False)
+    op.create_index('ix_bed_soil_type_name', 'bed', ['soil_type', 'name'], unique=False)
+
+    op.drop_index('ix_garden_owner_id_zone_name', table_name='garden')
+    op.drop_index('ix_garden_owner_id_type_name', table_name='garden')
+    op.drop_index('ix_garden_owner_id_name', table_name='garden')
+    op.create_index('ix_garden_zone_name', 'garden', ['zone', 'name'], unique=False)
+    op.create_index('ix_garden_type_name', 'garden', ['type', 'name'], unique=False)
+
+    for table in OWNED_TABLES:
+        op.drop_index(op.f(f'ix_{table}_owner_id'), table_name=table)
+        # SQLite can drop a column referencing another table only by rebuilding the table
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_owner_id_user', type_='foreignkey')
+            batch_op.drop_column('owner_id')
+    for statement in GARDEN_RTREE_TRIGGERS:
+        op.execute(statement)
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('items_owned')
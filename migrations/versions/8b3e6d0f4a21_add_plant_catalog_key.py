@@ -0,0 +1,30 @@
+"""add plant catalog key
+
+Revision ID: 8b3e6d0f4a21
+Revises: 5f1c2a9d7e34
+Create Date: 2026-10-19 11:02:17.604519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3e6d0f4a21'
+down_revision = '5f1c2a9d7e34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('plant', sa.Column('catalog_key', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('plant', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index('ix_plant_catalog_key', 'plant', ['catalog_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plant_catalog_key', table_name='plant')
+    with op.batch_alter_table('plant') as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('catalog_key')
@@ -0,0 +1,51 @@
+"""backfill plant catalog keys
+
+Revision ID: 9b3e24d48d12
+Revises: a6e3d9c1b7f4
+Create Date: 2026-10-19 21:07:42.615390
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from app.library.catalog import catalog_key
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3e24d48d12'
+down_revision = 'a6e3d9c1b7f4'
+branch_labels = None
+depends_on = None
+
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    """Key the plants entered by hand, so catalog imports update them rather than add duplicates."""
+    connection = op.get_bind()
+    plant = sa.table('plant', sa.column('id'), sa.column('name_common'), sa.column('name_botanical'), sa.column('catalog_key'))
+    taken = set(connection.execute(sa.select(plant.c.catalog_key).where(plant.c.catalog_key.isnot(None))).scalars())
+    keys = []
+    statement = sa.select(plant.c.id, plant.c.name_botanical, plant.c.name_common).where(plant.c.catalog_key.is_(None)).order_by(plant.c.id)
+    for plant_id, name_botanical, name_common in connection.execute(statement):
+        key = catalog_key(name_botanical, name_common)
+        if key in taken:
+            # the unique index allows one plant per key; later duplicates stay unkeyed
+            logger.warning(f"Plant {plant_id} ({name_common}) duplicates another plant and is left without a catalog key")
+            continue
+        taken.add(key)
+        keys.append({'plant_id': plant_id, 'key': key})
+    if keys:
+        connection.execute(
+            plant.update().where(plant.c.id == sa.bindparam('plant_id')).values(catalog_key=sa.bindparam('key')),
+            keys,
+        )
+
+
+def downgrade() -> None:
+    # the keys of catalog plants and of plants entered by hand can no longer be told apart
+    pass
@@ -0,0 +1,28 @@
+"""add job heartbeat
+
+Revision ID: a6e3d9c1b7f4
+Revises: f3b7c1d9a2e8
+Create Date: 2026-10-19 18:21:36.504117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e3d9c1b7f4'
+down_revision = 'f3b7c1d9a2e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('job', sa.Column('runner_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('job', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('runner_id')
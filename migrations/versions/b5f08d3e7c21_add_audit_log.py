@@ -0,0 +1,47 @@
+"""add audit log
+
+Revision ID: b5f08d3e7c21
+Revises: 9c4e1b7a2f60
+Create Date: 2026-10-19 17:12:09.562873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f08d3e7c21'
+down_revision = '9c4e1b7a2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('audit_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('action', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('changes', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_event_entity_entity_id_recorded_at', 'audit_event', ['entity', 'entity_id', 'recorded_at'], unique=False)
+    op.create_index('ix_audit_event_user_id_recorded_at', 'audit_event', ['user_id', 'recorded_at'], unique=False)
+    op.create_index('ix_audit_event_recorded_at', 'audit_event', ['recorded_at'], unique=False)
+    for operation in ('UPDATE', 'DELETE'):
+        op.execute(
+            f"CREATE TRIGGER audit_event_no_{operation.lower()} BEFORE {operation} ON audit_event "
+            f"BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END"
+        )
+
+
+def downgrade() -> None:
+    for operation in ('UPDATE', 'DELETE'):
+        op.execute(f"DROP TRIGGER IF EXISTS audit_event_no_{operation.lower()}")
+    op.drop_index('ix_audit_event_recorded_at', table_name='audit_event')
+    op.drop_index('ix_audit_event_user_id_recorded_at', table_name='audit_event')
+    op.drop_index('ix_audit_event_entity_entity_id_recorded_at', table_name='audit_event')
+    op.drop_table('audit_event')
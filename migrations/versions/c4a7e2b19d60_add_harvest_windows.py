@@ -0,0 +1,79 @@
+"""add harvest windows
+
+Revision ID: c4a7e2b19d60
+Revises: 8b3e6d0f4a21
+Create Date: 2026-10-19 13:41:05.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from app.library.harvest import parse_harvest
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2b19d60'
+down_revision = '8b3e6d0f4a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('plant', sa.Column('harvest_min_weeks', sa.Integer(), nullable=True))
+    op.add_column('plant', sa.Column('harvest_max_weeks', sa.Integer(), nullable=True))
+    op.add_column('plant', sa.Column('harvest_from', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_plant_harvest_min_weeks'), 'plant', ['harvest_min_weeks'], unique=False)
+    # SQLite cannot add a column with a non-constant default to a table with
+    # rows in place, so the table is rebuilt; existing plantings are dated by
+    # the default, the time of the migration
+    with op.batch_alter_table('planting', recreate='always') as batch_op:
+        batch_op.add_column(sa.Column('date_planted', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True))
+        batch_op.add_column(sa.Column('harvest_start', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('harvest_end', sa.Date(), nullable=True))
+    op.create_index('ix_planting_harvest_start_end', 'planting', ['harvest_start', 'harvest_end'], unique=False)
+    backfill_harvest_windows()
+
+
+def backfill_harvest_windows() -> None:
+    """Parse the harvest text of existing plants and date the windows of their plantings."""
+    connection = op.get_bind()
+    plant = sa.table('plant', sa.column('id'), sa.column('harvest'), sa.column('harvest_min_weeks'),
+                     sa.column('harvest_max_weeks'), sa.column('harvest_from'))
+    windows = []
+    for plant_id, harvest in connection.execute(sa.select(plant.c.id, plant.c.harvest).where(plant.c.harvest.isnot(None))):
+        window = parse_harvest(harvest)
+        if window is not None:
+            windows.append({'plant_id': plant_id, 'min_weeks': window.min_weeks, 'max_weeks': window.max_weeks, 'origin': window.origin})
+    if windows:
+        connection.execute(
+            plant.update().where(plant.c.id == sa.bindparam('plant_id')).values(
+                harvest_min_weeks=sa.bindparam('min_weeks'),
+                harvest_max_weeks=sa.bindparam('max_weeks'),
+                harvest_from=sa.bindparam('origin'),
+            ),
+            windows,
+        )
+    # as app.models.garden_models.refresh_harvest_windows at this revision
+    op.execute(
+        "UPDATE planting SET "
+        "harvest_start = (SELECT CASE WHEN plant.harvest_min_weeks IS NULL THEN NULL "
+        "ELSE date(planting.date_planted, printf('+%d days', plant.harvest_min_weeks * 7)) END "
+        "FROM plant WHERE lower(plant.name_common) = lower(planting.plant) LIMIT 1), "
+        "harvest_end = (SELECT CASE WHEN plant.harvest_max_weeks IS NULL THEN NULL "
+        "ELSE date(planting.date_planted, printf('+%d days', plant.harvest_max_weeks * 7)) END "
+        "FROM plant WHERE lower(plant.name_common) = lower(planting.plant) LIMIT 1)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_planting_harvest_start_end', table_name='planting')
+    with op.batch_alter_table('planting') as batch_op:
+        batch_op.drop_column('harvest_end')
+        batch_op.drop_column('harvest_start')
+        batch_op.drop_column('date_planted')
+    op.drop_index(op.f('ix_plant_harvest_min_weeks'), table_name='plant')
+    with op.batch_alter_table('plant') as batch_op:
+        batch_op.drop_column('harvest_from')
+        batch_op.drop_column('harvest_max_weeks')
+        batch_op.drop_column('harvest_min_weeks')
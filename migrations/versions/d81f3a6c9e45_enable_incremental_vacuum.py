@@ -0,0 +1,31 @@
+"""enable incremental vacuum
+
+Revision ID: d81f3a6c9e45
+Revises: b5f08d3e7c21
+Create Date: 2026-10-19 14:35:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6c9e45'
+down_revision = 'b5f08d3e7c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # auto_vacuum only changes on an existing database with a full VACUUM,
+    # which cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum = NONE")
+        op.execute("VACUUM")
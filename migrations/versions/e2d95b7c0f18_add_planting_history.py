@@ -0,0 +1,54 @@
+"""add planting history
+
+Revision ID: e2d95b7c0f18
+Revises: c4a7e2b19d60
+Create Date: 2026-10-19 14:12:33.902716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2d95b7c0f18'
+down_revision = 'c4a7e2b19d60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('planting_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('planting_id', sa.Integer(), nullable=False),
+    sa.Column('bed_id', sa.Integer(), nullable=True),
+    sa.Column('season', sa.Integer(), nullable=False),
+    sa.Column('plant', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('variety', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('family_group', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('event', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_planting_history_bed_id_season', 'planting_history', ['bed_id', 'season'], unique=False)
+    # start the history from the current plantings
+    op.execute(
+        "INSERT INTO planting_history (planting_id, bed_id, season, plant, variety, family_group, event) "
+        "SELECT planting.id, planting.bed_id, "
+        "CAST(strftime('%Y', COALESCE(planting.date_planted, CURRENT_TIMESTAMP)) AS INTEGER), "
+        "planting.plant, planting.variety, "
+        "(SELECT plant.family_group FROM plant WHERE lower(plant.name_common) = lower(planting.plant) LIMIT 1), "
+        "'planted' FROM planting"
+    )
+    for operation in ('UPDATE', 'DELETE'):
+        op.execute(
+            f"CREATE TRIGGER planting_history_no_{operation.lower()} BEFORE {operation} ON planting_history "
+            f"BEGIN SELECT RAISE(ABORT, 'planting history is append-only'); END"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS planting_history_no_delete")
+    op.execute("DROP TRIGGER IF EXISTS planting_history_no_update")
+    op.drop_index('ix_planting_history_bed_id_season', table_name='planting_history')
+    op.drop_table('planting_history')
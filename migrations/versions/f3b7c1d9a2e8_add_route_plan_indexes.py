@@ -0,0 +1,29 @@
+"""add route plan indexes
+
+Revision ID: f3b7c1d9a2e8
+Revises: d81f3a6c9e45
+Create Date: 2026-10-19 14:52:07.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7c1d9a2e8'
+down_revision = 'd81f3a6c9e45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_plant_lower_name_common', 'plant', [sa.text('lower(name_common)')], unique=False)
+    op.create_index('ix_plant_planting_id', 'plant', ['planting_id'], unique=False, sqlite_where=sa.text('planting_id IS NOT NULL'))
+    op.create_index('ix_planting_lower_plant', 'planting', [sa.text('lower(plant)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_planting_lower_plant', table_name='planting')
+    op.drop_index('ix_plant_planting_id', table_name='plant')
+    op.drop_index('ix_plant_lower_name_common', table_name='plant')
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.config import Settings
+from app.library.admission import READS, AdmissionControlMiddleware, AdmissionLimit
+from app.main import admission_limits
+
+
+def http_scope(path="/api/beds/", method="GET"):
+  return {"type": "http", "method": method, "path": path, "headers": []}
+
+
+async def receive():
+  return {"type": "http.request", "body": b"", "more_body": False}
+
+
+class Recorder:
+  """An ASGI send callable keeping the messages of one response."""
+
+  def __init__(self):
+    self.messages = []
+
+  async def __call__(self, message):
+    self.messages.append(message)
+
+  @property
+  def status(self):
+    return self.messages[0]["status"]
+
+  @property
+  def headers(self):
+    return dict(self.messages[0]["headers"])
+
+
+def middleware(app, concurrency=1, queue_size=0, queue_timeout=0.05):
+  limit = AdmissionLimit(concurrency=concurrency, queue_size=queue_size, queue_timeout=queue_timeout, retry_after=7)
+  return AdmissionControlMiddleware(app, limits={READS: limit})
+
+
+def test_requests_over_the_limit_are_shed_with_retry_after():
+  release = asyncio.Event()
+
+  async def slow_app(scope, receive, send):
+    await release.wait()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+  async def run():
+    gated = middleware(slow_app)
+    first, second = Recorder(), Recorder()
+    running = asyncio.create_task(gated(http_scope(), receive, first))
+    await asyncio.sleep(0)
+    await gated(http_scope(), receive, second)
+    release.set()
+    await running
+    return gated, first, second
+
+  gated, first, second = asyncio.run(run())
+
+  assert first.status == 200
+  assert second.status == 503
+  assert second.headers[b"retry-after"] == b"7"
+  assert gated.gates[READS].active == 0
+
+
+def test_queued_requests_time_out_with_503():
+  async def blocked_app(scope, receive, send):
+    await asyncio.sleep(1)
+
+  async def run():
+    gated = middleware(blocked_app, queue_size=1)
+    running = asyncio.create_task(gated(http_scope(), receive, Recorder()))
+    await asyncio.sleep(0)
+    waiting = Recorder()
+    await gated(http_scope(), receive, waiting)
+    running.cancel()
+    return waiting
+
+  assert asyncio.run(run()).status == 503
+
+
+def test_slot_is_released_when_the_app_raises():
+  async def failing_app(scope, receive, send):
+    raise RuntimeError("boom")
+
+  async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+  gated = middleware(failing_app)
+  with pytest.raises(RuntimeError):
+    asyncio.run(gated(http_scope(), receive, Recorder()))
+
+  assert gated.gates[READS].active == 0
+  gated.app = ok_app
+  recorder = Recorder()
+  asyncio.run(gated(http_scope(), receive, recorder))
+  assert recorder.status == 200
+
+
+def test_limits_come_from_the_settings():
+  limits = admission_limits(Settings(admission_reads_concurrency=3, admission_reads_queue_timeout=0.5, admission_retry_after=5))
+
+  assert limits[READS] == AdmissionLimit(concurrency=3, queue_size=128, queue_timeout=0.5, retry_after=5)
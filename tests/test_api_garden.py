@@ -1,15 +1,25 @@
-from fastapi import status
+import asyncio
+from fastapi import Request, status
 from fastapi.testclient import TestClient
 import pytest
 import random
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from datetime import date, datetime
+from sqlalchemy import delete, event
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, create_engine, select
 from urllib import response
 
+from app.config import Settings, get_settings
 from app.main import app
 from app.database.session import get_session
-from app.models.garden_models import Bed, Planting
+from app.database.versions import versions
+from app.endpoints.planting import plantings_print
+from app.library.reference import references
+from app.models.garden_models import Bed, BedRead, Garden, GardenRead, Planting, PlantingRead, PlantingEvent, PlantingHistory, refresh_harvest_windows
 from app.models.garden_models import SoilType, IrrigationZone
+from app.models.plant import Plant
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
 
 # Based on
 # https://fastapi.tiangolo.com/tutorial/testing/
@@ -17,18 +27,6 @@ from app.models.garden_models import SoilType, IrrigationZone
 
 fake_secret_token = "coneofsilence"
 
-@pytest.fixture(name="session")
-def session_fixture():
-  engine = create_engine(
-    "sqlite://",
-    connect_args={"check_same_thread": False},
-    poolclass = StaticPool
-  )
-  SQLModel.metadata.create_all(engine)
-  with Session(engine) as session:
-    yield session
-  
-  
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
   def get_session_override():
@@ -149,6 +147,46 @@ def test_delete_bed(session: Session, client: TestClient):
   assert dp_bed is None
 
 
+def test_read_beds_fields(session: Session, client: TestClient):
+  bed_1 = Bed(name="Vegetable Plot", soil_type=SoilType.LOAM, irrigation_zone=IrrigationZone.VEGETABLES)
+  session.add(bed_1)
+  session.commit()
+
+  response = client.get("/api/beds/", params={"fields": "name"})
+  data = response.json()
+
+  assert response.status_code == 200
+
+  assert data == [{"name": bed_1.name, "id": bed_1.id}]
+
+
+def test_read_beds_filter_and_sort(session: Session, client: TestClient):
+  bed_1 = Bed(name="Vegetable Plot", soil_type=SoilType.LOAM)
+  bed_2 = Bed(name="Seedlings", soil_type=SoilType.SEED_RAISING_MIX)
+  bed_3 = Bed(name="Herbs", soil_type=SoilType.LOAM)
+  session.add(bed_1)
+  session.add(bed_2)
+  session.add(bed_3)
+  session.commit()
+
+  response = client.get("/api/beds/", params={"soil_type": SoilType.LOAM.value, "sort": "-name"})
+  data = response.json()
+
+  assert response.status_code == 200
+
+  assert [bed["name"] for bed in data] == [bed_1.name, bed_3.name]
+
+
+def test_read_bed_unknown_field(session: Session, client: TestClient):
+  bed_1 = Bed(name="Vegetable Plot")
+  session.add(bed_1)
+  session.commit()
+
+  response = client.get(f"/api/beds/{bed_1.id}", params={"fields": "name,garden"})
+
+  assert response.status_code == 400
+
+
 # Garden Planting API tests
 
 def test_create_planting(client: TestClient):
@@ -261,4 +299,361 @@ def test_read_planting_with_bed(session: Session, client: TestClient):
   assert data["bed_id"] == planting_1.bed_id
   assert data["id"] == planting_1.id
   assert planting_1.bed.name == bed_1.name
-  
\ No newline at end of file
+
+
+def test_read_planting_fields(session: Session, client: TestClient):
+  planting_1 = Planting(plant="corn", variety="Sweet", notes="test")
+  session.add(planting_1)
+  session.commit()
+
+  response = client.get(f"/api/plantings/{planting_1.id}", params={"fields": "plant,variety"})
+  data = response.json()
+
+  assert response.status_code == 200
+
+  assert data == {"plant": "corn", "variety": "Sweet", "id": planting_1.id}
+
+
+def test_plantings_update_windows(session: Session, client: TestClient):
+  for plant in ["apple", "corn", "pea"]:
+    session.add(Planting(plant=plant))
+  session.commit()
+  app.dependency_overrides[get_settings] = lambda: Settings(table_page_size=2)
+
+  response = client.get("/plantings/update")
+  first_window = response.text
+
+  assert response.status_code == 200
+  assert "apple" in first_window and "corn" in first_window and "pea" not in first_window
+  assert 'hx-trigger="revealed"' in first_window
+
+  next_url = first_window.split('hx-get="')[-1].split('"')[0]
+  response = client.get(next_url)
+  last_window = response.text
+
+  assert "pea" in last_window and "apple" not in last_window
+  assert 'hx-trigger="revealed"' not in last_window
+  assert "Nothing to see here" not in last_window
+
+
+def test_plantings_print(session: Session, client: TestClient):
+  bed_1 = Bed(name="Vegetable Plot")
+  session.add(bed_1)
+  session.commit()
+  session.add(Planting(plant="corn", variety="Sweet", bed_id=bed_1.id))
+  session.add(Planting(plant="apple"))
+  session.commit()
+
+  response = client.get("/plantings/print")
+
+  assert response.status_code == 200
+  assert response.headers["content-type"].startswith("text/html")
+  assert "Vegetable Plot" in response.text
+  assert "Sweet" in response.text and "apple" in response.text
+
+
+def test_plantings_print_streams_after_the_session_closes(tmp_path):
+  # a file database, whose connections really close with the session
+  engine = create_engine(f"sqlite:///{tmp_path / 'garden.sqlite3'}", connect_args={"check_same_thread": False})
+  SQLModel.metadata.create_all(engine)
+  session = Session(engine)
+  session.add(Planting(plant="corn", variety="Sweet"))
+  session.commit()
+  request = Request({"type": "http", "method": "GET", "path": "/plantings/print", "headers": [], "query_string": b""})
+
+  response = plantings_print(request, session, user=None)
+  # as FastAPI closes the dependencies of a request before streaming its body
+  session.close()
+
+  async def read_body():
+    return b"".join([chunk.encode() if isinstance(chunk, str) else chunk async for chunk in response.body_iterator])
+
+  assert "Sweet" in asyncio.run(read_body()).decode()
+
+
+def test_read_plantings_harvest_due(session: Session, client: TestClient):
+  session.add(Plant(name_common="Corn", name_botanical="Zea mays", harvest="12 to 14 weeks from seed."))
+  session.add(Plant(name_common="Basil", name_botanical="Ocimum basilicum", harvest="Fresh all summer"))
+  session.commit()
+  session.add(Planting(plant="corn", date_planted=datetime(2026, 3, 2)))
+  session.add(Planting(plant="corn", date_planted=datetime(2026, 1, 5)))
+  session.add(Planting(plant="basil", date_planted=datetime(2026, 3, 2)))
+  session.commit()
+
+  response = client.get("/api/plantings/harvest-due", params={"from": "2026-05-01", "to": "2026-05-31"})
+  data = response.json()
+
+  assert response.status_code == 200
+  assert len(data) == 1
+  assert (data[0]["harvest_start"], data[0]["harvest_end"]) == ("2026-05-25", "2026-06-08")
+
+  plant = session.get(Plant, 1)
+  plant.harvest = "8 to 10 weeks from seed."
+  session.add(plant)
+  session.commit()
+
+  response = client.get("/api/plantings/harvest-due", params={"from": "2026-05-01", "to": "2026-05-31"})
+
+  assert [planting["harvest_start"] for planting in response.json()] == ["2026-04-27"]
+
+
+def test_refresh_leaves_plantings_without_a_window_empty(session: Session, client: TestClient):
+  session.add(Plant(name_common="Corn", name_botanical="Zea mays", harvest="12 to 14 weeks from seed."))
+  session.add(Plant(name_common="Basil", name_botanical="Ocimum basilicum", harvest="Fresh all summer"))
+  session.commit()
+  for plant in ("corn", "basil", "okra"):
+    session.add(Planting(plant=plant, date_planted=datetime(2026, 3, 2)))
+  session.commit()
+
+  refresh_harvest_windows(session.connection())
+  session.commit()
+
+  windows = {planting.plant: (planting.harvest_start, planting.harvest_end) for planting in session.exec(select(Planting))}
+  assert windows == {"corn": (date(2026, 5, 25), date(2026, 6, 8)), "basil": (None, None), "okra": (None, None)}
+  response = client.get("/api/plantings/harvest-due", params={"from": "2026-03-01", "to": "2026-03-31"})
+  assert response.json() == []
+
+  corn = session.exec(select(Plant).where(Plant.name_common == "Corn")).one()
+  corn.name_common = "Sweetcorn"
+  session.add(corn)
+  session.commit()
+
+  # the plantings still named after the old name lose their window
+  corn_planting = session.exec(select(Planting).where(Planting.plant == "corn")).one()
+  assert (corn_planting.harvest_start, corn_planting.harvest_end) == (None, None)
+
+
+def test_commit_bumps_table_version(session: Session, client: TestClient):
+  bed_version, planting_version = versions.get("bed", "planting")
+  bed_1 = Bed(name="Vegetable Plot")
+  session.add(bed_1)
+  session.commit()
+
+  response = client.delete(f"/api/beds/{bed_1.id}")
+
+  assert response.status_code == 200
+  assert versions.get("bed", "planting") == (bed_version + 2, planting_version)
+
+
+def test_planting_history_is_append_only(session: Session, client: TestClient):
+  planting = Planting(plant="corn", bed_id=1)
+  session.add(planting)
+  session.commit()
+
+  client.delete(f"/api/plantings/{planting.id}")
+
+  events = session.exec(select(PlantingHistory.event).order_by(PlantingHistory.id)).all()
+  assert events == [PlantingEvent.PLANTED, PlantingEvent.REMOVED]
+  with pytest.raises(IntegrityError):
+    session.execute(delete(PlantingHistory))
+  session.rollback()
+
+
+def test_read_garden_rotation(session: Session, client: TestClient):
+  garden = Garden(name="Allotment")
+  session.add(garden)
+  session.add(Plant(name_common="Tomato", name_botanical="Solanum lycopersicum", family_group="Solanaceae"))
+  session.add(Plant(name_common="Potato", name_botanical="Solanum tuberosum", family_group="Solanaceae"))
+  session.add(Plant(name_common="Bean", name_botanical="Phaseolus vulgaris", family_group="Fabaceae"))
+  session.commit()
+  bed_1 = Bed(name="North", garden_id=garden.id)
+  bed_2 = Bed(name="South", garden_id=garden.id)
+  session.add_all([bed_1, bed_2])
+  session.commit()
+  session.add(Planting(plant="tomato", bed_id=bed_1.id, date_planted=datetime(2024, 9, 1)))
+  session.add(Planting(plant="potato", bed_id=bed_1.id, date_planted=datetime(2025, 9, 1)))
+  session.add(Planting(plant="bean", bed_id=bed_2.id, date_planted=datetime(2025, 9, 1)))
+  session.commit()
+
+  response = client.get(f"/api/gardens/{garden.id}/rotation", params={"season": 2026})
+  data = response.json()
+
+  assert response.status_code == 200
+  north, south = data["beds"]
+  assert (north["score"], north["repeated_families"], north["avoid"]) == (75, {"Solanaceae": 1}, ["Solanaceae"])
+  assert (south["score"], south["avoid"]) == (100, ["Fabaceae"])
+
+  # a new planting invalidates the cached scores
+  session.add(Planting(plant="bean", bed_id=bed_2.id, date_planted=datetime(2026, 9, 1)))
+  session.commit()
+
+  response = client.get(f"/api/gardens/{garden.id}/rotation", params={"season": 2026})
+
+  assert response.json()["beds"][1]["score"] == 75
+
+
+# Garden API tests
+
+def test_read_gardens_nearby(session: Session, client: TestClient):
+  session.add(Garden(name="Fitzroy", latitude=-37.7983, longitude=144.9784))
+  session.add(Garden(name="Carlton", latitude=-37.8001, longitude=144.9671))
+  session.add(Garden(name="Geelong", latitude=-38.1499, longitude=144.3617))
+  session.add(Garden(name="Nowhere"))
+  session.commit()
+
+  response = client.get("/api/gardens/nearby", params={"lat": -37.7990, "lon": 144.9780, "radius": 5})
+  data = response.json()
+
+  assert response.status_code == 200
+  assert [garden["name"] for garden in data] == ["Fitzroy", "Carlton"]
+  assert data[0]["distance_km"] < data[1]["distance_km"] < 5
+
+  # moving a garden updates the index through the triggers
+  geelong = session.exec(select(Garden).where(Garden.name == "Geelong")).one()
+  geelong.latitude, geelong.longitude = -37.7991, 144.9781
+  session.add(geelong)
+  session.commit()
+
+  response = client.get("/api/gardens/nearby", params={"lat": -37.7990, "lon": 144.9780, "radius": 5})
+
+  assert response.json()[0]["name"] == "Geelong"
+
+
+def test_read_gardens_within(session: Session, client: TestClient):
+  session.add(Garden(name="Fitzroy", latitude=-37.7983, longitude=144.9784))
+  session.add(Garden(name="Geelong", latitude=-38.1499, longitude=144.3617))
+  session.commit()
+
+  response = client.get("/api/gardens/within", params={"min_lat": -38, "min_lon": 144.5, "max_lat": -37.5, "max_lon": 145})
+
+  assert response.status_code == 200
+  assert [garden["name"] for garden in response.json()] == ["Fitzroy"]
+
+  response = client.get("/api/gardens/within", params={"min_lat": -37, "min_lon": 144.5, "max_lat": -38, "max_lon": 145})
+
+  assert response.status_code == 400
+
+
+# Ownership tests
+
+@pytest.fixture(name="owner")
+def owner_fixture(session: Session):
+  owner = User(username="gardener", password="secret-password", email="gardener@example.com")
+  session.add(owner)
+  session.commit()
+  app.dependency_overrides[auth_handler.get_optional_user] = lambda: owner
+  app.dependency_overrides[auth_handler.get_current_user] = lambda: owner
+  return owner
+
+
+def test_lists_are_scoped_to_owner(session: Session, client: TestClient, owner: User):
+  session.add(Bed(name="Mine", owner_id=owner.id))
+  session.add(Bed(name="Shared"))
+  session.commit()
+
+  response = client.get("/api/beds/")
+
+  assert [bed["name"] for bed in response.json()] == ["Mine"]
+
+  shared = session.exec(select(Bed).where(Bed.name == "Shared")).one()
+  assert client.get(f"/api/beds/{shared.id}").status_code == 404
+
+  del app.dependency_overrides[auth_handler.get_optional_user]
+  response = client.get("/api/beds/")
+
+  assert [bed["name"] for bed in response.json()] == ["Shared"]
+
+
+@pytest.mark.parametrize("url, read_model, extra", [
+  ("/api/beds/", BedRead, set()),
+  ("/api/gardens/", GardenRead, set()),
+  ("/api/plantings/", PlantingRead, set()),
+  ("/api/gardens/within?min_lat=-38&min_lon=144.5&max_lat=-37.5&max_lon=145", GardenRead, set()),
+  ("/api/gardens/nearby?lat=-37.799&lon=144.978&radius=5", GardenRead, {"distance_km"}),
+])
+def test_list_payloads_have_only_read_fields(session: Session, client: TestClient, owner: User, url, read_model, extra):
+  session.add(Garden(name="Fitzroy", latitude=-37.7983, longitude=144.9784, owner_id=owner.id))
+  session.add(Bed(name="Mine", owner_id=owner.id))
+  session.add(Planting(plant="corn", owner_id=owner.id))
+  session.commit()
+
+  response = client.get(url)
+
+  assert response.status_code == 200
+  assert len(response.json()) == 1
+  assert set(response.json()[0]) == set(read_model.__fields__) | extra
+
+
+@pytest.mark.parametrize("method, url, body", [
+  ("POST", "/api/plantings/", {"json": {"plant": "corn", "bed_id": "{bed}"}}),
+  ("PATCH", "/api/plantings/{planting}", {"json": {"bed_id": "{bed}"}}),
+  ("POST", "/planting/create", {"data": {"plant": "corn", "bed_id": "{bed}"}}),
+  ("POST", "/planting/edit/{planting}", {"data": {"plant": "corn", "variety": "Roma", "notes": "Moved", "bed_id": "{bed}"}}),
+  ("POST", "/bed/create", {"data": {"name": "Stolen", "garden_id": "{garden}"}}),
+  ("POST", "/bed/edit/{my_bed}", {"data": {"garden_id": "{garden}"}}),
+])
+def test_items_cannot_be_put_in_another_owners_parent(session: Session, client: TestClient, owner: User, method, url, body):
+  other = User(username="neighbour", password="secret-password", email="neighbour@example.com")
+  session.add(other)
+  session.commit()
+  garden = Garden(name="Theirs", owner_id=other.id)
+  session.add(garden)
+  session.commit()
+  bed = Bed(name="Theirs", garden_id=garden.id, owner_id=other.id)
+  my_bed = Bed(name="Mine", owner_id=owner.id)
+  session.add_all([bed, my_bed])
+  session.commit()
+  planting = Planting(plant="bean", bed_id=my_bed.id, owner_id=owner.id)
+  session.add(planting)
+  session.commit()
+  ids = {"garden": garden.id, "bed": bed.id, "my_bed": my_bed.id, "planting": planting.id}
+  kind, values = next(iter(body.items()))
+  values = {key: int(value.format(**ids)) if key.endswith("_id") else value for key, value in values.items()}
+
+  response = client.request(method, url.format(**ids), **{kind: values})
+
+  assert response.status_code == 404
+  session.expire_all()
+  assert session.exec(select(Bed).where(Bed.garden_id == garden.id)).all() == [bed]
+  assert session.exec(select(Planting).where(Planting.bed_id == bed.id)).all() == []
+
+
+def test_items_owned_counter_and_quota(session: Session, client: TestClient, owner: User):
+  app.dependency_overrides[get_settings] = lambda: Settings(items_per_user=2)
+
+  assert client.post("/api/gardens/", json={"name": "Allotment"}).status_code == 201
+  assert client.post("/api/plantings/", json={"plant": "corn"}).status_code == 201
+  response = client.post("/api/plantings/", json={"plant": "bean"})
+
+  assert response.status_code == 403
+  session.refresh(owner)
+  assert owner.items_owned == 2
+
+  planting = session.exec(select(Planting).where(Planting.owner_id == owner.id)).one()
+  client.delete(f"/api/plantings/{planting.id}")
+  session.refresh(owner)
+
+  assert owner.items_owned == 1
+  assert client.post("/api/plantings/", json={"plant": "bean"}).status_code == 201
+
+
+def test_modal_form_options_are_cached_until_changed(session: Session, client: TestClient):
+  references.clear()
+  session.add(Garden(name="Allotment"))
+  session.commit()
+  garden_queries = []
+
+  def count_garden_queries(conn, cursor, statement, parameters, context, executemany):
+    if "FROM garden" in statement:
+      garden_queries.append(statement)
+
+  event.listen(session.get_bind(), "before_cursor_execute", count_garden_queries)
+  try:
+    assert "Allotment" in client.get("/bed/create").text
+    assert "Allotment" in client.get("/bed/create").text
+    assert len(garden_queries) == 1
+
+    session.add(Garden(name="Verge"))
+    session.commit()
+    garden_queries.clear()
+    response = client.get("/bed/create")
+  finally:
+    event.remove(session.get_bind(), "before_cursor_execute", count_garden_queries)
+
+  assert "Verge" in response.text
+  assert len(garden_queries) == 1
+
+
+def test_enum_options(client: TestClient):
+  assert client.get("/api/beds/soil_types/").json() == [soil.value for soil in SoilType]
+  assert client.get("/api/beds/irrigation_zones/").json() == [zone.value for zone in IrrigationZone]
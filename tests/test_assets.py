@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.library import assets as assets_module
+from app.library.assets import (IMMUTABLE, VENDOR_ASSETS, AssetError, AssetFiles, AssetManifest, asset_url, build,
+                                fetch, pin, read_checksums)
+from app.main import app
+
+
+SCRIPT = b"document.body.dataset.ready = 'yes';\n" * 20
+
+
+@pytest.fixture(name="static_dir")
+def static_dir_fixture(tmp_path):
+  (tmp_path / "js").mkdir()
+  (tmp_path / "js" / "app.min.js").write_bytes(SCRIPT)
+  (tmp_path / "img").mkdir()
+  (tmp_path / "img" / "leaf.png").write_bytes(b"\x89PNG not really")
+  return tmp_path
+
+
+def test_build_fingerprints_and_precompresses(static_dir):
+  manifest = build(str(static_dir))
+
+  hashed = manifest["js/app.min.js"]
+  assert hashed.startswith("js/app.min.") and hashed.endswith(".js")
+  assert (static_dir / "dist" / hashed).read_bytes() == SCRIPT
+  assert gzip.decompress((static_dir / "dist" / (hashed + ".gz")).read_bytes()) == SCRIPT
+  # images are already compressed
+  assert not (static_dir / "dist" / (manifest["img/leaf.png"] + ".gz")).exists()
+  assert json.loads((static_dir / "dist" / "manifest.json").read_text()) == manifest
+
+
+def test_changed_assets_get_new_names(static_dir):
+  before = build(str(static_dir))
+  (static_dir / "js" / "app.min.js").write_bytes(SCRIPT + b"// changed\n")
+
+  after = build(str(static_dir))
+
+  assert after["js/app.min.js"] != before["js/app.min.js"]
+  assert after["img/leaf.png"] == before["img/leaf.png"]
+  # the previous build is replaced, not built into
+  assert not (static_dir / "dist" / before["js/app.min.js"]).exists()
+  assert not any(path.startswith("dist/") for path in after)
+
+
+def test_asset_urls(static_dir, caplog):
+  assets = AssetManifest(str(static_dir))
+  vendored = next(iter(VENDOR_ASSETS))
+  assert assets.url("js/app.min.js") == "/static/js/app.min.js"
+  assert assets.url(vendored) == VENDOR_ASSETS[vendored]
+  assert assets.url(vendored) == VENDOR_ASSETS[vendored]
+  # the CDN fallback is logged once per asset
+  assert [record.levelname for record in caplog.records if vendored in record.getMessage()] == ["WARNING"]
+
+  manifest = build(str(static_dir))
+  assert assets.url("js/app.min.js") == "/static/js/app.min.js"
+  assets.reload()
+  assert assets.url("js/app.min.js") == f"/static/dist/{manifest['js/app.min.js']}"
+
+
+def test_fingerprinted_assets_are_served_compressed_and_immutable(static_dir):
+  hashed = build(str(static_dir))["js/app.min.js"]
+  files = FastAPI()
+  files.mount("/static", AssetFiles(directory=str(static_dir)), name="static")
+  client = TestClient(files)
+
+  response = client.get(f"/static/dist/{hashed}", headers={"Accept-Encoding": "gzip, deflate"})
+  assert response.status_code == 200
+  assert response.headers["Content-Encoding"] == "gzip"
+  assert response.headers["Content-Type"].startswith("text/javascript")
+  assert response.headers["Cache-Control"] == IMMUTABLE
+  assert response.headers["Vary"] == "Accept-Encoding"
+  assert response.content == SCRIPT
+
+  response = client.get(f"/static/dist/{hashed}", headers={"Accept-Encoding": "identity"})
+  assert "Content-Encoding" not in response.headers
+  assert response.headers["Cache-Control"] == IMMUTABLE
+  assert response.content == SCRIPT
+
+  response = client.get("/static/js/app.min.js")
+  assert response.headers["Cache-Control"] == "no-cache"
+
+
+def test_layout_links_assets_through_the_helper():
+  response = TestClient(app).get("/pages/about")
+
+  for path in VENDOR_ASSETS:
+    assert f'"{asset_url(path)}"' in response.text
+  assert 'src="https://cdn.tailwindcss.com"' not in response.text
+
+
+@pytest.fixture(name="downloads")
+def downloads_fixture(monkeypatch):
+  contents = {url: f"/* {path} */".encode() for path, url in VENDOR_ASSETS.items()}
+  monkeypatch.setattr(assets_module, "_download", lambda url: contents[url])
+  return contents
+
+
+def test_fetch_writes_the_pinned_files(downloads, tmp_path):
+  checksums_file = str(tmp_path / "vendor.sha256")
+  pinned = pin(checksums_file)
+  assert read_checksums(checksums_file) == pinned
+
+  fetch(str(tmp_path / "static"), checksums_file)
+
+  for path, url in VENDOR_ASSETS.items():
+    assert (tmp_path / "static" / path).read_bytes() == downloads[url]
+
+
+def test_fetch_refuses_a_changed_file(downloads, tmp_path):
+  checksums_file = str(tmp_path / "vendor.sha256")
+  pin(checksums_file)
+  path, url = next(iter(VENDOR_ASSETS.items()))
+  downloads[url] += b"alert('tampered');"
+
+  with pytest.raises(AssetError, match="not the pinned"):
+    fetch(str(tmp_path / "static"), checksums_file)
+  assert not (tmp_path / "static" / path).exists()
+
+
+def test_fetch_refuses_unpinned_files(downloads, tmp_path):
+  checksums_file = tmp_path / "vendor.sha256"
+  pin(str(checksums_file))
+  # drop the last pin
+  checksums_file.write_text("".join(checksums_file.read_text().splitlines(keepends=True)[:-1]))
+
+  with pytest.raises(AssetError, match="No pinned checksum"):
+    fetch(str(tmp_path / "static"), str(checksums_file))
+  assert not (tmp_path / "static").exists()
@@ -0,0 +1,151 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.config import Settings, get_settings
+from app.main import app
+from app.database.database import enable_sqlite_transactions
+from app.database.group_commit import GroupCommitExecutor
+from app.database.session import get_session
+from app.library.audit import AuditLog, _actor, audit_log, set_actor
+from app.models.audit_models import AuditAction, AuditEvent
+from app.models.garden_models import Bed, SoilType
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
+
+
+@pytest.fixture(name="session")
+def session_fixture(session: Session):
+  # start from an empty buffer
+  audit_log.flush()
+  return session
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+  app.dependency_overrides[get_session] = lambda: session
+  yield TestClient(app)
+  app.dependency_overrides.clear()
+
+
+def login(session: Session, username: str) -> User:
+  user = User(username=username, password="secret-password", email=f"{username}@example.com", gardener=True)
+  session.add(user)
+  session.commit()
+
+  def current_user():
+    set_actor(user.id)
+    return user
+
+  app.dependency_overrides[auth_handler.get_current_user] = current_user
+  app.dependency_overrides[auth_handler.get_optional_user] = current_user
+  return user
+
+
+def test_mutations_are_audited_with_diffs(session: Session, client: TestClient):
+  owner = login(session, "gardener")
+
+  bed_id = client.post("/api/beds/", json={"name": "Herbs", "soil_type": SoilType.LOAM}).json()["id"]
+  client.patch(f"/api/beds/{bed_id}", json={"soil_type": SoilType.CLAY})
+  client.delete(f"/api/beds/{bed_id}")
+
+  # nothing is written until the buffer is flushed
+  assert session.exec(select(AuditEvent)).all() == []
+
+  events = client.get("/api/audit/events", params={"entity": "bed", "entity_id": bed_id}).json()
+
+  assert [event["action"] for event in events] == ["delete", "update", "insert"]
+  assert {event["user_id"] for event in events} == {owner.id}
+  delete, update, insert = events
+  assert update["changes"] == {"soil_type": ["Loam", "Clay"]}
+  assert insert["changes"]["name"] == [None, "Herbs"]
+  assert delete["changes"]["soil_type"] == ["Clay", None]
+
+
+def test_users_only_see_their_own_changes(session: Session, client: TestClient):
+  login(session, "first")
+  client.post("/api/beds/", json={"name": "First bed"})
+  admin = login(session, "second")
+  client.post("/api/beds/", json={"name": "Second bed"})
+
+  events = client.get("/api/audit/events").json()
+  assert [event["changes"]["name"][1] for event in events] == ["Second bed"]
+
+  app.dependency_overrides[get_settings] = lambda: Settings(admin_email=admin.email)
+  events = client.get("/api/audit/events", params={"entity": "bed"}).json()
+  assert {event["changes"]["name"][1] for event in events} == {"First bed", "Second bed"}
+
+
+def test_rolled_back_changes_are_not_audited(session: Session):
+  session.add(Bed(name="Draft"))
+  session.flush()
+  session.rollback()
+
+  assert audit_log.pending() == 0
+
+
+def test_buffer_is_written_in_batches(session: Session):
+  log = AuditLog(max_batch=3)
+  bind = session.get_bind()
+  event = {"entity": "bed", "entity_id": 1, "action": AuditAction.INSERT, "user_id": None,
+           "changes": {"name": [None, "Bed"]}, "recorded_at": datetime.utcnow()}
+
+  log.record(bind, [event, event])
+  assert log.pending() == 2
+
+  log.record(bind, [event])
+  assert log.pending() == 0
+  assert len(session.exec(select(AuditEvent)).all()) == 3
+
+
+def test_writer_thread_flushes_on_timer_and_shutdown(session: Session):
+  log = AuditLog(max_batch=100)
+  log.start(flush_interval=0.05)
+  bind = session.get_bind()
+  event = {"entity": "bed", "entity_id": 1, "action": AuditAction.UPDATE, "user_id": None,
+           "changes": {}, "recorded_at": datetime.utcnow()}
+
+  log.record(bind, [event])
+  deadline = time.monotonic() + 5
+  while log.pending() and time.monotonic() < deadline:
+    time.sleep(0.01)
+  assert log.pending() == 0
+
+  log.record(bind, [event])
+  log.shutdown()
+  assert len(session.exec(select(AuditEvent)).all()) == 2
+
+
+def test_group_commit_keeps_actor_and_drops_failed_mutations(engine):
+  enable_sqlite_transactions(engine)
+  audit_log.flush()
+  executor = GroupCommitExecutor(engine, max_batch=16, max_delay=0.05)
+
+  def fail(session):
+    session.add(Bed(name="Rejected"))
+    session.flush()
+    raise ValueError("rejected")
+
+  def as_user(user_id, mutation):
+    token = _actor.set({"user_id": user_id})
+    try:
+      return executor.submit(mutation)
+    finally:
+      _actor.reset(token)
+
+  with ThreadPoolExecutor(max_workers=2) as pool:
+    failed = pool.submit(as_user, 7, fail)
+    saved = pool.submit(as_user, 8, lambda session: session.merge(Bed(name="Accepted")))
+    with pytest.raises(ValueError):
+      failed.result()
+    saved.result()
+  executor.shutdown()
+  audit_log.flush()
+
+  with Session(engine) as session:
+    events = session.exec(select(AuditEvent)).all()
+  assert [(event.user_id, event.action) for event in events] == [(8, AuditAction.INSERT)]
@@ -0,0 +1,167 @@
+import gzip
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.database import backup as backup_module
+from app.database.backup import BackupError, DatabaseBackup, alembic_head, copy_database, restore, sha256sum
+from app.library.metrics import metrics
+from app.models.garden_models import Garden
+
+
+SCRIPTS = ScriptDirectory.from_config(Config("alembic.ini"))
+HEAD = SCRIPTS.get_current_head()
+
+
+@pytest.fixture(name="database")
+def database_fixture(tmp_path):
+  path = str(tmp_path / "garden.sqlite3")
+  engine = create_engine(f"sqlite:///{path}")
+  SQLModel.metadata.create_all(engine)
+  with engine.begin() as connection:
+    connection.exec_driver_sql("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+    connection.exec_driver_sql(f"INSERT INTO alembic_version VALUES ('{HEAD}')")
+  with Session(engine) as session:
+    session.add_all([Garden(name=f"Garden {n}") for n in range(200)])
+    session.commit()
+  engine.dispose()
+  metrics.reset()
+  yield path
+  metrics.reset()
+
+
+def garden_names(path):
+  connection = sqlite3.connect(path)
+  try:
+    return [row[0] for row in connection.execute("SELECT name FROM garden ORDER BY id")]
+  finally:
+    connection.close()
+
+
+def test_backup_is_compressed_and_checksummed(database, tmp_path):
+  directory = str(tmp_path / "backups")
+
+  backup = DatabaseBackup(database, directory, step_pages=2, step_pause=0).create()
+
+  assert os.path.basename(backup.path).startswith("garden-")
+  assert backup.path.endswith(".sqlite3.gz")
+  with open(backup.path + ".sha256") as checksum_file:
+    assert checksum_file.read() == f"{backup.checksum}  {os.path.basename(backup.path)}\n"
+  assert sha256sum(backup.path) == backup.checksum
+  copy = tmp_path / "copy.sqlite3"
+  copy.write_bytes(gzip.decompress(open(backup.path, "rb").read()))
+  assert garden_names(str(copy)) == garden_names(database)
+  assert metrics.get("backup.created") == 1
+
+
+def test_copy_starts_over_after_concurrent_writes(database, tmp_path):
+  writer = sqlite3.connect(database, isolation_level=None)
+  steps = []
+
+  def sleep(seconds):
+    steps.append(seconds)
+    # a write between every step until the copy falls back to a single step
+    writer.execute("INSERT INTO garden (name) VALUES (?)", (f"Written during step {len(steps)}",))
+
+  source, target = sqlite3.connect(database), sqlite3.connect(str(tmp_path / "copy.sqlite3"))
+  original = backup_module.time
+  backup_module.time = SimpleNamespace(sleep=sleep, perf_counter=time.perf_counter)
+  try:
+    restarts = copy_database(source, target, step_pages=1, step_pause=0.5)
+  finally:
+    backup_module.time = original
+
+  assert restarts == backup_module.MAX_RESTARTS
+  assert metrics.get("backup.restarts") == backup_module.MAX_RESTARTS
+  # everything committed before the last step is in the copy
+  last = target.execute("SELECT name FROM garden ORDER BY id DESC LIMIT 1").fetchone()[0]
+  assert last == f"Written during step {len(steps) - 1}"
+  assert target.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+
+
+def test_only_the_newest_backups_are_kept(database, tmp_path):
+  directory = tmp_path / "backups"
+  directory.mkdir()
+  for stamp in ("20250101T000000Z", "20250102T000000Z", "20250103T000000Z"):
+    (directory / f"garden-{stamp}.sqlite3.gz").write_bytes(b"")
+    (directory / f"garden-{stamp}.sqlite3.gz.sha256").write_text("")
+  (directory / "other-20250101T000000Z.sqlite3.gz").write_bytes(b"")
+
+  backup = DatabaseBackup(database, str(directory), keep=2).create()
+
+  assert sorted(os.listdir(directory)) == sorted([
+    "garden-20250103T000000Z.sqlite3.gz",
+    "garden-20250103T000000Z.sqlite3.gz.sha256",
+    os.path.basename(backup.path),
+    os.path.basename(backup.path) + ".sha256",
+    "other-20250101T000000Z.sqlite3.gz",
+  ])
+
+
+def test_restore_replaces_the_database(database, tmp_path):
+  backup = DatabaseBackup(database, str(tmp_path / "backups")).create()
+  names = garden_names(database)
+  connection = sqlite3.connect(database)
+  connection.execute("DELETE FROM garden")
+  connection.commit()
+
+  restore(backup.path, database, head=HEAD)
+
+  # an open connection sees the restored rows too
+  assert [row[0] for row in connection.execute("SELECT name FROM garden ORDER BY id")] == names
+  connection.close()
+
+
+def test_restore_outside_the_project_directory(database, tmp_path, monkeypatch):
+  # the Docker image and cron jobs do not necessarily run from the repository root
+  backup = DatabaseBackup(database, str(tmp_path / "backups")).create()
+  names = garden_names(database)
+  elsewhere = tmp_path / "elsewhere"
+  elsewhere.mkdir()
+  monkeypatch.chdir(elsewhere)
+
+  restore(backup.path, database)
+
+  assert garden_names(database) == names
+
+
+def test_image_includes_the_migrations():
+  # restores read the head revision from alembic.ini and migrations/
+  with open(os.path.join(os.path.dirname(backup_module.ALEMBIC_CONFIG), "Dockerfile"), encoding="utf-8") as dockerfile:
+    copies = [line.split()[1] for line in dockerfile if line.startswith("COPY ")]
+  assert "./alembic.ini" in copies
+  assert "./migrations" in copies
+
+
+def test_restore_refuses_a_backup_of_another_revision(database, tmp_path):
+  backup = DatabaseBackup(database, str(tmp_path / "backups")).create()
+  connection = sqlite3.connect(database)
+  connection.execute("DELETE FROM garden")
+  connection.commit()
+  connection.close()
+
+  with pytest.raises(BackupError, match="not the head"):
+    restore(backup.path, database, head="0123456789ab")
+  assert garden_names(database) == []
+
+
+def test_restore_refuses_a_corrupted_backup(database, tmp_path):
+  backup = DatabaseBackup(database, str(tmp_path / "backups")).create()
+  with open(backup.path, "r+b") as backup_file:
+    backup_file.seek(100)
+    backup_file.write(b"\0\0\0\0")
+
+  with pytest.raises(BackupError, match="Checksum"):
+    restore(backup.path, database, head=HEAD)
+
+
+def test_alembic_head_is_the_latest_migration():
+  # a second head would make get_current_head raise, and restores refuse every backup
+  assert SCRIPTS.get_heads() == [HEAD]
+  assert alembic_head() == HEAD
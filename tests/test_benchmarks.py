@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlmodel import Session
+from sqlmodel.pool import StaticPool
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.endpoints.api_user import auth_handler
+from app.library import users
+from app.library.reference import references
+from app.main import app
+from tests.conftest import clone
+from tests.test_route_query_plans import BED, GARDEN, PLANTING, seed
+
+pytest.importorskip("pytest_benchmark")
+
+# Request latency of the busiest endpoints against the seeded database of the
+# route query plan suite, reported as the pytest-benchmark group "endpoints".
+# Save a run for each commit and compare with the last saved one with
+#
+#     pytest tests/test_benchmarks.py --benchmark-autosave
+#     pytest tests/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:20%
+#
+# pytest-xdist turns benchmarks off, so run them without -n.
+
+ENDPOINTS = [
+  ("GET", "/api/gardens/"),
+  ("GET", f"/api/gardens/{GARDEN}"),
+  ("GET", f"/api/beds/?garden_id={GARDEN}"),
+  ("GET", f"/api/plantings/?bed_id={BED}"),
+  ("GET", f"/api/plantings/{PLANTING}"),
+  ("GET", "/api/plantings/harvest-due?from=2026-06-01&to=2026-06-14"),
+  ("GET", "/api/plants/?name_common=Plant+7"),
+  ("GET", "/plantings/"),
+  ("GET", "/plantings/update?after=20"),
+  ("POST", "/api/plantings/"),
+]
+
+NEW_PLANTING = {"plant": "Plant 7", "variety": "Cherry", "bed_id": BED, "date_planted": "2026-03-01T00:00:00"}
+
+
+@pytest.fixture(name="template", scope="module")
+def template_fixture(schema):
+  connection = sqlite3.connect(":memory:", check_same_thread=False)
+  schema.backup(connection)
+  seed(create_engine("sqlite://", creator=lambda: connection, poolclass=StaticPool))
+  yield connection
+  connection.close()
+
+
+@pytest.fixture(name="client")
+def client_fixture(template, monkeypatch):
+  engine = clone(template)
+
+  def get_session_override():
+    with Session(engine) as session:
+      yield session
+
+  app.dependency_overrides[get_session] = get_session_override
+  app.dependency_overrides[get_settings] = lambda: Settings(items_per_user=1_000_000)
+  monkeypatch.setattr(users, "engine", engine)
+  references.clear()
+  client = TestClient(app)
+  client.headers["Authorization"] = f"Bearer {auth_handler.encode_token('gardener1')}"
+  yield client
+  app.dependency_overrides.clear()
+  engine.dispose()
+
+
+@pytest.mark.benchmark(group="endpoints")
+@pytest.mark.parametrize("method, url", ENDPOINTS, ids=[f"{method} {url}" for method, url in ENDPOINTS])
+def test_endpoint_latency(benchmark, client: TestClient, method, url):
+  json = NEW_PLANTING if method == "POST" else None
+
+  response = benchmark(client.request, method, url, json=json)
+
+  assert response.status_code < 400, response.text
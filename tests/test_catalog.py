@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.database.session import get_session
+from app.endpoints.api_user import auth_handler
+from app.library.catalog import ingest
+from app.main import app
+from app.models.plant import Plant
+from app.models.user_models import User
+
+
+AMARANTH = {
+  "name_common": "Amaranth",
+  "name_botanical": "Amaranthus sp.",
+  "family_group": "Amaranthaceae",
+  "harvest": "12 to 16 weeks from seed.",
+}
+
+CSV_DUMP = """Name Common,Name Botanical,Family Group,Harvest
+Basil,Ocimum basilicum,Lamiaceae,8 to 10 weeks
+ amaranth , AMARANTHUS  sp.,Amaranthaceae,12 to 16 weeks from seed.
+,Nameless,,
+"""
+
+
+def test_ingest_is_idempotent(session: Session):
+  sources = {"plants.json": json.dumps([AMARANTH]), "plants.csv": CSV_DUMP}
+
+  report = ingest(session, sources)
+
+  assert (report.inserted, report.updated, report.unchanged, report.skipped) == (2, 0, 0, 2)
+  assert len(session.exec(select(Plant)).all()) == 2
+
+  report = ingest(session, sources)
+
+  assert (report.inserted, report.updated, report.unchanged) == (0, 0, 2)
+
+
+def test_ingest_updates_changed_records(session: Session):
+  ingest(session, {"plants.json": json.dumps([AMARANTH])})
+
+  changed = dict(AMARANTH, harvest="10 to 14 weeks from seed.")
+  report = ingest(session, {"plants.json": json.dumps([changed])})
+
+  assert (report.inserted, report.updated, report.unchanged) == (0, 1, 0)
+  session.expire_all()
+  plant = session.exec(select(Plant)).one()
+  assert plant.harvest == "10 to 14 weeks from seed."
+  assert (plant.harvest_min_weeks, plant.harvest_max_weeks, plant.harvest_from) == (10, 14, "seed")
+
+
+def test_ingest_reports_malformed_dumps(session: Session):
+  sources = {"plants.json": json.dumps([AMARANTH]), "broken.json": '[{"name_common": ', "scalar.json": "42"}
+
+  report = ingest(session, sources)
+
+  assert report.inserted == 1
+  assert [error.split(":")[0] for error in report.errors] == ["broken.json", "scalar.json"]
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+  owner = User(username="gardener", password="secret-password", email="gardener@example.com")
+  session.add(owner)
+  session.commit()
+  app.dependency_overrides[get_session] = lambda: session
+  app.dependency_overrides[auth_handler.get_current_user] = lambda: owner
+  yield TestClient(app)
+  app.dependency_overrides.clear()
+
+
+def test_ingest_updates_plants_entered_by_hand(session: Session, client: TestClient):
+  response = client.post("/api/plants/", json={"name_common": "amaranth", "name_botanical": "Amaranthus  SP."})
+  assert response.status_code == 201
+
+  report = ingest(session, {"plants.json": json.dumps([AMARANTH])})
+
+  assert (report.inserted, report.updated) == (0, 1)
+  session.expire_all()
+  plant = session.exec(select(Plant)).one()
+  assert plant.id == response.json()["id"]
+  assert plant.harvest == AMARANTH["harvest"]
+
+
+def test_plants_with_the_names_of_another_are_refused(session: Session, client: TestClient):
+  ingest(session, {"plants.json": json.dumps([AMARANTH])})
+
+  response = client.post("/api/plants/", json={"name_common": "AMARANTH", "name_botanical": "amaranthus sp."})
+
+  assert response.status_code == 400
+  assert len(session.exec(select(Plant)).all()) == 1
+
+
+@pytest.mark.parametrize("filename, content", [
+  ("latin1.csv", "Name Common,Name Botanical\nJalape\xf1o,Capsicum annuum\n".encode("latin-1")),
+  ("broken.json", b'[{"name_common": '),
+  ("scalar.json", b"42"),
+  ("strings.json", b'["Basil"]'),
+])
+@pytest.mark.parametrize("background", [False, True])
+def test_ingest_endpoint_refuses_malformed_dumps(session: Session, client: TestClient, filename, content, background):
+  response = client.post(
+    f"/api/plants/catalog?background={str(background).lower()}",
+    files=[("files", ("plants.json", json.dumps([AMARANTH]), "application/json")), ("files", (filename, content, "text/plain"))]
+  )
+
+  assert response.status_code == 422
+  assert response.json()["detail"].startswith(f"{filename}: ")
+  assert session.exec(select(Plant)).all() == []
+
+
+def test_ingest_endpoint(client: TestClient):
+  response = client.post("/api/plants/catalog", files=[("files", ("plants.csv", CSV_DUMP, "text/csv"))])
+
+  assert response.status_code == 200
+  assert response.json()["inserted"] == 2
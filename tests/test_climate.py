@@ -0,0 +1,130 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.library.climate import ClimateStore, ZoneHistory, day_label, zone_calendar
+from app.library.metrics import metrics
+from app.main import app
+from app.models.garden_models import Bed, ClimaticZone, Garden, Planting
+from app.models.plant import Plant
+
+
+def write_history(path, years, append=False):
+  """Write years of a northern climate with frost until mid April and from late October."""
+  with open(path, "a" if append else "w") as history:
+    if not append:
+      history.write("date,tmin_c,tmax_c\n")
+    for year in years:
+      day = date(year, 1, 1)
+      while day.year == year:
+        day_of_year = day.timetuple().tm_yday - 1
+        frosty = day_of_year < 104 or day_of_year > 297
+        history.write(f"{day},{-2.0 if frosty else 8.0},{12.0 if frosty else 24.0}\n")
+        day += timedelta(days=1)
+
+
+def test_zone_calendar(tmp_path):
+  write_history(tmp_path / "temperate.csv", [2021, 2022, 2023])
+  history = ZoneHistory(str(tmp_path), ClimaticZone.TEMPERATE)
+  history.refresh()
+
+  calendar = zone_calendar(history.load())
+
+  assert calendar["years"] == 3
+  assert calendar["frost_probability"] == 1.0
+  assert calendar["last_frost"] == {"median": day_label(103), "risk_10": day_label(103)}
+  assert calendar["first_frost"] == {"median": day_label(298), "risk_10": day_label(298)}
+  # 194 frost free days at a mean of 16 degrees
+  assert calendar["gdd_total"] == pytest.approx(194 * 6.0, abs=1)
+
+
+def test_zone_history_ingests_appended_rows_only(tmp_path):
+  write_history(tmp_path / "temperate.csv", [2021])
+  history = ZoneHistory(str(tmp_path), ClimaticZone.TEMPERATE)
+
+  assert history.refresh()
+  assert not history.refresh()
+
+  write_history(tmp_path / "temperate.csv", [2022], append=True)
+
+  assert history.refresh()
+  records = np.asarray(history.load())
+  assert len(records) == 365 * 2
+  assert records[-1, 0] == date(2022, 12, 31).toordinal()
+
+
+def test_climate_store_recomputes_on_new_data(tmp_path):
+  write_history(tmp_path / "cool.csv", [2021])
+  store = ClimateStore(str(tmp_path))
+
+  first = store.calendar(ClimaticZone.COOL)
+
+  assert store.calendar(ClimaticZone.COOL) is first
+  assert store.calendar(ClimaticZone.ARID) is None
+
+  write_history(tmp_path / "cool.csv", [2022], append=True)
+
+  # requests do not read the history, the watcher refreshes it
+  assert store.calendar(ClimaticZone.COOL) is first
+  store.refresh_all()
+  assert store.calendar(ClimaticZone.COOL)["years"] == 2
+
+
+def test_climate_store_sees_rows_ingested_by_another_worker(tmp_path):
+  write_history(tmp_path / "cool.csv", [2021])
+  store = ClimateStore(str(tmp_path))
+  other_worker = ClimateStore(str(tmp_path))
+  assert store.calendar(ClimaticZone.COOL)["years"] == 1
+
+  write_history(tmp_path / "cool.csv", [2022], append=True)
+  other_worker.refresh_all()
+
+  store.refresh_all()
+  assert store.calendar(ClimaticZone.COOL)["years"] == 2
+
+
+def test_zone_history_skips_malformed_rows(tmp_path, caplog):
+  metrics.reset()
+  write_history(tmp_path / "temperate.csv", [2021])
+  with open(tmp_path / "temperate.csv", "a") as history:
+    history.write("2022-01-01,,12.0\n2022-01-02,cold,12.0\n2022-13-01,1.0,12.0\n2022-01-04,1.0,12.0\n")
+  history = ZoneHistory(str(tmp_path), ClimaticZone.TEMPERATE)
+
+  assert history.refresh()
+
+  records = np.asarray(history.load())
+  assert len(records) == 365 + 1
+  assert records[-1, 0] == date(2022, 1, 4).toordinal()
+  assert metrics.get("climate.skipped_rows") == 3
+  assert any("Skipped 3 malformed rows" in record.getMessage() for record in caplog.records)
+  metrics.reset()
+
+
+def test_read_garden_calendar(session: Session, tmp_path):
+  write_history(tmp_path / "temperate.csv", [2021, 2022])
+  garden = Garden(name="Allotment", zone=ClimaticZone.TEMPERATE)
+  session.add(garden)
+  session.commit()
+  bed = Bed(name="Vegetable Plot", garden_id=garden.id)
+  session.add(bed)
+  session.add(Plant(name_common="Corn", name_botanical="Zea mays", harvest="12 to 14 weeks from seed."))
+  session.commit()
+  session.add(Planting(plant="corn", bed_id=bed.id))
+  session.commit()
+  app.dependency_overrides[get_session] = lambda: session
+  app.dependency_overrides[get_settings] = lambda: Settings(climate_dir=str(tmp_path))
+  client = TestClient(app)
+
+  response = client.get(f"/api/gardens/{garden.id}/calendar")
+  app.dependency_overrides.clear()
+  data = response.json()
+
+  assert response.status_code == 200
+  assert data["zone"] == "Temperate"
+  assert data["sowing_window"] == {"start": "04-14", "end": "10-26"}
+  assert data["sowing"] == [{"planting_id": 1, "plant": "corn", "window": {"start": "04-14", "end": "07-20"}}]
@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session, select
+
+from app.database.database import enable_sqlite_transactions
+from app.database.group_commit import GroupCommitExecutor
+from app.library.metrics import metrics
+from app.models.garden_models import Planting
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(engine):
+  enable_sqlite_transactions(engine)
+  return engine
+
+
+@pytest.fixture(name="executor")
+def executor_fixture(engine):
+  executor = GroupCommitExecutor(engine, max_batch=16, max_delay=0.05)
+  yield executor
+  executor.shutdown()
+
+
+def test_concurrent_writes_are_committed(engine, executor: GroupCommitExecutor):
+  def write(i):
+    return executor.submit(lambda session: session.merge(Planting(plant=f"pea {i}")))
+
+  with ThreadPoolExecutor(max_workers=8) as pool:
+    plantings = list(pool.map(write, range(8)))
+
+  assert all(planting.id is not None for planting in plantings)
+  with Session(engine) as session:
+    assert len(session.exec(select(Planting)).all()) == 8
+
+
+def test_failing_mutation_is_isolated(engine, executor: GroupCommitExecutor):
+  def fail(session):
+    session.add(Planting(plant="weed"))
+    session.flush()
+    raise ValueError("rejected")
+
+  with ThreadPoolExecutor(max_workers=2) as pool:
+    failed = pool.submit(executor.submit, fail)
+    saved = pool.submit(executor.submit, lambda session: session.merge(Planting(plant="corn")))
+
+    with pytest.raises(ValueError):
+      failed.result()
+    assert saved.result().plant == "corn"
+
+  with Session(engine) as session:
+    assert [planting.plant for planting in session.exec(select(Planting)).all()] == ["corn"]
+
+
+def test_concurrent_async_writes_share_a_batch(engine, executor: GroupCommitExecutor):
+  async def write(i):
+    return await executor.submit_async(lambda session: session.merge(Planting(plant=f"pea {i}")))
+
+  async def write_all():
+    # a loop that blocked on each commit would run these one batch at a time
+    return await asyncio.wait_for(asyncio.gather(*(write(i) for i in range(8))), timeout=0.3)
+
+  batches = metrics.get("group_commit.batches")
+  plantings = asyncio.run(write_all())
+
+  assert all(planting.id is not None for planting in plantings)
+  assert metrics.get("group_commit.batches") - batches == 1
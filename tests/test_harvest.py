@@ -0,0 +1,18 @@
+import pytest
+
+from app.library.harvest import FROM_SEED, FROM_TRANSPLANT, HarvestWindow, parse_harvest
+
+
+@pytest.mark.parametrize("text, window", [
+  ("12 to 16 weeks from seed.", HarvestWindow(12, 16, FROM_SEED)),
+  ("Harvest in 60-90 days after transplanting", HarvestWindow(9, 13, FROM_TRANSPLANT)),
+  ("About 3 months from sowing", HarvestWindow(13, 13, FROM_SEED)),
+  ("10 weeks", HarvestWindow(10, 10, None)),
+])
+def test_parse_harvest(text, window):
+  assert parse_harvest(text) == window
+
+
+@pytest.mark.parametrize("text", [None, "", "Pick leaves as needed"])
+def test_parse_harvest_without_duration(text):
+  assert parse_harvest(text) is None
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.library.irrigation import Weather, schedules, water_balance, ZONES, SOILS
+from app.main import app
+from app.models.garden_models import Bed, IrrigationZone, SoilType
+
+
+WEATHER_CSV = """date,et0_mm,rain_mm
+2026-01-01,6.0,0.0
+2026-01-02,6.0,0.0
+2026-01-03,6.0,0.0
+2026-01-04,6.0,20.0
+"""
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session, tmp_path):
+  weather_file = tmp_path / "weather.csv"
+  weather_file.write_text(WEATHER_CSV)
+  app.dependency_overrides[get_session] = lambda: session
+  app.dependency_overrides[get_settings] = lambda: Settings(weather_file=str(weather_file))
+  schedules.clear()
+  yield TestClient(app)
+  app.dependency_overrides.clear()
+  schedules.clear()
+
+
+def test_water_balance_refills_depleted_soil():
+  weather = Weather(dates=["d1", "d2", "d3"], et0=np.array([10.0, 10.0, 10.0]), rain=np.zeros(3))
+
+  demand, water = water_balance(weather)
+
+  sand = SOILS.index(SoilType.SAND)
+  vegetables = ZONES.index(IrrigationZone.VEGETABLES)
+  assert demand[vegetables, sand].tolist() == [10.0, 10.0, 10.0]
+  # sand is refilled once 15 mm are depleted, on the second day
+  assert water[vegetables, sand].tolist() == [0.0, 20.0, 0.0]
+
+
+def test_read_irrigation_schedule(session: Session, client: TestClient):
+  session.add(Bed(name="Sandy", soil_type=SoilType.SAND, irrigation_zone=IrrigationZone.VEGETABLES, garden_id=1))
+  session.add(Bed(name="Clay", soil_type=SoilType.CLAY, irrigation_zone=IrrigationZone.SHRUBS, garden_id=2))
+  session.commit()
+
+  response = client.get("/api/irrigation/schedule")
+  data = response.json()
+
+  assert response.status_code == 200
+  assert data["dates"] == ["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-04"]
+  sandy, clay = data["beds"]
+  assert sandy["demand_mm"] == 24.0
+  assert sandy["waterings"] == [["2026-01-03", 18.0]]
+  assert clay["waterings"] == []
+
+  response = client.get("/api/irrigation/schedule", params={"garden_id": 2})
+
+  assert [bed["id"] for bed in response.json()["beds"]] == [clay["id"]]
+
+
+def test_irrigation_schedule_follows_bed_changes(session: Session, client: TestClient):
+  assert client.get("/api/irrigation/schedule").json()["beds"] == []
+
+  session.add(Bed(name="Sandy", soil_type=SoilType.SAND))
+  session.commit()
+
+  assert len(client.get("/api/irrigation/schedule").json()["beds"]) == 1
+
+
+def test_irrigation_schedule_without_weather(client: TestClient):
+  app.dependency_overrides[get_settings] = lambda: Settings(weather_file="missing.csv")
+
+  response = client.get("/api/irrigation/schedule")
+
+  assert response.status_code == 404
@@ -0,0 +1,190 @@
+import datetime
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.main import app
+from app.database.session import get_session
+from app.library import jobs
+from app.library.jobs import JobRunner, enqueue
+from app.models.job_models import Job, JobStatus
+from app.models.plant import Plant
+from app.models.user_models import User
+from app.endpoints.api_user import auth_handler
+
+
+def record_job(context, label):
+  context.progress(1, 2, f"Recording {label}", force=True)
+  return {"label": label}
+
+
+def failing_job(context):
+  raise ValueError("no plants")
+
+
+def endless_job(context):
+  while True:
+    context.progress(0.5, force=True)
+    time.sleep(0.01)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path, monkeypatch):
+  engine = create_engine(f"sqlite:///{tmp_path / 'jobs.sqlite3'}", connect_args={"check_same_thread": False})
+  SQLModel.metadata.create_all(engine)
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test.record", "tests.test_jobs:record_job")
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test.fail", "tests.test_jobs:failing_job")
+  monkeypatch.setitem(jobs.JOB_HANDLERS, "test.endless", "tests.test_jobs:endless_job")
+  return engine
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+  with Session(engine) as session:
+    yield session
+
+
+def wait_for(session: Session, job: Job, timeout: float = 5.0) -> Job:
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    session.refresh(job)
+    if job.status not in (JobStatus.QUEUED, JobStatus.RUNNING):
+      return job
+    time.sleep(0.02)
+  raise AssertionError(f"job {job.id} still {job.status}")
+
+
+def test_runner_runs_jobs_by_priority(engine, session: Session):
+  low = enqueue(session, "test.record", {"label": "low"})
+  high = enqueue(session, "test.record", {"label": "high"}, priority=5)
+
+  runner = JobRunner(engine, workers=1, poll_interval=0.05)
+  try:
+    low, high = wait_for(session, low), wait_for(session, high)
+  finally:
+    runner.shutdown()
+
+  assert (low.status, high.status) == (JobStatus.SUCCEEDED, JobStatus.SUCCEEDED)
+  assert high.started_at <= low.started_at
+  assert json.loads(low.result) == {"label": "low"}
+  assert (low.progress, low.message) == (1.0, "Recording low")
+
+
+def test_runner_records_failures_and_cancellation(engine, session: Session):
+  failed = enqueue(session, "test.fail")
+  endless = enqueue(session, "test.endless")
+
+  runner = JobRunner(engine, workers=2, poll_interval=0.05)
+  try:
+    failed = wait_for(session, failed)
+    while endless.status == JobStatus.QUEUED:
+      time.sleep(0.02)
+      session.refresh(endless)
+    jobs.cancel(session, endless)
+    endless = wait_for(session, endless)
+  finally:
+    runner.shutdown()
+
+  assert failed.status == JobStatus.FAILED
+  assert failed.error == "ValueError: no plants"
+  assert endless.status == JobStatus.CANCELLED
+  assert endless.finished_at is not None
+
+
+def test_runner_requeues_interrupted_jobs(engine, session: Session):
+  job = enqueue(session, "test.record", {"label": "again"})
+  job.status = JobStatus.RUNNING
+  session.add(job)
+  session.commit()
+
+  runner = JobRunner(engine, workers=1, poll_interval=0.05)
+  try:
+    assert wait_for(session, job).status == JobStatus.SUCCEEDED
+  finally:
+    runner.shutdown()
+
+
+def test_runner_leaves_jobs_of_live_runners_alone(engine, session: Session):
+  alive = enqueue(session, "test.record", {"label": "alive"})
+  gone = enqueue(session, "test.record", {"label": "gone"})
+  now = datetime.datetime.utcnow()
+  for job, heartbeat_at in ((alive, now), (gone, now - datetime.timedelta(seconds=jobs.STALE_AFTER + 1))):
+    job.status, job.runner_id, job.heartbeat_at = JobStatus.RUNNING, "other:1", heartbeat_at
+    session.add(job)
+  session.commit()
+
+  runner = JobRunner(engine, workers=1, poll_interval=0.05)
+  try:
+    gone = wait_for(session, gone)
+    session.refresh(alive)
+  finally:
+    runner.shutdown()
+
+  assert gone.status == JobStatus.SUCCEEDED
+  assert gone.runner_id == runner.runner_id
+  assert (alive.status, alive.runner_id) == (JobStatus.RUNNING, "other:1")
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+  app.dependency_overrides[get_session] = lambda: session
+  yield TestClient(app)
+  app.dependency_overrides.clear()
+
+
+def test_job_endpoints(session: Session, client: TestClient):
+  job = enqueue(session, "test.record", {"label": "api"})
+
+  response = client.get(f"/api/jobs/{job.id}")
+  assert response.status_code == 200
+  assert response.json()["status"] == "queued"
+
+  response = client.get(f"/jobs/{job.id}/progress")
+  assert 'hx-trigger="every 1s"' in response.text
+
+  response = client.post(f"/api/jobs/{job.id}/cancel")
+  assert response.json()["status"] == "cancelled"
+
+  response = client.get(f"/jobs/{job.id}/progress")
+  assert "every 1s" not in response.text
+  assert "Cancelled." in response.text
+
+
+def test_jobs_are_scoped_to_owner(session: Session, client: TestClient):
+  owner = User(username="gardener", password="secret-password", email="gardener@example.com")
+  session.add(owner)
+  session.commit()
+  job = enqueue(session, "test.record", {"label": "owned"}, owner_id=owner.id)
+
+  assert client.get(f"/api/jobs/{job.id}").status_code == 404
+
+  app.dependency_overrides[auth_handler.get_optional_user] = lambda: owner
+  assert client.get(f"/api/jobs/{job.id}").status_code == 200
+
+
+def test_catalog_ingest_in_background(engine, session: Session, client: TestClient):
+  owner = User(username="gardener", password="secret-password", email="gardener@example.com")
+  session.add(owner)
+  session.commit()
+  app.dependency_overrides[auth_handler.get_current_user] = lambda: owner
+  dump = json.dumps([{"name_common": "Basil", "name_botanical": "Ocimum basilicum"}])
+
+  response = client.post(
+    "/api/plants/catalog?background=true",
+    files=[("files", ("plants.json", dump, "application/json"))]
+  )
+  assert response.status_code == 202
+  job = session.get(Job, response.json()["job_id"])
+
+  runner = JobRunner(engine, workers=1, poll_interval=0.05)
+  try:
+    job = wait_for(session, job)
+  finally:
+    runner.shutdown()
+
+  assert job.status == JobStatus.SUCCEEDED
+  assert json.loads(job.result)["inserted"] == 1
+  assert session.exec(select(Plant.name_common)).all() == ["Basil"]
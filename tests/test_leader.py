@@ -0,0 +1,36 @@
+import time
+
+from app.library.leader import Leader
+
+
+def test_one_process_leads_and_another_takes_over(tmp_path):
+  path = str(tmp_path / "scheduler.lock")
+  events = []
+
+  first = Leader(path, lambda: events.append("first started"), lambda: events.append("first stopped"), interval=0.02)
+  second = Leader(path, lambda: events.append("second started"), lambda: events.append("second stopped"), interval=0.02)
+  try:
+    time.sleep(0.1)
+    assert (first.leading, second.leading) == (True, False)
+    assert events == ["first started"]
+
+    first.shutdown()
+    deadline = time.monotonic() + 2
+    while not second.leading and time.monotonic() < deadline:
+      time.sleep(0.01)
+  finally:
+    second.shutdown()
+
+  assert events == ["first started", "first stopped", "second started", "second stopped"]
+
+
+def test_follower_shuts_down_without_running_the_schedulers(tmp_path):
+  path = str(tmp_path / "scheduler.lock")
+  events = []
+  leader = Leader(path, lambda: events.append("started"), lambda: events.append("stopped"))
+  follower = Leader(path, lambda: events.append("follower started"), lambda: events.append("follower stopped"))
+
+  follower.shutdown()
+  leader.shutdown()
+
+  assert events == ["started", "stopped"]
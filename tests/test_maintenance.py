@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from app.database.maintenance import DatabaseMaintenance
+from app.library.metrics import metrics
+
+
+def fill(path, rows: int = 2000, auto_vacuum: str = "INCREMENTAL", journal_mode: str = "DELETE"):
+  connection = sqlite3.connect(path, isolation_level=None)
+  connection.execute(f"PRAGMA auto_vacuum = {auto_vacuum}")
+  connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+  connection.execute("CREATE TABLE planting (id INTEGER PRIMARY KEY, notes TEXT)")
+  connection.execute("CREATE INDEX ix_planting_notes ON planting (notes)")
+  connection.execute("BEGIN")
+  connection.executemany("INSERT INTO planting (notes) VALUES (?)", [(f"{n:05d}" + "x" * 500,) for n in range(rows)])
+  connection.execute("COMMIT")
+  return connection
+
+
+@pytest.fixture(name="database")
+def database_fixture(tmp_path):
+  metrics.reset()
+  yield str(tmp_path / "maintenance.sqlite3")
+  metrics.reset()
+
+
+def test_vacuum_reclaims_pages_freed_by_bulk_delete(database):
+  connection = fill(database)
+  connection.execute("DELETE FROM planting")
+  freed = connection.execute("PRAGMA freelist_count").fetchone()[0]
+  size = os.path.getsize(database)
+
+  result, = DatabaseMaintenance(database).run(["vacuum"])
+
+  assert freed > 0
+  assert result.pages_reclaimed == freed
+  assert connection.execute("PRAGMA freelist_count").fetchone()[0] == 0
+  assert os.path.getsize(database) < size
+  assert metrics.get("maintenance.vacuum.pages_reclaimed") == freed
+  assert metrics.get("maintenance.vacuum.runs") == 1
+
+
+def test_vacuum_stops_when_the_budget_is_spent(database):
+  connection = fill(database)
+  connection.execute("DELETE FROM planting")
+  freed = connection.execute("PRAGMA freelist_count").fetchone()[0]
+
+  result, = DatabaseMaintenance(database, budget=0, vacuum_pages=10).run(["vacuum"])
+
+  assert result.pages_reclaimed == 10
+  assert metrics.get("maintenance.freelist_pages") == freed - 10
+
+
+def test_vacuum_needs_incremental_auto_vacuum(database):
+  fill(database, auto_vacuum="NONE").execute("DELETE FROM planting")
+
+  result, = DatabaseMaintenance(database).run(["vacuum"])
+
+  assert result.skipped == "auto_vacuum is not incremental"
+  assert result.pages_reclaimed == 0
+
+
+def test_optimize_gathers_planner_statistics(database):
+  connection = fill(database)
+
+  result, = DatabaseMaintenance(database).run(["optimize"])
+
+  assert result.skipped is None
+  assert connection.execute("SELECT tbl, idx FROM sqlite_stat1 ORDER BY idx").fetchall() == [("planting", "ix_planting_notes")]
+  # statistics exist now, so later runs only refresh them where needed
+  result, = DatabaseMaintenance(database).run(["optimize"])
+  assert result.skipped is None
+
+
+def test_checkpoint_truncates_the_wal(database):
+  connection = fill(database, journal_mode="WAL")
+  assert os.path.getsize(database + "-wal") > 0
+
+  result, = DatabaseMaintenance(database).run(["checkpoint"])
+
+  assert result.skipped is None
+  assert result.pages_reclaimed > 0
+  assert os.path.getsize(database + "-wal") == 0
+
+
+def test_checkpoint_is_skipped_without_wal(database):
+  fill(database)
+
+  result, = DatabaseMaintenance(database).run(["checkpoint"])
+
+  assert result.skipped == "not in WAL mode"
+
+
+def test_steps_give_up_instead_of_waiting_for_a_writer(database):
+  connection = fill(database)
+  connection.execute("DELETE FROM planting")
+  connection.execute("BEGIN IMMEDIATE")
+
+  started = time.perf_counter()
+  results = DatabaseMaintenance(database, budget=0.05).run(["optimize", "vacuum"])
+  elapsed = time.perf_counter() - started
+  connection.execute("ROLLBACK")
+
+  assert [result.skipped for result in results] == ["database is locked", "database is locked"]
+  assert elapsed < 0.5
+  assert metrics.get("maintenance.vacuum.busy") == 1
+
+
+def test_scheduler_waits_for_a_quiet_period(database):
+  connection = fill(database)
+  connection.execute("DELETE FROM planting")
+  requests = iter([0, 100, 200, 300, 300, 300, 300])
+  maintenance = DatabaseMaintenance(database, quiet_rate=1.0, activity=lambda: next(requests, 300))
+
+  maintenance.start(interval=0.05)
+  deadline = time.monotonic() + 5
+  while metrics.get("maintenance.vacuum.runs") == 0 and time.monotonic() < deadline:
+    time.sleep(0.01)
+  maintenance.shutdown()
+
+  assert metrics.get("maintenance.deferred") >= 2
+  assert metrics.get("maintenance.vacuum.runs") >= 1
+  assert connection.execute("PRAGMA freelist_count").fetchone()[0] == 0
@@ -0,0 +1,85 @@
+import sqlite3
+
+from alembic import command
+from alembic.config import Config
+
+from app.database.backup import alembic_head, validate_schema
+from app.library.catalog import catalog_key
+
+
+# The schema SQLModel.metadata.create_all made before the first migration
+# after the initial one, which databases of that time are stamped with
+BASELINE_REVISION = "36238de00ee6"
+BASELINE_SCHEMA = """
+CREATE TABLE garden (
+  name VARCHAR NOT NULL, type VARCHAR, location VARCHAR, zone VARCHAR, id INTEGER NOT NULL,
+  PRIMARY KEY (id)
+);
+CREATE INDEX ix_garden_name ON garden (name);
+CREATE TABLE user (
+  id INTEGER NOT NULL, username VARCHAR NOT NULL, password VARCHAR(256) NOT NULL, email VARCHAR NOT NULL,
+  created_at DATETIME NOT NULL, gardener BOOLEAN NOT NULL,
+  PRIMARY KEY (id)
+);
+CREATE INDEX ix_user_username ON user (username);
+CREATE TABLE bed (
+  name VARCHAR NOT NULL, soil_type VARCHAR, irrigation_zone VARCHAR, garden_id INTEGER, id INTEGER NOT NULL,
+  PRIMARY KEY (id), FOREIGN KEY(garden_id) REFERENCES garden (id)
+);
+CREATE INDEX ix_bed_name ON bed (name);
+CREATE TABLE planting (
+  plant VARCHAR NOT NULL, variety VARCHAR, notes VARCHAR, bed_id INTEGER, id INTEGER NOT NULL,
+  PRIMARY KEY (id), FOREIGN KEY(bed_id) REFERENCES bed (id)
+);
+CREATE TABLE plant (
+  name_common VARCHAR NOT NULL, name_botanical VARCHAR NOT NULL, family_group VARCHAR, harvest VARCHAR,
+  hints VARCHAR, watch_for VARCHAR, proven_varieties VARCHAR, planting_id INTEGER, id INTEGER NOT NULL,
+  PRIMARY KEY (id), FOREIGN KEY(planting_id) REFERENCES planting (id)
+);
+CREATE INDEX ix_plant_name_common ON plant (name_common);
+CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL);
+"""
+
+
+def alembic_config(path) -> Config:
+  # no config file, so env.py leaves the logging configuration alone
+  config = Config()
+  config.set_main_option("script_location", "migrations")
+  config.set_main_option("sqlalchemy.url", f"sqlite:///{path}")
+  return config
+
+
+def test_baseline_database_upgrades_to_head(tmp_path):
+  path = tmp_path / "garden.sqlite3"
+  connection = sqlite3.connect(path, isolation_level=None)
+  connection.executescript(BASELINE_SCHEMA)
+  connection.execute("INSERT INTO alembic_version VALUES (?)", (BASELINE_REVISION,))
+  connection.execute("INSERT INTO user VALUES (1, 'gardener', 'x', 'gardener@example.com', '2026-01-01', 1)")
+  connection.execute("INSERT INTO garden (id, name) VALUES (1, 'Allotment')")
+  connection.execute("INSERT INTO bed (id, name, garden_id) VALUES (1, 'Bed', 1)")
+  connection.execute("INSERT INTO planting (id, plant, bed_id) VALUES (1, 'Tomato', 1)")
+  connection.execute("INSERT INTO plant (id, name_common, name_botanical, harvest) VALUES (1, 'tomato', 'Solanum lycopersicum', '12 to 16 weeks from seed.')")
+  # the same plant entered again, which the catalog key cannot tell apart
+  connection.execute("INSERT INTO plant (id, name_common, name_botanical, harvest) VALUES (2, 'Tomato', 'Solanum  lycopersicum', '12 to 16 weeks from seed.')")
+  connection.close()
+
+  command.upgrade(alembic_config(path), "head")
+
+  connection = sqlite3.connect(path, isolation_level=None)
+  validate_schema(connection, alembic_head())
+  assert connection.execute("SELECT name FROM garden").fetchall() == [("Allotment",)]
+  assert connection.execute("SELECT plant, bed_id FROM planting").fetchall() == [("Tomato", 1)]
+  # existing rows get harvest windows, the plantings dated by the migration
+  assert connection.execute("SELECT harvest_min_weeks, harvest_max_weeks, harvest_from FROM plant").fetchall() == [(12, 16, "seed")] * 2
+  assert connection.execute(
+    "SELECT julianday(harvest_start) - julianday(date(date_planted)), julianday(harvest_end) - julianday(date(date_planted)) FROM planting"
+  ).fetchall() == [(84.0, 112.0)]
+  # plants entered by hand are keyed like catalog records, one plant per key
+  assert connection.execute("SELECT id, catalog_key FROM plant ORDER BY id").fetchall() == [
+    (1, catalog_key("Solanum lycopersicum", "Tomato")), (2, None),
+  ]
+  # the triggers of the rebuilt tables still fire
+  connection.execute("INSERT INTO garden (id, name, owner_id, latitude, longitude) VALUES (2, 'Patio', 1, 51.5, -0.1)")
+  assert connection.execute("SELECT id FROM garden_rtree").fetchall() == [(2,)]
+  assert connection.execute("SELECT items_owned FROM user").fetchone() == (1,)
+  connection.close()
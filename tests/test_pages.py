@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.library.helpers import PageCache, openfile
+
+
+def write(path, text):
+  with open(path, "w", encoding="utf-8") as output_file:
+    output_file.write(text)
+
+
+def test_pages_are_rendered_once_until_changed(tmp_path):
+  write(tmp_path / "guide.md", "# Guide")
+  cache = PageCache(str(tmp_path))
+
+  assert cache.prerender() == 1
+  page = cache.get("guide.md")
+  assert page.html == "<h1>Guide</h1>"
+
+  # served from the cache without touching the disk
+  os.remove(tmp_path / "guide.md")
+  assert cache.get("guide.md") is page
+
+  write(tmp_path / "guide.md", "# Planting guide")
+  assert cache.refresh() == 1
+  changed = cache.get("guide.md")
+  assert changed.html == "<h1>Planting guide</h1>"
+  assert changed.etag != page.etag
+
+
+@pytest.mark.parametrize("filename", ["../secret.md", "secret.txt", "missing.md"])
+def test_only_pages_in_the_directory_are_served(tmp_path, filename):
+  os.mkdir(tmp_path / "pages")
+  write(tmp_path / "secret.md", "# Secret")
+  write(tmp_path / "pages" / "secret.txt", "Secret")
+  cache = PageCache(str(tmp_path / "pages"))
+
+  with pytest.raises(FileNotFoundError):
+    cache.get(filename)
+
+
+def test_openfile_returns_rendered_html():
+  assert openfile("about.md")["text"].startswith("<h1>About</h1>")
+
+
+def test_content_page_revalidates_with_etag():
+  client = TestClient(app)
+
+  response = client.get("/pages/about")
+  assert response.status_code == 200
+  assert "<h1>About</h1>" in response.text
+  etag = response.headers["etag"]
+
+  response = client.get("/pages/about", headers={"If-None-Match": etag})
+  assert response.status_code == 304
+  assert response.headers["etag"] == etag
+
+  assert client.get("/pages/missing").status_code == 404
@@ -0,0 +1,152 @@
+import inspect
+from datetime import date, datetime
+
+import pytest
+from sqlmodel import select
+
+from app.endpoints.bed import BedSort, read_beds
+from app.endpoints.garden import GardenSort, gardens_in_box, read_gardens
+from app.endpoints.plant import PlantSort, read_plants
+from app.endpoints.planting import PlantingSort, harvest_due_select, read_plantings
+from app.library.audit import audit_events_select
+from app.library.filters import apply_filters, apply_sort
+from app.models.garden_models import Bed, Garden, Planting
+from app.models.garden_models import ClimaticZone, GardenType, IrrigationZone, SoilType
+from app.models.plant import Plant
+from tests.conftest import clone
+
+# Check with EXPLAIN QUERY PLAN that every filter and sort key supported by the
+# list endpoints is served by an index rather than a table scan. Gardens, beds
+# and plantings are always queried within the scope of their owner.
+
+NON_FILTER_PARAMS = {"session", "user", "offset", "limit", "fields", "sort"}
+
+SAMPLE_VALUES = {
+  "name": "Vegetable Plot",
+  "garden_id": 1,
+  "bed_id": 1,
+  "type": GardenType.COMMUNITY,
+  "zone": ClimaticZone.TEMPERATE,
+  "soil_type": SoilType.LOAM,
+  "irrigation_zone": IrrigationZone.VEGETABLES,
+  "plant": "Tomato",
+  "variety": "Cherry",
+  "name_common": "Amaranth",
+  "name_botanical": "Amaranthus sp.",
+  "family_group": "Amaranthaceae",
+}
+
+LIST_ENDPOINTS = [
+  (Garden, read_gardens, GardenSort),
+  (Bed, read_beds, BedSort),
+  (Planting, read_plantings, PlantingSort),
+  (Plant, read_plants, PlantSort),
+]
+
+
+def endpoint_filters(endpoint):
+  return [name for name in inspect.signature(endpoint).parameters if name not in NON_FILTER_PARAMS]
+
+
+FILTER_CASES = [
+  pytest.param(model, name, id=f"{model.__tablename__}-{name}")
+  for model, endpoint, _ in LIST_ENDPOINTS
+  for name in endpoint_filters(endpoint)
+]
+
+SORT_CASES = [
+  pytest.param(model, sort, id=f"{model.__tablename__}-{sort.value}")
+  for model, _, sort_enum in LIST_ENDPOINTS
+  for sort in sort_enum
+]
+
+
+@pytest.fixture(name="engine", scope="module")
+def engine_fixture(schema):
+  engine = clone(schema)
+  yield engine
+  engine.dispose()
+
+
+def owner_scoped(model):
+  statement = select(model)
+  if hasattr(model, "owner_id"):
+    statement = statement.where(model.owner_id == 1)
+  return statement
+
+
+def query_plan(engine, statement):
+  compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+  with engine.connect() as connection:
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+  return [row[-1] for row in rows]
+
+
+def test_every_filter_has_a_case():
+  assert len(FILTER_CASES) >= 12
+
+
+@pytest.mark.parametrize("model, name", FILTER_CASES)
+def test_filter_uses_index(engine, model, name):
+  statement = apply_filters(owner_scoped(model), model, **{name: SAMPLE_VALUES[name]})
+  plan = query_plan(engine, statement)
+
+  assert any(step.startswith(f"SEARCH {model.__tablename__} USING") and "INDEX" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("model", [model for model, _, _ in LIST_ENDPOINTS])
+def test_default_order_avoids_temp_btree(engine, model):
+  plan = query_plan(engine, apply_sort(owner_scoped(model), model, None))
+
+  assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("model, sort", SORT_CASES)
+def test_sort_avoids_temp_btree(engine, model, sort):
+  statement = apply_sort(owner_scoped(model), model, sort)
+  plan = query_plan(engine, statement)
+
+  assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("model, name, sort", [
+  (Bed, "garden_id", BedSort.NAME),
+  (Planting, "bed_id", PlantingSort.PLANT),
+  (Garden, "zone", GardenSort.NAME),
+  (Plant, "family_group", PlantSort.NAME_COMMON),
+])
+def test_composite_filter_and_sort(engine, model, name, sort):
+  statement = apply_filters(owner_scoped(model), model, **{name: SAMPLE_VALUES[name]})
+  statement = apply_sort(statement, model, sort)
+  plan = query_plan(engine, statement)
+
+  assert any(step.startswith(f"SEARCH {model.__tablename__} USING") for step in plan), plan
+  assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_harvest_due_uses_index(engine):
+  statement = harvest_due_select(date(2026, 5, 1), date(2026, 5, 31)).where(Planting.owner_id == 1)
+  plan = query_plan(engine, statement)
+
+  assert any(step.startswith("SEARCH planting USING INDEX ix_planting_owner_id_harvest_start_end") for step in plan), plan
+  assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_gardens_in_box_uses_rtree(engine):
+  plan = query_plan(engine, gardens_in_box(-38.0, 144.5, -37.5, 145.0))
+
+  assert any(step.startswith("SCAN garden_rtree VIRTUAL TABLE INDEX") for step in plan), plan
+  assert any(step.startswith("SEARCH garden USING INTEGER PRIMARY KEY") for step in plan), plan
+
+
+@pytest.mark.parametrize("filters, index", [
+  ({"entity": "bed", "entity_id": 1}, "ix_audit_event_entity_entity_id_recorded_at"),
+  ({"user_id": 1}, "ix_audit_event_user_id_recorded_at"),
+  ({}, "ix_audit_event_recorded_at"),
+])
+def test_audit_events_use_index(engine, filters, index):
+  statement = audit_events_select(**filters, since=datetime(2026, 1, 1), until=datetime(2026, 2, 1))
+  plan = query_plan(engine, statement)
+
+  assert any(step.startswith(f"SEARCH audit_event USING INDEX {index}") for step in plan), plan
+  assert not any("TEMP B-TREE" in step for step in plan), plan
@@ -0,0 +1,37 @@
+import datetime
+import json
+
+from app.library.responses import FastJSONResponse, encode_row, encode_rows
+from app.models.garden_models import Bed, BedRead, Planting, PlantingRead
+from app.models.plant import Plant, PlantRead
+
+
+def test_encode_row_encodes_the_fields_of_the_read_model():
+  plant = Plant(id=1, name_common="Tomato", name_botanical="Solanum lycopersicum", catalog_key="tomato", content_hash="abc")
+
+  assert encode_row(plant, PlantRead) == {name: getattr(plant, name) for name in PlantRead.__fields__}
+  assert "catalog_key" in encode_row(plant)
+
+
+def test_encode_rows_leaves_out_private_columns():
+  beds = [Bed(id=1, name="Mine", owner_id=7), Bed(id=2, name="Shared")]
+
+  assert encode_rows(beds, BedRead) == [
+    {"name": "Mine", "soil_type": None, "irrigation_zone": None, "garden_id": None, "id": 1},
+    {"name": "Shared", "soil_type": None, "irrigation_zone": None, "garden_id": None, "id": 2},
+  ]
+
+
+def test_fast_json_response_renders_rows_and_models():
+  planting = Planting(id=3, plant="Bean", date_planted=datetime.datetime(2026, 3, 1), harvest_start=datetime.date(2026, 5, 10), owner_id=7)
+
+  body = json.loads(FastJSONResponse(content={"planting": encode_row(planting, PlantingRead), "tags": {"legume"}}).body)
+
+  assert body == {
+    "planting": {
+      "plant": "Bean", "variety": None, "date_planted": "2026-03-01T00:00:00", "notes": None, "bed_id": None,
+      "id": 3, "harvest_start": "2026-05-10", "harvest_end": None,
+    },
+    "tags": ["legume"],
+  }
+  assert json.loads(FastJSONResponse(content=[PlantingRead(id=3, plant="Bean")]).body)[0]["plant"] == "Bean"
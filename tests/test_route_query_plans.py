@@ -0,0 +1,383 @@
+import json
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlmodel.pool import StaticPool
+
+from app.config import Settings, get_settings
+from app.database.session import get_session
+from app.endpoints.api_user import auth_handler
+from app.library import users
+from app.library.reference import references
+from app.main import app
+from app.models.garden_models import Bed, ClimaticZone, Garden, GardenType, IrrigationZone, Planting, PlantingHistory, SoilType
+from app.models.plant import Plant
+from app.models.user_models import User
+from tests.conftest import clone
+from tests.test_climate import write_history
+
+# Run every route of the garden, bed, planting, plant, user and page modules
+# against a seeded database, and check with EXPLAIN QUERY PLAN each statement
+# they issue. A route fails on a table scan or temporary B-tree it does not
+# declare, and on any plan that differs from its snapshot in
+# tests/query_plans/. Snapshots keep each statement's kind, tables and plan, not
+# its SQL text, which changes with the SQLAlchemy version. After an intended change, rewrite the snapshots with
+#
+#     UPDATE_QUERY_PLANS=1 pytest tests/test_route_query_plans.py
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "query_plans")
+UPDATE = bool(os.environ.get("UPDATE_QUERY_PLANS"))
+
+ROUTE_MODULES = ("garden", "bed", "planting", "plant", "api_user", "pages")
+
+USERS = 2
+GARDENS_PER_USER = 40
+BEDS_PER_GARDEN = 5
+PLANTINGS_PER_BED = 10
+PLANTS = 300
+PASSWORD = "hunter22"
+FAMILIES = ["Amaranthaceae", "Brassicaceae", "Cucurbitaceae", "Fabaceae", "Solanaceae"]
+
+# First garden, bed and planting of the user the requests are made as
+GARDEN = 1
+BED = 1
+PLANTING = 1
+
+
+@dataclass
+class Case:
+  method: str
+  route: str
+  path: Dict = field(default_factory=dict)
+  query: Dict = field(default_factory=dict)
+  json: Optional[Dict] = None
+  data: Optional[Dict] = None
+  # plan steps starting with one of these are expected, see the comment at each case
+  allow: Tuple[str, ...] = ()
+
+  @property
+  def url(self) -> str:
+    url = self.route.format(**self.path)
+    return f"{url}?{urlencode(self.query)}" if self.query else url
+
+  @property
+  def module(self) -> str:
+    return route_modules()[(self.method, self.route)]
+
+  @property
+  def id(self) -> str:
+    return f"{self.method} {self.url}"
+
+
+CASES = [
+  # gardens
+  Case("POST", "/api/gardens/", json={"name": "Allotment 99", "type": GardenType.ALLOTMENT, "zone": ClimaticZone.COOL}),
+  Case("GET", "/api/gardens/"),
+  Case("GET", "/api/gardens/", query={"type": GardenType.ALLOTMENT.value, "sort": "name"}),
+  # ix_garden_owner_id_zone_name is in name order; one owner's gardens in a zone are sorted by id
+  Case("GET", "/api/gardens/", query={"zone": ClimaticZone.COOL.value, "fields": "id,name"}, allow=("USE TEMP B-TREE FOR ORDER BY",)),
+  Case("GET", "/api/gardens/", query={"name": "Garden 1-3"}),
+  # the gardens in a bounding box are sorted by id
+  Case("GET", "/api/gardens/nearby", query={"lat": 51.5, "lon": -0.1, "radius": 25}, allow=("USE TEMP B-TREE FOR ORDER BY",)),
+  # the gardens in a bounding box are sorted by id
+  Case("GET", "/api/gardens/within", query={"min_lat": 51, "min_lon": -1, "max_lat": 52, "max_lon": 1},
+       allow=("USE TEMP B-TREE FOR ORDER BY",)),
+  Case("GET", "/api/gardens/{garden_id}", path={"garden_id": GARDEN}),
+  Case("GET", "/api/gardens/{garden_id}", path={"garden_id": GARDEN}, query={"fields": "id,name"}),
+  # the plantings of one garden are sorted by id
+  Case("GET", "/api/gardens/{garden_id}/calendar", path={"garden_id": GARDEN}, allow=("USE TEMP B-TREE FOR ORDER BY",)),
+  # the history of one garden's beds is grouped by bed and family
+  Case("GET", "/api/gardens/{garden_id}/rotation", path={"garden_id": GARDEN},
+       allow=("USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR ORDER BY", "USE TEMP B-TREE FOR count(DISTINCT)")),
+  Case("PATCH", "/api/gardens/{garden_id}", path={"garden_id": GARDEN}, json={"name": "Renamed"}),
+  Case("DELETE", "/api/gardens/{garden_id}", path={"garden_id": GARDEN}),
+  Case("GET", "/gardens/"),
+  Case("GET", "/gardens/update"),
+  Case("GET", "/gardens/update", query={"after": 20}),
+  Case("GET", "/garden/create"),
+  Case("POST", "/garden/create", data={"name": "Allotment 99", "type": GardenType.ALLOTMENT.value, "zone": ClimaticZone.COOL.value}),
+  Case("GET", "/garden/edit/{garden_id}", path={"garden_id": GARDEN}),
+  Case("POST", "/garden/edit/{garden_id}", path={"garden_id": GARDEN}, data={"name": "Renamed"}),
+  # beds
+  Case("POST", "/api/beds/", json={"name": "Bed 99", "garden_id": GARDEN, "soil_type": SoilType.LOAM}),
+  Case("GET", "/api/beds/"),
+  Case("GET", "/api/beds/", query={"garden_id": GARDEN, "sort": "name"}),
+  Case("GET", "/api/beds/", query={"soil_type": SoilType.CLAY.value, "fields": "id,name"}),
+  Case("GET", "/api/beds/", query={"irrigation_zone": IrrigationZone.VEGETABLES.value, "sort": "irrigation_zone"}),
+  Case("GET", "/api/beds/{bed_id}", path={"bed_id": BED}),
+  Case("GET", "/api/beds/{bed_id}", path={"bed_id": BED}, query={"fields": "id,name"}),
+  Case("PATCH", "/api/beds/{bed_id}", path={"bed_id": BED}, json={"name": "Renamed"}),
+  Case("DELETE", "/api/beds/{bed_id}", path={"bed_id": BED}),
+  Case("GET", "/api/beds/soil_types/"),
+  Case("GET", "/api/beds/irrigation_zones/"),
+  Case("GET", "/beds/"),
+  Case("GET", "/beds/update"),
+  Case("GET", "/beds/update", query={"after": 20}),
+  Case("GET", "/bed/create"),
+  Case("POST", "/bed/create", data={"name": "Bed 99", "garden_id": GARDEN, "soil_type": SoilType.LOAM.value, "irrigation_zone": IrrigationZone.VEGETABLES.value}),
+  Case("GET", "/bed/edit/{bed_id}", path={"bed_id": BED}),
+  Case("POST", "/bed/edit/{bed_id}", path={"bed_id": BED}, data={"name": "Renamed"}),
+  # plantings
+  Case("POST", "/api/plantings/", json={"plant": "Plant 7", "variety": "Cherry", "bed_id": BED, "date_planted": "2026-03-01T00:00:00"}),
+  Case("GET", "/api/plantings/"),
+  Case("GET", "/api/plantings/", query={"bed_id": BED, "sort": "plant"}),
+  # ix_planting_owner_id_plant_variety is in variety order; one owner's plantings of a plant are sorted by id
+  Case("GET", "/api/plantings/", query={"plant": "Plant 7", "fields": "id,plant,variety"}, allow=("USE TEMP B-TREE FOR ORDER BY",)),
+  Case("GET", "/api/plantings/", query={"variety": "Cherry", "sort": "variety"}),
+  Case("GET", "/api/plantings/harvest-due", query={"from": "2026-06-01", "to": "2026-06-14"}),
+  Case("GET", "/api/plantings/{planting_id}", path={"planting_id": PLANTING}),
+  Case("GET", "/api/plantings/{planting_id}", path={"planting_id": PLANTING}, query={"fields": "id,plant"}),
+  Case("PATCH", "/api/plantings/{planting_id}", path={"planting_id": PLANTING}, json={"variety": "Roma"}),
+  Case("DELETE", "/api/plantings/{planting_id}", path={"planting_id": PLANTING}),
+  Case("GET", "/plantings/"),
+  Case("GET", "/plantings/update"),
+  Case("GET", "/plantings/update", query={"after": 20}),
+  Case("GET", "/plantings/print"),
+  Case("GET", "/planting/create"),
+  Case("POST", "/planting/create", data={"plant": "Plant 7", "variety": "Cherry", "notes": "", "bed_id": BED}),
+  Case("GET", "/planting/edit/{planting_id}", path={"planting_id": PLANTING}),
+  Case("POST", "/planting/edit/{planting_id}", path={"planting_id": PLANTING},
+       data={"plant": "Plant 0", "variety": "Roma", "notes": "Moved", "bed_id": BED}),
+  # plants
+  Case("POST", "/api/plants/", json={"name_common": "Okra", "name_botanical": "Abelmoschus esculentus"}),
+  Case("POST", "/api/plants/catalog"),
+  # the plant catalog is shared; the first page is read in rowid order and stops at the limit
+  Case("GET", "/api/plants/", allow=("SCAN plant",)),
+  Case("GET", "/api/plants/", query={"family_group": FAMILIES[0], "sort": "family_group"}),
+  Case("GET", "/api/plants/", query={"name_common": "Plant 7", "fields": "id,name_common"}),
+  Case("GET", "/api/plants/{plant_id}", path={"plant_id": 1}),
+  Case("GET", "/api/plants/{plant_id}", path={"plant_id": 1}, query={"fields": "id,name_common"}),
+  Case("PATCH", "/api/plants/{plant_id}", path={"plant_id": 1}, json={"hints": "Water well"}),
+  Case("DELETE", "/api/plants/{plant_id}", path={"plant_id": 1}),
+  Case("GET", "/plants/"),
+  Case("GET", "/plants/update", allow=("SCAN plant",)),
+  Case("GET", "/plants/update", query={"after": 20}),
+  Case("GET", "/plant/create"),
+  Case("POST", "/plant/create", data={"name_common": "Okra", "name_botanical": "Abelmoschus esculentus"}),
+  Case("GET", "/plant/edit/{plant_id}", path={"plant_id": 1}),
+  Case("POST", "/plant/edit/{plant_id}", path={"plant_id": 1}, data={"hints": "Water well"}),
+  # users
+  Case("POST", "/registration", json={"username": "newcomer", "password": PASSWORD, "password2": PASSWORD, "email": "newcomer@example.com"}),
+  Case("POST", "/login", json={"username": "gardener1", "password": PASSWORD}),
+  Case("GET", "/users/current"),
+  # pages
+  # existence checks, each stops at the first row
+  Case("GET", "/", allow=("SCAN garden", "SCAN bed", "SCAN planting")),
+  Case("GET", "/pages/{name}", path={"name": "about"}),
+]
+
+
+def route_modules() -> Dict[Tuple[str, str], str]:
+  modules = {}
+  for route in app.routes:
+    module = getattr(getattr(route, "endpoint", None), "__module__", "")
+    if module.startswith("app.endpoints.") and module.rsplit(".", 1)[1] in ROUTE_MODULES:
+      for method in route.methods:
+        modules[(method, route.path)] = module.rsplit(".", 1)[1]
+  return modules
+
+
+def seed(engine):
+  password = auth_handler.get_password_hash(PASSWORD)
+  users, gardens, beds, plantings, history = [], [], [], [], []
+  for user_id in range(1, USERS + 1):
+    users.append({"id": user_id, "username": f"gardener{user_id}", "password": password, "email": f"gardener{user_id}@example.com"})
+    for g in range(GARDENS_PER_USER):
+      garden_id = len(gardens) + 1
+      gardens.append({
+        "id": garden_id, "owner_id": user_id, "name": f"Garden {user_id}-{g}",
+        "type": list(GardenType)[g % len(GardenType)].value, "zone": list(ClimaticZone)[g % len(ClimaticZone)].value,
+        "latitude": 51 + g / GARDENS_PER_USER, "longitude": -1 + 2 * g / GARDENS_PER_USER,
+      })
+      for b in range(BEDS_PER_GARDEN):
+        bed_id = len(beds) + 1
+        beds.append({
+          "id": bed_id, "owner_id": user_id, "garden_id": garden_id, "name": f"Bed {garden_id}-{b}",
+          "soil_type": list(SoilType)[b % len(SoilType)].value, "irrigation_zone": list(IrrigationZone)[b % len(IrrigationZone)].value,
+        })
+        for p in range(PLANTINGS_PER_BED):
+          planted = datetime(2026, 3, 1) + timedelta(days=p * 7)
+          plantings.append({
+            "id": len(plantings) + 1, "owner_id": user_id, "bed_id": bed_id, "plant": f"Plant {p}",
+            "variety": ["Cherry", "Roma", None][p % 3], "date_planted": planted,
+            "harvest_start": (planted + timedelta(weeks=10)).date(), "harvest_end": (planted + timedelta(weeks=14)).date(),
+          })
+          history.append({"planting_id": len(plantings), "bed_id": bed_id, "season": 2025 + p % 2, "plant": f"Plant {p}", "family_group": FAMILIES[p % len(FAMILIES)], "event": "planted"})
+  plants = [
+    {"id": n + 1, "name_common": f"Plant {n}", "name_botanical": f"Plantus {n}", "family_group": FAMILIES[n % len(FAMILIES)], "harvest": "10 to 14 weeks"}
+    for n in range(PLANTS)
+  ]
+  with engine.begin() as conn:
+    # metadata creates a table's indexes in no particular order, and SQLite
+    # breaks ties between equally good indexes by that order
+    indexes = conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall()
+    for name, _ in indexes:
+      conn.exec_driver_sql(f"DROP INDEX {name}")
+    for _, sql in sorted(indexes):
+      conn.exec_driver_sql(sql)
+    for model, rows in ((User, users), (Garden, gardens), (Bed, beds), (Planting, plantings), (PlantingHistory, history), (Plant, plants)):
+      conn.execute(model.__table__.insert(), rows)
+    # statistics as the maintenance job keeps them
+    conn.exec_driver_sql("ANALYZE")
+
+
+@pytest.fixture(name="template", scope="module")
+def template_fixture(schema):
+  connection = sqlite3.connect(":memory:", check_same_thread=False)
+  schema.backup(connection)
+  seed(create_engine("sqlite://", creator=lambda: connection, poolclass=StaticPool))
+  yield connection
+  connection.close()
+
+
+@pytest.fixture(name="climate_dir", scope="module")
+def climate_dir_fixture(tmp_path_factory):
+  directory = tmp_path_factory.mktemp("climate")
+  for zone in ClimaticZone:
+    write_history(directory / f"{zone.value.lower()}.csv", range(2020, 2025))
+  return str(directory)
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(template):
+  engine = clone(template)
+  yield engine
+  engine.dispose()
+
+
+@pytest.fixture(name="client")
+def client_fixture(engine, climate_dir, monkeypatch):
+  from sqlmodel import Session
+
+  def get_session_override():
+    with Session(engine) as session:
+      yield session
+
+  app.dependency_overrides[get_session] = get_session_override
+  app.dependency_overrides[get_settings] = lambda: Settings(items_per_user=1_000_000, climate_dir=climate_dir)
+  # the bearer token is resolved to a user outside the request's session
+  monkeypatch.setattr(users, "engine", engine)
+  references.clear()
+  client = TestClient(app)
+  client.headers["Authorization"] = f"Bearer {auth_handler.encode_token('gardener1')}"
+  yield client
+  app.dependency_overrides.clear()
+
+
+def normalize(sql: str) -> str:
+  sql = re.sub(r"\s+", " ", sql).strip()
+  # expanded IN lists vary in length with the data
+  return re.sub(r"\?(?:, \?)+", "?, ...", sql)
+
+
+def summarize(sql: str) -> str:
+  """Return the kind of a statement and the tables it uses.
+
+  Snapshots record this rather than the SQL text, whose column order and
+  aliases change between SQLAlchemy and SQLModel versions.
+  """
+  kind = sql.split(None, 1)[0].upper()
+  tables = re.findall(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+([A-Za-z_]\w*)", sql, re.IGNORECASE)
+  return f"{kind} {', '.join(sorted(set(tables)))}"
+
+
+def explain(connection, sql: str, parameters) -> list:
+  rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+  depth = {0: -1}
+  plan = []
+  for node, parent, _, detail in rows:
+    depth[node] = depth.get(parent, -1) + 1
+    plan.append("  " * depth[node] + detail)
+  return plan
+
+
+def capture_plans(engine, client: TestClient, case: Case):
+  statements = []
+
+  def record(conn, cursor, statement, parameters, context, executemany):
+    if re.match(r"\s*(SELECT|UPDATE|DELETE|WITH)\b", statement, re.IGNORECASE):
+      statements.append((statement, parameters))
+
+  event.listen(engine, "before_cursor_execute", record)
+  try:
+    files = {"files": ("plants.json", json.dumps([{"name_common": "Okra", "name_botanical": "Abelmoschus esculentus"}]))} \
+      if case.route == "/api/plants/catalog" else None
+    response = client.request(case.method, case.url, json=case.json, data=case.data, files=files)
+  finally:
+    event.remove(engine, "before_cursor_execute", record)
+  plans = []
+  with engine.connect() as connection:
+    for statement, parameters in statements:
+      plans.append({"sql": normalize(statement), "plan": explain(connection, statement, parameters)})
+  return response, plans
+
+
+def unexpected_steps(plans, allow) -> list:
+  steps = []
+  for entry in plans:
+    for step in entry["plan"]:
+      step = step.strip()
+      scan = step.startswith("SCAN ") and not step.startswith("SCAN CONSTANT ROW")
+      # a virtual table scan with an index constraint is an R*Tree search
+      if scan and re.search(r"VIRTUAL TABLE INDEX \d+:\S", step):
+        scan = False
+      if (scan or "TEMP B-TREE" in step) and not step.startswith(allow):
+        steps.append(f"{step}   <- {entry['sql']}")
+  return steps
+
+
+def snapshot_path(module: str) -> str:
+  return os.path.join(SNAPSHOT_DIR, f"{module}.json")
+
+
+def load_snapshot(module: str) -> Dict:
+  try:
+    with open(snapshot_path(module), "r", encoding="utf-8") as snapshot_file:
+      return json.load(snapshot_file)
+  except FileNotFoundError:
+    return {}
+
+
+def save_snapshot(module: str, case_id: str, plans):
+  if os.environ.get("PYTEST_XDIST_WORKER"):
+    pytest.fail("rewrite the snapshots in a single process, pytest-xdist workers would overwrite each other's")
+  snapshot = load_snapshot(module)
+  snapshot[case_id] = plans
+  os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+  with open(snapshot_path(module), "w", encoding="utf-8") as snapshot_file:
+    json.dump(dict(sorted(snapshot.items())), snapshot_file, indent=2)
+    snapshot_file.write("\n")
+
+
+def test_every_route_has_a_case():
+  covered = {(case.method, case.route) for case in CASES}
+
+  assert sorted(set(route_modules()) - covered) == []
+
+
+def test_snapshots_have_no_stale_cases():
+  for module in ROUTE_MODULES:
+    case_ids = {case.id for case in CASES if case.module == module}
+    assert sorted(set(load_snapshot(module)) - case_ids) == [], module
+
+
+@pytest.mark.parametrize("case", [pytest.param(case, id=case.id) for case in CASES])
+def test_route_query_plans(engine, client: TestClient, case: Case):
+  response, plans = capture_plans(engine, client, case)
+
+  assert response.status_code < 400, response.text
+  assert unexpected_steps(plans, case.allow) == []
+  plans = [{"statement": summarize(entry["sql"]), "plan": entry["plan"]} for entry in plans]
+  if UPDATE:
+    save_snapshot(case.module, case.id, plans)
+  snapshot = load_snapshot(case.module)
+  assert case.id in snapshot, "no snapshot, run with UPDATE_QUERY_PLANS=1"
+  assert plans == snapshot[case.id]
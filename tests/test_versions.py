@@ -0,0 +1,37 @@
+import multiprocessing
+
+from app.config import Settings, get_settings, reload_settings
+from app.database.versions import EntityVersions
+
+
+def bump_in_child(shared: EntityVersions):
+  shared.bump("bed", "bed", "planting", "unshared")
+
+
+def test_shared_versions_are_seen_across_forked_workers():
+  shared = EntityVersions()
+  shared.bump("bed")
+  shared.share(["bed", "planting"])
+
+  worker = multiprocessing.get_context("fork").Process(target=bump_in_child, args=(shared,))
+  worker.start()
+  worker.join()
+
+  assert worker.exitcode == 0
+  assert shared.get("bed", "planting") == (3, 1)
+  # tables without a shared counter stay local to each process
+  assert shared.get("unshared") == (0,)
+
+
+def test_reload_settings_reads_them_again(monkeypatch):
+  settings = get_settings()
+  assert get_settings() is settings
+
+  monkeypatch.setenv("ITEMS_PER_USER", "7")
+  reload_settings()
+
+  assert get_settings() is not settings
+  assert get_settings().items_per_user == 7
+  monkeypatch.delenv("ITEMS_PER_USER")
+  reload_settings()
+  assert get_settings().items_per_user == Settings().items_per_user